@@ -5,10 +5,12 @@ from typing import Optional
 from controllers import (
     JournalManager,
     LevelManager,
+    WriteQueue,
 )
 from infrastructure import (
     DependencyContainer,
     SystemConfigurator,
+    SnapshotManager,
     LevelsView,
     RecommendationsView,
     ReportsView,
@@ -26,9 +28,15 @@ class Application:
         - show_main_menu() — показать главное "меню"
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        configurator: Optional[SystemConfigurator] = None,
+        snapshot: Optional[SnapshotManager] = None,
+    ) -> None:
         self._container = DependencyContainer()
-        self._configurator = SystemConfigurator()
+        self._configurator = configurator or SystemConfigurator()
+        # Снимок состояния: загружается при инициализации, сохраняется при остановке
+        self._snapshot = snapshot
         self._initialized: bool = False
 
         self._levels_view: Optional[LevelsView] = None
@@ -47,6 +55,13 @@ class Application:
         self._configurator.load_parameters(self._container)
 
         journal: JournalManager = self._container.resolve(JournalManager)
+        if self._snapshot is not None:
+            if self._snapshot.load(self._container):
+                journal.add_entry(
+                    f"Состояние восстановлено из снимка {self._snapshot.path}", level="INFO"
+                )
+            self._snapshot.start(self._container)
+
         level_manager: LevelManager = self._container.resolve(LevelManager)
         interface_ctrl = self._configurator.controller_factory.create("interface")
 
@@ -182,11 +197,14 @@ class Application:
         # Для имитации улучшения поведения немного меняем показания сенсоров
         from model import SensorRepository  # только для type-hint; не обязательно
 
-        for sensor in self._container.resolve("repo:sensor").get_all():
+        sensor_repo = self._container.resolve("repo:sensor")
+        for sensor in sensor_repo.get_all():
             if sensor.type == "completion_time":
                 sensor.value = max(60.0, sensor.value * 0.8)
             if sensor.type == "load":
                 sensor.value = max(0.3, sensor.value * 0.9)
+            # Репозиторий может хранить копии (например, SQLite)
+            sensor_repo.update_sensor(sensor)
 
         # 11. Новый сбор данных
         data_ctrl.initialize_sensors()
@@ -222,6 +240,13 @@ class Application:
         """остановить()"""
         journal: JournalManager = self._container.resolve(JournalManager)
         journal.add_entry("Приложение остановлено", level="INFO")
+        # Показания из очереди записи должны попасть в хранилище и снимок
+        writer: Optional[WriteQueue] = self._container.resolve(WriteQueue)
+        if writer is not None:
+            writer.close()
+        if self._snapshot is not None:
+            self._snapshot.stop()
+            self._snapshot.save(self._container)
 
     def show_main_menu(self) -> None:
         """
@@ -0,0 +1,590 @@
+"""
+Замеры производительности хранилищ и контроллеров.
+
+Запуск всех замеров:
+    python benchmark.py
+Запуск отдельного замера:
+    python benchmark.py storage --records 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import MISSING, field, fields, make_dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from model import (
+    Sensor,
+    StorageRecord,
+    Forecast,
+    Level,
+    Report,
+    RunningStats,
+    InMemorySensorRepository,
+    InMemoryStorageRepository,
+    InMemoryForecastRepository,
+    ColumnarStorageRepository,
+    MappedLogStorageRepository,
+    SqliteDatabase,
+    SqliteStorageRepository,
+    SqliteForecastRepository,
+    TrendIndex,
+)
+from controllers import (
+    AnalysisController,
+    DataCollectionController,
+    JournalManager,
+    LevelManager,
+    LogEntry,
+    PollingScheduler,
+    ReplaySource,
+    SourcedSensor,
+    SweepEngine,
+    SyntheticSource,
+    WriteQueue,
+    compute_group_stats,
+    compute_preview,
+    ingest_ndjson,
+    synthetic_sensors,
+    write_ndjson,
+)
+from controllers.parallel import parallel_level_stats
+from infrastructure import DependencyContainer, SnapshotManager, SystemConfigurator
+
+
+def make_records(count: int, sensors: int = 16, levels: int = 8) -> List[StorageRecord]:
+    base = datetime(2024, 1, 1)
+    return [
+        StorageRecord(
+            timestamp=base + timedelta(milliseconds=10 * i),
+            sensor_id=i % sensors,
+            value=float(i % 1000) / 10.0,
+            event_type=f"MEASURE_LEVEL_{i % levels}",
+        )
+        for i in range(count)
+    ]
+
+
+def _measure(factory: Callable[[], object], fill: Callable[[object], None]):
+    """
+    Возвращает (объект, секунды, байты памяти, занятые объектом).
+
+    tracemalloc заметно замедляет выделения, поэтому время и память
+    снимаются в двух отдельных прогонах.
+    """
+    gc.collect()
+    tracemalloc.start()
+    probe = factory()
+    fill(probe)
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del probe
+
+    gc.collect()
+    started = time.perf_counter()
+    obj = factory()
+    fill(obj)
+    elapsed = time.perf_counter() - started
+    return obj, elapsed, size
+
+
+def _report(name: str, count: int, elapsed: float, size: int | None = None) -> None:
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    line = f"  {name:<40} {elapsed:8.3f} c  {rate:12,.0f} зап/с"
+    if size is not None:
+        line += f"  {size / count:8.1f} байт/запись"
+    print(line)
+
+
+def bench_storage(records: int) -> None:
+    """Списочное хранилище против колоночного: память, запись, чтение."""
+    print(f"===== ХРАНИЛИЩЕ ПОКАЗАНИЙ ({records:,} записей) =====")
+
+    engines = {
+        "InMemoryStorageRepository": InMemoryStorageRepository,
+        "ColumnarStorageRepository": ColumnarStorageRepository,
+    }
+    for name, repo_cls in engines.items():
+        # Записи создаются внутри замера: у колоночного хранилища объекты
+        # StorageRecord не переживают save, у списочного — хранятся целиком.
+        def fill(repo) -> None:
+            base = datetime(2024, 1, 1)
+            for i in range(records):
+                repo.save_record(StorageRecord(
+                    timestamp=base + timedelta(milliseconds=10 * i),
+                    sensor_id=i % 16,
+                    value=float(i % 1000) / 10.0,
+                    event_type=f"MEASURE_LEVEL_{i % 8}",
+                ))
+
+        repo, elapsed, size = _measure(repo_cls, fill)
+        _report(f"{name}.save_record", records, elapsed, size)
+
+        batch = make_records(records)
+        _timed(f"{name}.save_records", records, lambda: repo_cls().save_records(batch))
+
+        started = time.perf_counter()
+        history = repo.get_history(3)
+        _report(f"{name}.get_history", records, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        everything = repo.get_all()
+        _report(f"{name}.get_all", records, time.perf_counter() - started)
+
+        del repo, history, everything
+    print()
+
+
+def _timed(name: str, count: int, action: Callable[[], object]) -> None:
+    started = time.perf_counter()
+    action()
+    _report(name, count, time.perf_counter() - started)
+
+
+def bench_sqlite(records: int) -> None:
+    """SQLite-репозитории (файл, WAL) против in-memory."""
+    print(f"===== SQLITE ПРОТИВ IN-MEMORY ({records:,} записей) =====")
+
+    data = make_records(records)
+    start = data[len(data) // 2].timestamp
+    end = start + timedelta(minutes=1)
+    single = min(records, 20_000)
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": (InMemoryStorageRepository, InMemoryForecastRepository, None),
+            "sqlite": (
+                SqliteStorageRepository,
+                SqliteForecastRepository,
+                SqliteDatabase(os.path.join(tmp, "bench.db")),
+            ),
+        }
+        for name, (storage_cls, forecast_cls, db) in backends.items():
+            args = () if db is None else (db,)
+            storage = storage_cls(*args)
+            # Поштучная запись: у SQLite — отдельная транзакция на запись
+            _timed(f"{name}.save_record", single, lambda: [
+                storage.save_record(StorageRecord(r.timestamp, r.sensor_id, r.value, r.event_type))
+                for r in data[:single]
+            ])
+            storage.clear_old(datetime.max)
+            batch = [StorageRecord(r.timestamp, r.sensor_id, r.value, r.event_type) for r in data]
+            _timed(f"{name}.save_records", records, lambda: storage.save_records(batch))
+            _timed(f"{name}.get_history", records, lambda: storage.get_history(3))
+            _timed(f"{name}.get_level_history", records, lambda: storage.get_level_history(5))
+            _timed(f"{name}.get_range (1 мин)", records, lambda: storage.get_range(start, end))
+
+            forecasts = forecast_cls(*args)
+            now = datetime.now()
+            _timed(f"{name}.save_forecast", single, lambda: [
+                forecasts.save_forecast(Forecast(i, "Уровень", 0.5, "—", now))
+                for i in range(single)
+            ])
+            _timed(f"{name}.forecasts.get_all", single, forecasts.get_all)
+            if db is not None:
+                db.close()
+    print()
+
+
+def bench_mmap(records: int) -> None:
+    """Журнал в отображаемом файле: запись и проход по истории без копирования."""
+    print(f"===== ЖУРНАЛ В ОТОБРАЖАЕМОМ ФАЙЛЕ ({records:,} записей) =====")
+
+    data = make_records(records)
+    with tempfile.TemporaryDirectory() as tmp:
+        log = MappedLogStorageRepository(os.path.join(tmp, "bench.log"))
+        _timed("mmap.save_record", records, lambda: [log.save_record(r) for r in data])
+
+        def scan_columns() -> float:
+            with log.columns() as cols:
+                return sum(cols.values)
+
+        _timed("mmap.columns (сумма значений)", records, scan_columns)
+        _timed("mmap.get_all (сумма значений)", records, lambda: sum(r.value for r in log.get_all()))
+        log.close()
+    print()
+
+
+def bench_snapshot(records: int) -> None:
+    """Сохранение и загрузка снимка состояния с показаниями."""
+    print(f"===== СНИМОК СОСТОЯНИЯ ({records:,} записей) =====")
+
+    data = make_records(records)
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("memory", "columnar"):
+            snapshot = SnapshotManager(os.path.join(tmp, f"{backend}.snapshot"))
+            source = DependencyContainer()
+            SystemConfigurator(backend).configure(source)
+            source.resolve("repo:storage").save_records(
+                StorageRecord(r.timestamp, r.sensor_id, r.value, r.event_type) for r in data
+            )
+            _timed(f"{backend}.snapshot.save", records, lambda: snapshot.save(source))
+            size = os.path.getsize(snapshot.path)
+
+            target = DependencyContainer()
+            SystemConfigurator(backend).configure(target)
+            _timed(f"{backend}.snapshot.load", records, lambda: snapshot.load(target))
+            print(f"  {'размер файла':<40} {size / records:8.1f} байт/запись")
+    print()
+
+
+def bench_rollups(records: int) -> None:
+    """Агрегаты за весь период: уровни агрегации против просмотра сырых данных."""
+    print(f"===== АГРЕГАТЫ ПО РАЗРЕШЕНИЯМ ({records:,} записей) =====")
+
+    data = make_records(records)
+    plain = InMemoryStorageRepository()
+    _timed("save_records без агрегатов", records, lambda: plain.save_records(data))
+    rolled = InMemoryStorageRepository()
+    rolled.enable_rollups()
+    batch = [StorageRecord(r.timestamp, r.sensor_id, r.value, r.event_type) for r in data]
+    _timed("save_records с агрегатами", records, lambda: rolled.save_records(batch))
+
+    def raw_hourly() -> Dict[datetime, float]:
+        sums: Dict[datetime, float] = {}
+        for record in plain.iter_level_history(5):
+            hour = record.timestamp.replace(minute=0, second=0, microsecond=0)
+            sums[hour] = sums.get(hour, 0.0) + record.value
+        return sums
+
+    _timed("почасовые суммы уровня (сырые)", records, raw_hourly)
+    _timed(
+        "почасовые суммы уровня (агрегаты)",
+        records,
+        lambda: rolled.get_rollups(None, None, timedelta(hours=1), level_id=5),
+    )
+    print()
+
+
+def bench_groups(records: int) -> None:
+    """Групповая статистика (уровень, тип сенсора) по колоночному хранилищу."""
+    print(f"===== ГРУППОВАЯ СТАТИСТИКА ({records:,} записей) =====")
+
+    sensors = InMemorySensorRepository()
+    sensors.save_many(
+        Sensor(i, "load" if i % 2 else "completion_time", "", 5) for i in range(16)
+    )
+    storage = ColumnarStorageRepository()
+    chunk = 1_000_000
+    for offset in range(0, records, chunk):
+        storage.save_records(make_records(min(chunk, records - offset)))
+    _timed("export_columns", records, storage.export_columns)
+    _timed("compute_group_stats", records, lambda: compute_group_stats(storage, sensors))
+    print()
+
+
+def bench_forecasts(levels: int) -> None:
+    """Прогнозы по одному (create_forecast) и пакетом (create_forecasts)."""
+    print(f"===== ПАКЕТНЫЕ ПРОГНОЗЫ ({levels:,} уровней) =====")
+
+    sensors = InMemorySensorRepository()
+    sensors.save_many(
+        Sensor(i, "load" if i % 2 else "completion_time", "", 5) for i in range(16)
+    )
+    storage = InMemoryStorageRepository()
+    storage.save_records(make_records(levels * 10, levels=levels))
+    items = [Level(i, f"level_{i}", (i % 10) / 10, {}, "") for i in range(levels)]
+
+    def controller() -> AnalysisController:
+        return AnalysisController(
+            storage, InMemoryForecastRepository(), JournalManager(), sensors
+        )
+
+    single = controller()
+    _timed("create_forecast x N", levels, lambda: [single.create_forecast(l) for l in items])
+    batch = controller()
+    _timed("create_forecasts", levels, lambda: batch.create_forecasts(items))
+    print()
+
+
+def bench_sweep(points: int) -> None:
+    """Перебор сетки параметров: compute_preview в цикле и SweepEngine."""
+    side = max(2, round(points ** (1 / 3)))
+    print(f"===== ПЕРЕБОР ПАРАМЕТРОВ ({side ** 3:,} точек) =====")
+
+    axis = list(range(side))
+
+    def scalar() -> None:
+        for d in axis:
+            for e in axis:
+                for r in axis:
+                    compute_preview(d, e, r)
+
+    _timed("compute_preview x N", side ** 3, scalar)
+    _timed("SweepEngine (1 процесс)", side ** 3, lambda: SweepEngine(workers=1).run(axis, axis, axis))
+    workers = os.cpu_count() or 1
+    if workers > 1:
+        engine = SweepEngine(workers=workers, parallel_threshold=1)
+        _timed(f"SweepEngine ({workers} процессов)", side ** 3, lambda: engine.run(axis, axis, axis))
+    print()
+
+
+def bench_windows(records: int) -> None:
+    """Анализ окон времени: фильтрация всей истории и TimeWindowIndex."""
+    print(f"===== АНАЛИЗ ОКОН ВРЕМЕНИ ({records:,} записей) =====")
+
+    storage = InMemoryStorageRepository()
+    storage.save_records(make_records(records))
+    analysis = AnalysisController(storage, InMemoryForecastRepository(), JournalManager())
+    level = Level(1, "level_1", 0.5, {}, "")
+    base = datetime(2024, 1, 1)
+    span = timedelta(milliseconds=10 * records)
+    since, until = base + span / 4, base + span / 2
+
+    def scan() -> None:
+        values = [
+            r.value for r in storage.iter_level_history(1)
+            if since <= r.timestamp < until
+        ]
+        RunningStats.of(values)
+
+    _timed("фильтрация истории", records, scan)
+    _timed("analyze_data(since, until) + индекс", records, lambda: analysis.analyze_data(level, since, until))
+    _timed("analyze_data(since, until)", records, lambda: analysis.analyze_data(level, since, until))
+    _timed(
+        "analyze_windows, 100 окон",
+        records,
+        lambda: analysis.analyze_windows(level, span / 10, step=span / 100, since=base, until=base + span),
+    )
+    print()
+
+
+def bench_parallel(records: int, max_workers: int | None = None) -> None:
+    """Масштабирование параллельного анализа от 1 до N процессов."""
+    print(f"===== ПАРАЛЛЕЛЬНЫЙ АНАЛИЗ ({records:,} записей) =====")
+
+    storage = ColumnarStorageRepository()
+    chunk = 1_000_000
+    for offset in range(0, records, chunk):
+        storage.save_records(make_records(min(chunk, records - offset)))
+    cores = os.cpu_count() or 1
+    top = max_workers or cores
+    counts = sorted({1, top, *(2 ** i for i in range(1, top.bit_length()) if 2 ** i < top)})
+    print(f"  ядер: {cores}")
+    for workers in counts:
+        _timed(
+            f"parallel_level_stats, {workers} проц.",
+            records,
+            lambda: parallel_level_stats(storage, workers, min_rows_per_worker=1),
+        )
+    print()
+
+
+def bench_history(records: int) -> None:
+    """Сценарий исторического анализа поверх поддерживаемых агрегатов."""
+    print(f"===== ИСТОРИЧЕСКИЙ АНАЛИЗ ({records:,} записей) =====")
+
+    container = DependencyContainer()
+    configurator = SystemConfigurator()
+    configurator.configure(container)
+    factory = configurator.controller_factory
+    level_manager: LevelManager = container.resolve(LevelManager)
+    for level_id in range(8):
+        level_manager.create_level({"id": level_id, "name": f"level_{level_id}"})
+    storage = container.resolve("repo:storage")
+    chunk = 1_000_000
+    _timed("запись показаний с агрегатами", records, lambda: [
+        storage.save_records(make_records(min(chunk, records - offset)))
+        for offset in range(0, records, chunk)
+    ])
+    analysis = factory.create("analysis")
+    for _ in range(100):
+        analysis.create_forecasts(level_manager.get_levels())
+    interface = factory.create("interface")
+    # Холодное построение: столько стоит запуск над уже накопленной историей
+    # (перезапуск с SQLite, восстановление снимка); при работе индекс
+    # пополняется при записи, и запрос его не строит
+    started = time.perf_counter()
+    cold = TrendIndex(storage)
+    _report("TrendIndex: построение при запуске", records, time.perf_counter() - started)
+    storage.unsubscribe(cold)
+    repeats = 20
+    started = time.perf_counter()
+    for _ in range(repeats):
+        interface.handle_user_choice("historical_analysis")
+    _report(f"historical_analysis (среднее из {repeats})", records,
+            (time.perf_counter() - started) / repeats)
+    print()
+
+
+def bench_ingest(records: int) -> None:
+    """Приём NDJSON от внешних источников: разбор по кускам и пакетная запись."""
+    print(f"===== ПРИЁМ NDJSON ({records:,} показаний) =====")
+
+    container = DependencyContainer()
+    configurator = SystemConfigurator()
+    configurator.configure(container)
+    data = configurator.controller_factory.create("data")
+    base = datetime(2024, 1, 1).timestamp()
+    body = "".join(
+        f'{{"sensor_id": {1 + i % 2}, "value": {i % 97 * 1.5}, '
+        f'"timestamp": {base + i * 0.01:.2f}, "level_id": {i % 8}}}\n'
+        for i in range(records)
+    ).encode()
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+    sensor_ids = [sensor.sensor_id for sensor in container.resolve("repo:sensor").get_all()]
+    _timed("ingest_ndjson (куски по 64 КиБ)", records,
+           lambda: ingest_ndjson(chunks, data, sensor_ids))
+    print()
+
+
+def bench_write_queue(sweeps: int) -> None:
+    """Сбор данных в SQLite: запись в потоке сбора против очереди с писателем."""
+    print(f"===== ОЧЕРЕДЬ ЗАПИСИ ({sweeps:,} опросов, SQLite) =====")
+
+    sensors = InMemorySensorRepository()
+    for sensor_id in range(1, 17):
+        sensors.add_sensor(Sensor(sensor_id, "load", "%", 5, 0.5))
+    readings = sweeps * 16
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SqliteDatabase(os.path.join(tmp, "bench.db"))
+        for policy in (None, "block", "drop_oldest"):
+            storage = SqliteStorageRepository(db)
+            writer = WriteQueue(storage, policy=policy) if policy is not None else None
+            data = DataCollectionController(sensors, storage, JournalManager(), writer=writer)
+            data.initialize_sensors()
+            name = "без очереди" if writer is None else policy
+            _timed(f"collect_data ({name})", readings, lambda: [
+                data.collect_data(level_id=1) for _ in range(sweeps)
+            ])
+            if writer is not None:
+                _timed(f"  дозапись при close ({name})", readings, writer.close)
+                metrics = writer.metrics()
+                print(f"    записей в БД: {metrics['writes']:.0f}, "
+                      f"макс. глубина: {metrics['max_depth']:.0f}, "
+                      f"отброшено: {metrics['dropped']:.0f}, "
+                      f"задержка записи: {metrics['mean_write_latency'] * 1000:.2f} мс")
+            storage.clear_old(datetime.max)
+        db.close()
+    print()
+
+
+def _with_dict(cls: type) -> type:
+    """Та же сущность, но обычным dataclass с __dict__ (как было до slots)."""
+    spec = [
+        (f.name, f.type, field(default=f.default, compare=f.compare))
+        if f.default is not MISSING else (f.name, f.type)
+        for f in fields(cls)
+    ]
+    return make_dataclass(cls.__name__, spec)
+
+
+def bench_entities(count: int) -> None:
+    """Память на объект и скорость создания сущностей: __dict__ против slots."""
+    print(f"===== СУЩНОСТИ: __dict__ ПРОТИВ SLOTS ({count:,} объектов) =====")
+
+    now = datetime(2024, 1, 1)
+    # Поля общие для всех объектов, поэтому замер памяти — только сами объекты
+    samples: Dict[type, Tuple[Any, ...]] = {
+        StorageRecord: (now, 1, 0.5, "MEASURE_LEVEL_1"),
+        LogEntry: (now, "INFO", "Сбор данных с сенсоров завершён"),
+        Sensor: (1, "load", "%", 5, 0.5),
+        Forecast: (1, "Уровень", 0.5, "—", now),
+        Report: (1, now, "system", "summary", "content"),
+    }
+    for cls, args in samples.items():
+        for label, kind in (("__dict__", _with_dict(cls)), ("slots", cls)):
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            objs = [kind(*args) for _ in range(count)]
+            size = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            del objs
+            _timed(f"{cls.__name__} ({label})", count, lambda: [kind(*args) for _ in range(count)])
+            print(f"    {size / count:.1f} байт/объект")
+    print()
+
+
+def bench_sources(sensors: int, seconds: float = 2.0) -> None:
+    """Сквозная пропускная способность сбора с синтетическими и записанными сенсорами."""
+    print(f"===== ИСТОЧНИКИ ПОКАЗАНИЙ ({sensors:,} сенсоров) =====")
+
+    sweeps = 20
+    container = DependencyContainer()
+    configurator = SystemConfigurator(sensors=synthetic_sensors(sensors, SyntheticSource(seed=1)))
+    configurator.configure(container)
+    data = configurator.controller_factory.create("data")
+    data.initialize_sensors()
+    _timed("collect_data (синтетические)", sensors * sweeps, lambda: [
+        data.collect_data(level_id=1) for _ in range(sweeps)
+    ])
+    data.finish_collection()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "feed.ndjson")
+        write_ndjson(make_records(sensors * sweeps, sensors=sensors), path)
+        replay = ReplaySource(path, speed=60.0, loop=True)
+        container = DependencyContainer()
+        configurator = SystemConfigurator(sensors=[
+            SourcedSensor(sensor_id, "load", "%", 5, replay) for sensor_id in range(sensors)
+        ])
+        configurator.configure(container)
+        data = configurator.controller_factory.create("data")
+        data.initialize_sensors()
+        _timed("collect_data (воспроизведение)", sensors * sweeps, lambda: [
+            data.collect_data(level_id=1) for _ in range(sweeps)
+        ])
+        data.finish_collection()
+        replay.close()
+
+    # Фоновый опрос по poll_frequency с записью через очередь
+    frequency = 10
+    container = DependencyContainer()
+    configurator = SystemConfigurator(
+        polling=True,
+        write_queue="block",
+        sensors=synthetic_sensors(sensors, SyntheticSource(seed=1), poll_frequency=frequency),
+    )
+    configurator.configure(container)
+    data = configurator.controller_factory.create("data")
+    scheduler = container.resolve(PollingScheduler)
+    data.initialize_sensors(level_id=1)
+    time.sleep(seconds)
+    data.finish_collection()
+    metrics = scheduler.metrics()
+    stored = len(container.resolve("repo:storage").get_level_history(1))
+    _report(f"опрос {frequency} Гц (цель {sensors * frequency:,}/с)", int(metrics["polls"]), seconds)
+    print(f"    сохранено: {stored:,}, пакетов: {metrics['batches']:.0f}, "
+          f"задержка: средняя {metrics['mean_lag'] * 1000:.1f} мс, "
+          f"макс. {metrics['max_lag'] * 1000:.1f} мс, пропущено тактов: {metrics['missed_ticks']:.0f}")
+    container.resolve(WriteQueue).close()
+    print()
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], None]] = {
+    "storage": lambda args: bench_storage(args.records),
+    "sqlite": lambda args: bench_sqlite(args.records),
+    "mmap": lambda args: bench_mmap(args.records),
+    "snapshot": lambda args: bench_snapshot(args.records),
+    "rollups": lambda args: bench_rollups(args.records),
+    "groups": lambda args: bench_groups(args.records),
+    "forecasts": lambda args: bench_forecasts(max(1, args.records // 20)),
+    "sweep": lambda args: bench_sweep(args.records * 5),
+    "windows": lambda args: bench_windows(args.records),
+    "parallel": lambda args: bench_parallel(args.records * 5, args.workers),
+    "history": lambda args: bench_history(args.records * 5),
+    "ingest": lambda args: bench_ingest(args.records),
+    "queue": lambda args: bench_write_queue(max(1, args.records // 20)),
+    "entities": lambda args: bench_entities(args.records),
+    "sources": lambda args: bench_sources(max(1, args.records // 100)),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("names", nargs="*", choices=[[], *BENCHMARKS], default=[])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=None, help="N для замера parallel")
+    args = parser.parse_args()
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
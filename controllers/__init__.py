@@ -2,6 +2,23 @@ from .journal import LogEntry, JournalManager
 from .level_manager import LevelManager
 from .data_collection import DataCollectionController
 from .analysis import AnalysisController
+from .group_stats import GroupStats, GroupedStats, compute_group_stats
+from .quantiles import KllSketch, QuantileRegistry
+from .forecast_cache import ForecastCache
+from .sweep import SweepEngine, SweepResult, compute_preview
+from .anomaly import Anomaly, AnomalyDetector
+from .history import LevelTrend, SensorTrend
+from .polling import PollingScheduler
+from .ingest import IngestResult, NdjsonIngestor, ingest_ndjson
+from .write_queue import WriteQueue
+from .sources import (
+    ReplaySource,
+    SensorSource,
+    SourcedSensor,
+    SyntheticSource,
+    synthetic_sensors,
+    write_ndjson,
+)
 from .decision_support import DecisionSupportController
 from .interface import InterfaceController
 
@@ -11,6 +28,30 @@ __all__ = [
     "LevelManager",
     "DataCollectionController",
     "AnalysisController",
+    "GroupStats",
+    "GroupedStats",
+    "compute_group_stats",
+    "KllSketch",
+    "QuantileRegistry",
+    "ForecastCache",
+    "SweepEngine",
+    "SweepResult",
+    "compute_preview",
+    "Anomaly",
+    "AnomalyDetector",
+    "LevelTrend",
+    "SensorTrend",
+    "PollingScheduler",
+    "IngestResult",
+    "NdjsonIngestor",
+    "ingest_ndjson",
+    "WriteQueue",
+    "SensorSource",
+    "SourcedSensor",
+    "SyntheticSource",
+    "ReplaySource",
+    "synthetic_sensors",
+    "write_ndjson",
     "DecisionSupportController",
     "InterfaceController",
 ]
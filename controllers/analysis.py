@@ -1,10 +1,62 @@
 from __future__ import annotations
 
-from statistics import mean
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, TypeVar
 
-from model import Level, StorageRecord, StorageRepository, Forecast, ForecastRepository
+from model import (
+    Level,
+    StorageRepository,
+    SensorRepository,
+    Forecast,
+    ForecastRepository,
+    RunningStats,
+    RunningStatsIndex,
+    TimeWindowIndex,
+    TrendIndex,
+)
+from .group_stats import GroupedStats, UNKNOWN_SENSOR_TYPE, compute_group_stats
+from .forecast_cache import ForecastCache
+from .history import LevelTrend, PassabilityHistory, SensorTrend
 from .journal import JournalManager
+from .parallel import parallel_level_stats
+from .quantiles import KllSketch, QuantileRegistry
+
+
+# Доли квантилей по умолчанию
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Тип сенсора, по среднему которого оценивается проходимость (секунды прохождения)
+COMPLETION_SENSOR_TYPE = "completion_time"
+
+# Время прохождения (секунды), при котором его вклад в оценку максимален
+COMPLETION_NORM = 120.0
+
+
+def passability(difficulty: float, completion_mean: float) -> float:
+    """Оценка проходимости в [0, 1]: сложность и время прохождения поровну."""
+    avg_norm = min(1.0, completion_mean / COMPLETION_NORM)
+    raw_score = 1.0 - (0.5 * difficulty + 0.5 * avg_norm)
+    return max(0.0, min(1.0, raw_score))
+
+
+def recommendation(score: float) -> str:
+    return "Снизить сложность уровня" if score < 0.5 else "Уровень сбалансирован"
+
+
+T = TypeVar("T")
+
+
+def _locked(method: Callable[..., T]) -> Callable[..., T]:
+    """
+    Метод выполняется под блокировкой хранилища: индексы, кэш и скетчи
+    обновляются в потоке записи (фоновый опрос, очередь записи) под ней же.
+    """
+    @wraps(method)
+    def wrapper(self: "AnalysisController", *args: Any, **kwargs: Any) -> T:
+        with self._storage.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class AnalysisController:
@@ -15,64 +67,373 @@ class AnalysisController:
         storage_repository: StorageRepository,
         forecast_repository: ForecastRepository,
         journal: Optional[JournalManager] = None,
+        sensor_repository: Optional[SensorRepository] = None,
+        quantiles: Optional[QuantileRegistry] = None,
+        forecast_cache: Optional[ForecastCache] = None,
+        trends: Optional[TrendIndex] = None,
     ) -> None:
         self._storage = storage_repository
         self._forecasts = forecast_repository
         self._journal = journal or JournalManager()
+        # Без репозитория сенсоров показания не делятся по типам
+        self._sensors = sensor_repository
         self._last_analysis: Dict[str, float] = {}
+        # Статистика по уровням и сенсорам, обновляемая при записи показаний
+        with storage_repository.lock:
+            self._stats = RunningStatsIndex(storage_repository)
+        # Приближённые квантили, обновляемые при записи показаний; без общего
+        # реестра свой строится по хранилищу при первом запросе
+        self._quantile_registry = quantiles
+        # Без кэша каждый вызов create_forecast считает прогноз заново
+        self._cache = forecast_cache
+        # Временные ряды уровней для анализа окон; строятся при первом запросе
+        self._time_index: Optional[TimeWindowIndex] = None
+        # Тренды показаний для исторического анализа, обновляемые при записи;
+        # без общего индекса свой строится по хранилищу при первом запросе
+        self._trend_index = trends
+        # Сводка прогнозов: строится по репозиторию сразу, дальше пополняется
+        # новыми прогнозами
+        self._passability = PassabilityHistory(forecast_repository.iter_all())
 
-    def analyze_data(self, level: Level) -> Dict[str, float]:
-       
-        records: List[StorageRecord] = self._storage.get_all()
-        values = [r.value for r in records]
+    @property
+    def _windows(self) -> TimeWindowIndex:
+        if self._time_index is None:
+            self._time_index = TimeWindowIndex(self._storage)
+        return self._time_index
+
+    @property
+    def _quantiles(self) -> QuantileRegistry:
+        if self._quantile_registry is None:
+            self._quantile_registry = QuantileRegistry(storage=self._storage)
+        return self._quantile_registry
 
-        stats: Dict[str, float] = {
-            "records_count": float(len(records)),
-            "average_value": float(mean(values)) if values else 0.0,
+    @property
+    def _trends(self) -> TrendIndex:
+        if self._trend_index is None:
+            self._trend_index = TrendIndex(self._storage)
+        return self._trend_index
+
+    def _type_stats(self, by_sensor: Dict[int, RunningStats]) -> Dict[str, RunningStats]:
+        if self._sensors is None:
+            return {}
+        by_type: Dict[str, RunningStats] = {}
+        for sensor_id, stats in by_sensor.items():
+            sensor = self._sensors.load(sensor_id)
+            sensor_type = sensor.type if sensor is not None else UNKNOWN_SENSOR_TYPE
+            by_type.setdefault(sensor_type, RunningStats()).merge(stats)
+        return by_type
+
+    def _level_stats(self, level: Level) -> Dict[str, float]:
+        return self._summary(
+            level,
+            self._stats.level(level.level_id),
+            self._stats.level_sensors(level.level_id),
+        )
+
+    def _window_stats(
+        self,
+        level: Level,
+        since: Optional[datetime],
+        until: Optional[datetime],
+    ) -> Dict[str, float]:
+        by_sensor = self._windows.window(level.level_id, since, until)
+        total = RunningStats()
+        for stats in by_sensor.values():
+            total.merge(stats)
+        return self._summary(level, total, by_sensor)
+
+    def _summary(
+        self,
+        level: Level,
+        total: RunningStats,
+        by_sensor: Dict[int, RunningStats],
+    ) -> Dict[str, float]:
+        running = total.as_dict()
+        stats = {
+            "records_count": running["count"],
+            "average_value": running["mean"],
+            "value_stddev": running["stddev"],
+            "min_value": running["min"],
+            "max_value": running["max"],
             "level_difficulty": float(level.difficulty),
         }
+        # Средние по типам сенсоров: проценты нагрузки и секунды не смешиваются
+        for sensor_type, by_type in sorted(self._type_stats(by_sensor).items()):
+            if by_type.count:
+                stats[f"{sensor_type}_mean"] = by_type.mean
+        return stats
+
+    @_locked
+    def analyze_groups(self, level_ids: Optional[Iterable[int]] = None) -> GroupedStats:
+        """
+        Полная статистика по группам (уровень, тип сенсора): среднее,
+        stddev, перцентили p50/p95/p99, min/max. Просматривает хранилище.
+        """
+        groups = compute_group_stats(self._storage, self._sensors, level_ids)
+        self._journal.add_entry(
+            f"Групповой анализ завершён: {len(groups)} групп по {len(groups.levels())} уровням",
+            level="INFO",
+        )
+        return groups
+
+    @staticmethod
+    def _quantile_map(sketch: KllSketch, qs: Sequence[float]) -> Dict[str, float]:
+        return {f"p{q * 100:g}": v for q, v in zip(qs, sketch.quantiles(qs))}
+
+    @_locked
+    def sensor_quantiles(
+        self,
+        sensor_id: int,
+        qs: Sequence[float] = DEFAULT_QUANTILES,
+    ) -> Dict[str, float]:
+        """
+        Квантили показаний сенсора по скетчу KLL: {"p50": ..., "p95": ...}.
+        Ошибка ранга — около 1 % (см. KllSketch), память не растёт с историей.
+        """
+        return self._quantile_map(self._quantiles.sensor(sensor_id), qs)
+
+    @_locked
+    def level_quantiles(
+        self,
+        level_id: int,
+        qs: Sequence[float] = DEFAULT_QUANTILES,
+    ) -> Dict[int, Dict[str, float]]:
+        """Квантили показаний уровня по каждому сенсору: sensor_id -> {"p50": ...}."""
+        return {
+            sensor_id: self._quantile_map(sketch, qs)
+            for sensor_id, sketch in sorted(self._quantiles.level_sensors(level_id).items())
+        }
+
+    @_locked
+    def analyze_data(
+        self,
+        level: Level,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Dict[str, float]:
+        """
+        Статистика уровня за всю историю или за окно [since, until).
+        Границы окна находятся бинарным поиском по времени.
+        """
+        if since is None and until is None:
+            # O(1): агрегаты уровня поддерживаются при записи показаний
+            stats = self._level_stats(level)
+            scope = ""
+        else:
+            stats = self._window_stats(level, since, until)
+            scope = f" за [{since or '…'}, {until or '…'})"
 
         self._last_analysis = stats
         self._journal.add_entry(
-            f"Анализ завершён для уровня '{level.name}': {stats}",
+            f"Анализ завершён для уровня '{level.name}'{scope}: {stats}",
             level="INFO",
         )
         return stats
 
-    def create_forecast(self, level: Level) -> Forecast:
-      
-        analysis = self._last_analysis or self.analyze_data(level)
+    @_locked
+    def analyze_parallel(
+        self,
+        levels: Iterable[Level],
+        workers: Optional[int] = None,
+    ) -> Dict[int, Dict[str, float]]:
+        """
+        analyze_data для многих уровней с пересчётом по всей истории в пуле
+        процессов (см. parallel_level_stats). Результат по каждому уровню
+        имеет тот же вид, что и у analyze_data.
+        """
+        levels = list(levels)
+        by_level = parallel_level_stats(self._storage, workers)
+        result = {}
+        for level in levels:
+            by_sensor = by_level.get(level.level_id, {})
+            total = RunningStats()
+            for stats in by_sensor.values():
+                total.merge(stats)
+            result[level.level_id] = self._summary(level, total, by_sensor)
+        self._journal.add_entry(
+            f"Параллельный анализ завершён для {len(levels)} уровней",
+            level="INFO",
+        )
+        return result
 
-        avg_value = analysis.get("average_value", 0.0)
-        difficulty = analysis.get("level_difficulty", level.difficulty)
+    @_locked
+    def analyze_windows(
+        self,
+        level: Level,
+        width: timedelta,
+        step: Optional[timedelta] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Tuple[datetime, Dict[str, float]]]:
+        """
+        Скользящие окна [start, start + width) с шагом step (по умолчанию
+        width — окна без перекрытия) от since до until; без границ — от
+        первого до последнего показания уровня. Перекрывающиеся окна
+        переиспользуют кэшированную статистику блоков показаний.
+        """
+        step = step if step is not None else width
+        if width <= timedelta(0) or step <= timedelta(0):
+            raise ValueError("Ширина и шаг окна должны быть положительными")
+        if since is None or until is None:
+            bounds = self._windows.bounds(level.level_id)
+            if bounds is None:
+                return []
+            since = since if since is not None else bounds[0]
+            until = until if until is not None else bounds[1] + timedelta(microseconds=1)
 
+        windows = []
+        start = since
+        while start < until:
+            end = min(start + width, until)
+            windows.append((start, self._window_stats(level, start, end)))
+            start += step
+        self._journal.add_entry(
+            f"Анализ окон для уровня '{level.name}': {len(windows)} окон по {width}",
+            level="INFO",
+        )
+        return windows
 
-        avg_norm = min(1.0, avg_value / 120.0)
+    def _next_forecast_id(self) -> int:
+        last = self._forecasts.latest()
+        return last.forecast_id + 1 if last is not None else 1
 
-        raw_score = 1.0 - (0.5 * difficulty + 0.5 * avg_norm)
+    @_locked
+    def create_forecast(self, level: Level) -> Forecast:
+      
+        if self._cache is not None:
+            cached = self._cache.get(level)
+            if cached is not None:
+                self._journal.add_entry(
+                    f"Прогноз #{cached.forecast_id} для уровня '{level.name}' взят из кэша",
+                    level="INFO",
+                )
+                return cached
 
-        base_passability = max(0.0, min(1.0, raw_score))
+        analysis = self._level_stats(level)
 
-        forecast_id = len(self._forecasts.get_all()) + 1
-        recommendations = (
-            "Снизить сложность уровня"
-            if base_passability < 0.5
-            else "Уровень сбалансирован"
+        avg_value = analysis.get(
+            f"{COMPLETION_SENSOR_TYPE}_mean", analysis.get("average_value", 0.0)
         )
+        difficulty = analysis.get("level_difficulty", level.difficulty)
+
+        base_passability = passability(difficulty, avg_value)
 
         forecast = Forecast.from_level(
-            forecast_id=forecast_id,
+            forecast_id=self._next_forecast_id(),
             level=level,
-            recommendations=recommendations,
+            recommendations=recommendation(base_passability),
             passability_score=base_passability,
         )
         self._forecasts.save_forecast(forecast)
+        if self._cache is not None:
+            self._cache.put(level, forecast)
+        self._passability.add(forecast)
         self._journal.add_entry(
             f"Создан прогноз #{forecast.forecast_id} для уровня '{level.name}'",
             level="INFO",
         )
         return forecast
 
+    def _completion_means(self, levels: Sequence[Level]) -> List[float]:
+        """
+        Среднее время прохождения по каждому уровню — как в create_forecast,
+        но типы сенсоров читаются из репозитория один раз на весь пакет.
+        """
+        completion: Set[int] = set()
+        if self._sensors is not None:
+            completion = {
+                s.sensor_id for s in self._sensors.iter_all()
+                if s.type == COMPLETION_SENSOR_TYPE
+            }
+        means = []
+        for level in levels:
+            by_time = RunningStats()
+            if completion:
+                for sensor_id, stats in self._stats.level_sensors(level.level_id).items():
+                    if sensor_id in completion:
+                        by_time.merge(stats)
+            if by_time.count:
+                means.append(by_time.mean)
+            else:
+                means.append(self._stats.level(level.level_id).mean)
+        return means
+
+    @_locked
+    def create_forecasts(self, levels: Iterable[Level]) -> List[Forecast]:
+        """
+        Прогнозы для многих уровней за один вызов: оценки считаются одним
+        проходом, id выделяются подряд, прогнозы сохраняются одной пакетной
+        записью, в журнал пишется одна сводная запись.
+        """
+        levels = list(levels)
+        if not levels:
+            return []
+        scores = list(map(
+            passability,
+            [level.difficulty for level in levels],
+            self._completion_means(levels),
+        ))
+        first_id = self._next_forecast_id()
+        created_at = datetime.now()
+        forecasts = [
+            Forecast(
+                forecast_id=first_id + i,
+                level_name=level.name,
+                passability_score=score,
+                recommendations=recommendation(score),
+                created_at=created_at,
+            )
+            for i, (level, score) in enumerate(zip(levels, scores))
+        ]
+        self._forecasts.save_many(forecasts)
+        if self._cache is not None:
+            for level, forecast in zip(levels, forecasts):
+                self._cache.put(level, forecast)
+        for forecast in forecasts:
+            self._passability.add(forecast)
+        weak = sum(1 for score in scores if score < 0.5)
+        self._journal.add_entry(
+            f"Создано прогнозов: {len(forecasts)} (#{first_id}–#{first_id + len(forecasts) - 1}), "
+            f"требуют снижения сложности: {weak}",
+            level="INFO",
+        )
+        return forecasts
+
+    @_locked
+    def historical_trends(self, levels: Iterable[Level]) -> Dict[int, LevelTrend]:
+        """
+        Проходимость по всем сохранённым прогнозам и тренды показаний
+        сенсоров для каждого уровня. Читает только агрегаты, которые
+        поддерживаются при записи, поэтому не зависит от длины истории.
+        """
+        latest = self._forecasts.latest()
+        if latest is not None and latest.forecast_id != self._passability.last_id:
+            # Прогнозы добавлены в обход контроллера (восстановление снимка)
+            self._passability = PassabilityHistory(self._forecasts.iter_all())
+        result = {}
+        for level in levels:
+            sensors = []
+            for sensor_id, trend in sorted(self._trends.level(level.level_id).items()):
+                sensor = self._sensors.load(sensor_id) if self._sensors is not None else None
+                sensors.append(SensorTrend(
+                    sensor_id=sensor_id,
+                    sensor_type=sensor.type if sensor is not None else UNKNOWN_SENSOR_TYPE,
+                    count=trend.count,
+                    mean=trend.mean,
+                    slope_per_hour=trend.slope,
+                ))
+            summary = self._passability.get(level.name)
+            result[level.level_id] = LevelTrend(
+                level_id=level.level_id,
+                level_name=level.name,
+                forecasts=summary.stats.count if summary is not None else 0,
+                passability_mean=summary.stats.mean if summary is not None else 0.0,
+                passability_first=summary.first[2] if summary is not None else 0.0,
+                passability_last=summary.last[2] if summary is not None else 0.0,
+                sensors=sensors,
+            )
+        return result
+
     def evaluate_results(self) -> Dict[str, float]:
        
         self._journal.add_entry(
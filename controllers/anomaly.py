@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Anomaly:
+    """Показание, далёкое от сглаженного среднего своего ряда."""
+
+    sensor_id: int
+    level_id: Optional[int]
+    timestamp: datetime
+    value: float
+    expected: float
+    zscore: float
+
+
+class _Ewma:
+    __slots__ = ("count", "mean", "variance")
+
+    def __init__(self, value: float) -> None:
+        self.count = 1
+        self.mean = value
+        self.variance = 0.0
+
+
+AnomalyHook = Callable[[Anomaly], None]
+
+
+class AnomalyDetector:
+    """
+    Онлайн-детектор выбросов: экспоненциально сглаженные среднее и
+    дисперсия (EWMA) по каждой паре (уровень, сенсор) и z-оценка нового
+    показания относительно них.
+
+    Каждое показание обрабатывается за O(1) и хранит только состояние
+    ряда, поэтому стоимость не растёт с длиной истории. Первые warmup
+    показаний ряда только обучают его.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.1,
+        threshold: float = 4.0,
+        warmup: int = 10,
+        history: int = 100,
+    ) -> None:
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("Коэффициент сглаживания должен быть в (0, 1]")
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.flagged = 0
+        # Последние найденные аномалии (для мониторинга)
+        self.recent: Deque[Anomaly] = deque(maxlen=history)
+        self._series: Dict[Tuple[Optional[int], int], _Ewma] = {}
+        self._hooks: Tuple[AnomalyHook, ...] = ()
+
+    def subscribe(self, hook: AnomalyHook) -> None:
+        self._hooks = (*self._hooks, hook)
+
+    def observe(
+        self,
+        sensor_id: int,
+        level_id: Optional[int],
+        value: float,
+        timestamp: datetime,
+    ) -> Optional[Anomaly]:
+        key = (level_id, sensor_id)
+        state = self._series.get(key)
+        if state is None:
+            self._series[key] = _Ewma(value)
+            return None
+
+        diff = value - state.mean
+        if state.variance > 0.0:
+            zscore = diff / math.sqrt(state.variance)
+        else:
+            # Ряд до сих пор был постоянным: любое отличие — выброс
+            zscore = 0.0 if diff == 0.0 else math.copysign(math.inf, diff)
+        anomaly = None
+        if state.count >= self.warmup and abs(zscore) > self.threshold:
+            anomaly = Anomaly(sensor_id, level_id, timestamp, value, state.mean, zscore)
+
+        increment = self.alpha * diff
+        state.mean += increment
+        state.variance = (1.0 - self.alpha) * (state.variance + diff * increment)
+        state.count += 1
+
+        if anomaly is not None:
+            self.flagged += 1
+            self.recent.append(anomaly)
+            for hook in self._hooks:
+                hook(anomaly)
+        return anomaly
+
+    def expected(self, sensor_id: int, level_id: Optional[int]) -> Optional[Tuple[float, float]]:
+        """Сглаженные среднее и стандартное отклонение ряда или None."""
+        state = self._series.get((level_id, sensor_id))
+        if state is None:
+            return None
+        return state.mean, math.sqrt(state.variance)
+
+    def anomalies(self) -> List[Anomaly]:
+        return list(self.recent)
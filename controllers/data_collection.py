@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Optional
+import threading
+from typing import Iterable, List, Optional
 
-from model import Sensor, SensorRepository, StorageRecord, StorageRepository
+from model import Sensor, SensorRepository, StorageRecord, StorageRepository, level_event
+from .anomaly import AnomalyDetector
 from .journal import JournalManager
+from .polling import PollingScheduler, Reading, read_sensors
+from .write_queue import WriteQueue, WrittenHook
 
 
 class DataCollectionController:
@@ -15,17 +18,101 @@ class DataCollectionController:
         sensor_repository: SensorRepository,
         storage_repository: StorageRepository,
         journal: Optional[JournalManager] = None,
+        detector: Optional[AnomalyDetector] = None,
+        scheduler: Optional[PollingScheduler] = None,
+        writer: Optional[WriteQueue] = None,
     ) -> None:
         self._sensors = sensor_repository
         self._storage = storage_repository
         self._journal = journal or JournalManager()
+        # Онлайн-проверка каждого показания на выброс
+        self._detector = detector
+        # Фоновый опрос по poll_frequency; без него данные собираются
+        # только вызовами collect_data
+        self._scheduler = scheduler
+        self._level_id: Optional[int] = None
+        # Очередь с фоновым писателем: медленное хранилище не тормозит сбор
+        self._writer = writer
+        # Запись из фонового опроса и из collect_data не должна пересекаться
+        self._lock = threading.Lock()
         self._active: bool = False
 
-    def initialize_sensors(self) -> None:
-      
+    def initialize_sensors(self, level_id: Optional[int] = None) -> None:
+        """
+        Включает сбор данных. С планировщиком запускается фоновый опрос,
+        показания которого относятся к уровню level_id.
+        """
         self._active = True
+        self._level_id = level_id
+        if self._scheduler is not None:
+            self._scheduler.start(self._store_polled)
         self._journal.add_entry("Сенсоры инициализированы", level="INFO")
 
+    def _store_polled(self, readings: List[Reading]) -> None:
+        self.store_readings(readings, self._level_id)
+
+    def store_readings(
+        self,
+        readings: Iterable[Reading],
+        level_id: Optional[int] = None,
+        on_written: Optional[WrittenHook] = None,
+    ) -> int:
+        """
+        Сохраняет показания (sensor_id, значение, время) одним пакетом и
+        возвращает число принятых показаний: 0, если очередь записи отказала.
+        Детектор выбросов и on_written видят только записанные показания:
+        с очередью — после записи в потоке писателя, отброшенные и
+        отклонённые пакеты — нет.
+        """
+        with self._lock:
+            records = self._to_records(readings, level_id)
+            if self._writer is None:
+                with self._storage.lock:
+                    self._storage.save_records(records)
+                    self._written(records, on_written)
+                return len(records)
+            if self._writer.put(records, lambda batch: self._written(batch, on_written)):
+                return len(records)
+            reason = "Очередь записи закрыта" if self._writer.closed else "Очередь записи переполнена"
+            self._journal.add_entry(
+                f"{reason}: {len(records)} показаний не принято", level="WARN"
+            )
+            return 0
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт записи всех поставленных в очередь показаний."""
+        if self._writer is None:
+            return True
+        return self._writer.flush(timeout)
+
+    @staticmethod
+    def _to_records(readings: Iterable[Reading], level_id: Optional[int]) -> List[StorageRecord]:
+        event_type = level_event(level_id)
+        return [
+            StorageRecord(timestamp=timestamp, sensor_id=sensor_id, value=value, event_type=event_type)
+            for sensor_id, value, timestamp in readings
+        ]
+
+    def _written(self, records: List[StorageRecord], on_written: Optional[WrittenHook]) -> None:
+        """Записанный пакет (под storage.lock): проверка на выбросы и on_written."""
+        self._observe(records)
+        if on_written is not None:
+            on_written(records)
+
+    def _observe(self, records: List[StorageRecord]) -> None:
+        """Проверка записанных показаний на выбросы (под storage.lock)."""
+        if self._detector is None:
+            return
+        for record in records:
+            sensor_id, level_id, value = record.sensor_id, record.level_id, record.value
+            anomaly = self._detector.observe(sensor_id, level_id, value, record.timestamp)
+            if anomaly is not None:
+                self._journal.add_entry(
+                    f"Аномальное показание сенсора {sensor_id} (уровень={level_id}): "
+                    f"{value:g} при ожидаемом {anomaly.expected:g}, z={anomaly.zscore:.1f}",
+                    level="WARN",
+                )
+
     def collect_data(self, level_id: Optional[int] = None) -> None:
      
         if not self._active:
@@ -35,15 +122,8 @@ class DataCollectionController:
             )
             return
 
-        for sensor in self._sensors.get_all():
-            value = sensor.read_value()
-            record = StorageRecord(
-                timestamp=datetime.now(),
-                sensor_id=sensor.sensor_id,
-                value=value,
-                event_type=f"MEASURE_LEVEL_{level_id}" if level_id is not None else "MEASURE",
-            )
-            self._storage.save_record(record)
+        # Весь опрос сохраняется одним пакетом
+        self.store_readings(read_sensors(self._sensors.get_all()), level_id)
         self._journal.add_entry("Сбор данных с сенсоров завершён", level="INFO")
 
     def handle_event(self, event: str) -> None:
@@ -53,4 +133,14 @@ class DataCollectionController:
     def finish_collection(self) -> None:
      
         self._active = False
+        if self._scheduler is not None and self._scheduler.running:
+            self._scheduler.stop()
+            metrics = self._scheduler.metrics()
+            self._journal.add_entry(
+                f"Фоновый опрос остановлен: {metrics['polls']:.0f} показаний "
+                f"в {metrics['batches']:.0f} пакетах, задержка до {metrics['max_lag'] * 1000:.1f} мс",
+                level="INFO",
+            )
+        # После остановки сбора все показания видны в хранилище
+        self.flush()
         self._journal.add_entry("Сбор данных остановлен", level="INFO")
@@ -22,7 +22,8 @@ class DecisionSupportController:
 
     def form_report(self, forecast: Forecast, author: str = "system") -> Report:
     
-        report_id = len(self._reports.get_all()) + 1
+        last = self._reports.latest()
+        report_id = last.report_id + 1 if last is not None else 1
 
         summary = f"Рекомендации по уровню '{forecast.level_name}'"
         content = (
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+from model import Forecast, Level, StorageListener, StorageRecord, StorageRepository
+
+
+class ForecastCache(StorageListener):
+    """
+    LRU-кэш прогнозов с ограниченным временем жизни.
+
+    Ключ — состояние уровня (id, имя, сложность, параметры) и версия данных
+    хранилища. Версия растёт при каждой записи или удалении показаний,
+    поэтому новые показания сбрасывают кэш; правка уровня меняет ключ, а
+    invalidate(level_id) сразу освобождает его записи.
+    """
+
+    def __init__(
+        self,
+        storage: Optional[StorageRepository] = None,
+        max_size: int = 1024,
+        ttl: Optional[float] = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_size <= 0:
+            raise ValueError("Размер кэша прогнозов должен быть положительным")
+        self.max_size = max_size
+        # Время жизни записи в секундах; None — без ограничения
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Tuple[Forecast, float]]" = OrderedDict()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        if storage is not None:
+            storage.subscribe(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, level: Level) -> Tuple[Hashable, ...]:
+        return (
+            level.level_id,
+            level.name,
+            level.difficulty,
+            tuple(sorted(level.parameters.items())),
+            self.version,
+        )
+
+    def get(self, level: Level) -> Optional[Forecast]:
+        key = self._key(level)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] < self._clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, level: Level, forecast: Forecast) -> None:
+        expires = self._clock() + self.ttl if self.ttl is not None else float("inf")
+        key = self._key(level)
+        self._entries[key] = (forecast, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, level_id: Optional[int] = None) -> None:
+        """Сбрасывает записи уровня или, без level_id, весь кэш."""
+        if level_id is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == level_id]:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "version": self.version,
+        }
+
+    # ------------------------------------------------------------------
+    # Подписка на хранилище
+    # ------------------------------------------------------------------
+
+    def records_added(self, records: Sequence[StorageRecord]) -> None:
+        self.version += 1
+        self._entries.clear()
+
+    def records_removed(self, records: Sequence[StorageRecord]) -> None:
+        self.version += 1
+        self._entries.clear()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import math
+from array import array
+from dataclasses import dataclass
+from itertools import repeat
+from operator import sub
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from model import RecordColumns, SensorRepository, StorageRepository, level_from_event
+
+
+# Тип для показаний сенсоров, которых нет в репозитории сенсоров
+UNKNOWN_SENSOR_TYPE = "unknown"
+
+GroupKey = Tuple[int, str]  # (level_id, тип сенсора)
+
+
+@dataclass
+class GroupStats:
+    """Распределение показаний одного типа сенсоров на одном уровне."""
+
+    level_id: int
+    sensor_type: str
+    count: int
+    mean: float
+    stddev: float
+    p50: float
+    p95: float
+    p99: float
+    minimum: float
+    maximum: float
+
+
+class GroupedStats:
+    """Результат группировки: GroupStats по ключу (level_id, тип сенсора)."""
+
+    def __init__(self, groups: Dict[GroupKey, GroupStats]) -> None:
+        self.groups = groups
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def get(self, level_id: int, sensor_type: str) -> Optional[GroupStats]:
+        return self.groups.get((level_id, sensor_type))
+
+    def for_level(self, level_id: int) -> Dict[str, GroupStats]:
+        return {t: g for (lvl, t), g in self.groups.items() if lvl == level_id}
+
+    def levels(self) -> List[int]:
+        return sorted({lvl for lvl, _t in self.groups})
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Перцентиль отсортированной выборки с линейной интерполяцией (0 <= q <= 1)."""
+    if not ordered:
+        return 0.0
+    position = q * (len(ordered) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    fraction = position - lower
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+
+
+def summarize(level_id: int, sensor_type: str, values: Iterable[float]) -> GroupStats:
+    ordered = sorted(values)
+    count = len(ordered)
+    mean = math.fsum(ordered) / count
+    # Отклонения возводятся в квадрат цепочкой map — без цикла на Python
+    squares = map(pow, map(sub, ordered, repeat(mean)), repeat(2))
+    variance = math.fsum(squares) / (count - 1) if count > 1 else 0.0
+    return GroupStats(
+        level_id=level_id,
+        sensor_type=sensor_type,
+        count=count,
+        mean=mean,
+        stddev=math.sqrt(variance),
+        p50=percentile(ordered, 0.50),
+        p95=percentile(ordered, 0.95),
+        p99=percentile(ordered, 0.99),
+        minimum=ordered[0],
+        maximum=ordered[-1],
+    )
+
+
+def group_columns(
+    columns: RecordColumns,
+    sensor_types: Dict[int, str],
+    level_ids: Optional[Iterable[int]] = None,
+) -> Dict[GroupKey, array]:
+    """
+    Раскладывает значения по группам (level_id, тип сенсора) за один проход.
+
+    Уровень определяется по коду события, тип — по id сенсора; оба
+    разрешаются один раз на код/сенсор, а не на каждую строку.
+    """
+    wanted = None if level_ids is None else set(level_ids)
+    code_levels = []
+    for name in columns.event_names:
+        level_id = level_from_event(name)
+        code_levels.append(level_id if wanted is None or level_id in wanted else None)
+
+    # Код события и сенсор сводятся к одному целому ключу строки
+    groups: Dict[int, array] = {}
+    sensors: Dict[int, int] = {}
+    width = len(code_levels)
+    for code, sensor_id, value in zip(columns.event_codes, columns.sensor_ids, columns.values):
+        if code_levels[code] is None:
+            continue
+        slot = sensors.get(sensor_id)
+        if slot is None:
+            slot = sensors[sensor_id] = len(sensors)
+        key = slot * width + code
+        bucket = groups.get(key)
+        if bucket is None:
+            bucket = groups[key] = array("d")
+        bucket.append(value)
+
+    result: Dict[GroupKey, array] = {}
+    for sensor_id, slot in sensors.items():
+        sensor_type = sensor_types.get(sensor_id, UNKNOWN_SENSOR_TYPE)
+        for code, level_id in enumerate(code_levels):
+            bucket = groups.get(slot * width + code)
+            if bucket is None:
+                continue
+            target = result.get((level_id, sensor_type))
+            if target is None:
+                result[level_id, sensor_type] = bucket
+            else:
+                target.extend(bucket)
+    return result
+
+
+def compute_group_stats(
+    storage: StorageRepository,
+    sensors: Optional[SensorRepository] = None,
+    level_ids: Optional[Iterable[int]] = None,
+) -> GroupedStats:
+    """
+    Статистика показаний по группам (уровень, тип сенсора): count, mean,
+    stddev, p50/p95/p99, min/max.
+
+    Читает хранилище колонками (export_columns), поэтому колоночное и
+    mmap-хранилища не создают объектов StorageRecord.
+    """
+    sensor_types: Dict[int, str] = {}
+    if sensors is not None:
+        sensor_types = {s.sensor_id: s.type for s in sensors.iter_all()}
+    grouped = group_columns(storage.export_columns(), sensor_types, level_ids)
+    return GroupedStats({
+        key: summarize(key[0], key[1], values)
+        for key, values in sorted(grouped.items())
+    })
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from model import Forecast, RunningStats
+
+
+@dataclass
+class SensorTrend:
+    """Тренд показаний одного сенсора на уровне за всю историю."""
+
+    sensor_id: int
+    sensor_type: str
+    count: int
+    mean: float
+    # Наклон линейной регрессии: изменение значения за час
+    slope_per_hour: float
+
+
+@dataclass
+class LevelTrend:
+    """Исторический анализ уровня: прогнозы проходимости и тренды сенсоров."""
+
+    level_id: int
+    level_name: str
+    forecasts: int
+    passability_mean: float
+    passability_first: float
+    passability_last: float
+    sensors: List[SensorTrend]
+
+    @property
+    def passability_change(self) -> float:
+        return self.passability_last - self.passability_first
+
+
+class _ForecastSummary:
+    __slots__ = ("stats", "first", "last")
+
+    def __init__(self, forecast: Forecast) -> None:
+        self.stats = RunningStats()
+        self.stats.add(forecast.passability_score)
+        point = (forecast.created_at, forecast.forecast_id, forecast.passability_score)
+        self.first: Tuple[datetime, int, float] = point
+        self.last: Tuple[datetime, int, float] = point
+
+    def add(self, forecast: Forecast) -> None:
+        self.stats.add(forecast.passability_score)
+        point = (forecast.created_at, forecast.forecast_id, forecast.passability_score)
+        if point < self.first:
+            self.first = point
+        if point > self.last:
+            self.last = point
+
+
+class PassabilityHistory:
+    """
+    Сводка прогнозов по имени уровня (прогноз хранит имя, а не id):
+    число, среднее, первая и последняя оценка проходимости.
+    """
+
+    def __init__(self, forecasts: Iterable[Forecast] = ()) -> None:
+        self._levels: Dict[str, _ForecastSummary] = {}
+        # Последний учтённый прогноз: по нему видно, что репозиторий
+        # пополнили в обход сводки (восстановление снимка)
+        self.last_id: Optional[int] = None
+        for forecast in forecasts:
+            self.add(forecast)
+
+    def add(self, forecast: Forecast) -> None:
+        self.last_id = forecast.forecast_id
+        summary = self._levels.get(forecast.level_name)
+        if summary is None:
+            self._levels[forecast.level_name] = _ForecastSummary(forecast)
+        else:
+            summary.add(forecast)
+
+    def get(self, level_name: str) -> Optional[_ForecastSummary]:
+        return self._levels.get(level_name)
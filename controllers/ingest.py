@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from model import StorageRecord
+from .data_collection import DataCollectionController
+from .polling import Reading
+
+
+# Строка длиннее этого не буферизуется и отклоняется целиком
+MAX_LINE = 64 * 1024
+
+# Сколько ошибок разбора возвращается клиенту (остальные только считаются)
+MAX_ERRORS = 20
+
+# Без json.loads: он на каждую строку определяет кодировку и создаёт декодер
+_decode = json.JSONDecoder().decode
+
+
+@dataclass
+class IngestBatch:
+    """Одна пакетная запись в хранилище и строки, отклонённые до неё."""
+
+    accepted: int
+    rejected: int
+
+
+@dataclass
+class IngestResult:
+    # Принятые в запись; отклонённые при разборе или очередью записи
+    accepted: int = 0
+    rejected: int = 0
+    # Записанные в хранилище: меньше accepted, если очередь DROP_OLDEST
+    # выбросила принятые пакеты или запись не удалась
+    written: int = 0
+    batches: List[IngestBatch] = field(default_factory=list)
+    # (номер строки с 1, причина) для первых MAX_ERRORS отказов
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "batches": [
+                {"accepted": b.accepted, "rejected": b.rejected} for b in self.batches
+            ],
+            "errors": [{"line": line, "error": error} for line, error in self.errors],
+        }
+
+
+def parse_timestamp(raw: Any, now: Callable[[], datetime]) -> datetime:
+    """Время показания: ISO 8601, секунды от эпохи или now() при отсутствии."""
+    if raw is None:
+        return now()
+    if isinstance(raw, str):
+        ts = datetime.fromisoformat(raw)
+    elif isinstance(raw, (int, float)) and not isinstance(raw, bool):
+        ts = datetime.fromtimestamp(raw)
+    else:
+        raise ValueError("timestamp должен быть строкой ISO 8601 или числом секунд")
+    # Хранилище работает с локальным временем без пояса
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts
+
+
+class NdjsonIngestor:
+    """
+    Потоковый разбор NDJSON с показаниями внешних источников.
+
+    Каждая строка — объект {"sensor_id": int, "value": число,
+    "timestamp": ISO 8601 или секунды (необязательно), "level_id": int
+    (необязательно)}. Тело подаётся кусками через feed(), в памяти держится
+    только незавершённая строка и текущий пакет. Принятые показания пишутся
+    через DataCollectionController.store_readings пакетами по batch_size,
+    поэтому детектор выбросов видит их так же, как опрос сенсоров. Пакет,
+    которому отказала очередь записи, считается отклонённым; close() ждёт
+    записи очереди и сообщает, сколько показаний записано.
+    """
+
+    def __init__(
+        self,
+        collector: DataCollectionController,
+        sensor_ids: Iterable[int],
+        level_id: Optional[int] = None,
+        batch_size: int = 5000,
+        now: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        if batch_size <= 0:
+            raise ValueError("Размер пакета должен быть положительным")
+        self._collector = collector
+        self._sensor_ids = frozenset(sensor_ids)
+        self._level_id = level_id
+        self.batch_size = batch_size
+        self._now = now
+        self._tail = b""
+        # Хвост строки превысил MAX_LINE: отбрасываем до следующего перевода строки
+        self._overflow = False
+        self._line = 0
+        self._pending: Dict[Optional[int], List[Reading]] = {}
+        self._pending_count = 0
+        self._pending_rejected = 0
+        self.result = IngestResult()
+
+    # ------------------------------------------------------------------
+    # Разбор
+    # ------------------------------------------------------------------
+
+    def feed(self, chunk: bytes) -> None:
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            self._extend_tail(chunk)
+            return
+        lines = (self._tail + chunk[:end]).split(b"\n") if self._tail else chunk[:end].split(b"\n")
+        self._tail = b""
+        if self._overflow:
+            self._overflow = False
+            self._line += 1
+            self._reject("строка длиннее допустимого")
+            lines = lines[1:]
+        for line in lines:
+            self._line += 1
+            self._parse(line)
+        self._extend_tail(chunk[end + 1:])
+
+    def close(self) -> IngestResult:
+        """Разбирает последнюю строку без перевода строки, пишет остаток и ждёт записи."""
+        if self._overflow:
+            self._overflow = False
+            self._line += 1
+            self._reject("строка длиннее допустимого")
+        elif self._tail:
+            self._line += 1
+            self._parse(self._tail)
+        self._tail = b""
+        self._flush()
+        self._collector.flush()
+        return self.result
+
+    def _extend_tail(self, data: bytes) -> None:
+        if self._overflow or not data:
+            return
+        self._tail += data
+        if len(self._tail) > MAX_LINE:
+            self._tail = b""
+            self._overflow = True
+
+    def _parse(self, line: bytes) -> None:
+        if len(line) > MAX_LINE:
+            self._reject("строка длиннее допустимого")
+            return
+        if not line.strip():
+            return
+        try:
+            item = _decode(line.decode("utf-8"))
+            if not isinstance(item, dict):
+                raise ValueError("ожидается объект JSON")
+            sensor_id = item.get("sensor_id")
+            if type(sensor_id) is not int:
+                raise ValueError("sensor_id должен быть целым")
+            if sensor_id not in self._sensor_ids:
+                raise ValueError(f"неизвестный сенсор {sensor_id}")
+            value = item.get("value")
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError("value должно быть числом")
+            if not math.isfinite(value):
+                raise ValueError("value должно быть конечным")
+            level_id = item.get("level_id", self._level_id)
+            if level_id is not None and type(level_id) is not int:
+                raise ValueError("level_id должен быть целым")
+            timestamp = parse_timestamp(item.get("timestamp"), self._now)
+        except (ValueError, OverflowError, OSError) as exc:
+            # json.JSONDecodeError и UnicodeDecodeError — подклассы ValueError
+            self._reject(str(exc))
+            return
+
+        group = self._pending.get(level_id)
+        if group is None:
+            group = self._pending[level_id] = []
+        group.append((sensor_id, float(value), timestamp))
+        self._pending_count += 1
+        if self._pending_count >= self.batch_size:
+            self._flush()
+
+    def _count_written(self, records: List[StorageRecord]) -> None:
+        # Вызывается в потоке писателя очереди или сразу после записи
+        self.result.written += len(records)
+
+    def _reject(self, reason: str) -> None:
+        self._pending_rejected += 1
+        self.result.rejected += 1
+        if len(self.result.errors) < MAX_ERRORS:
+            self.result.errors.append((self._line, reason))
+
+    def _flush(self) -> None:
+        if not self._pending_count and not self._pending_rejected:
+            return
+        accepted = 0
+        for level_id, readings in self._pending.items():
+            accepted += self._collector.store_readings(readings, level_id, self._count_written)
+        refused = self._pending_count - accepted
+        self.result.accepted += accepted
+        self.result.rejected += refused
+        self.result.batches.append(IngestBatch(accepted, self._pending_rejected + refused))
+        self._pending = {}
+        self._pending_count = 0
+        self._pending_rejected = 0
+
+
+def ingest_ndjson(
+    chunks: Iterable[bytes],
+    collector: DataCollectionController,
+    sensor_ids: Iterable[int],
+    level_id: Optional[int] = None,
+    batch_size: int = 5000,
+) -> IngestResult:
+    """Разбор и запись NDJSON, поданного итерируемыми кусками байт."""
+    ingestor = NdjsonIngestor(collector, sensor_ids, level_id=level_id, batch_size=batch_size)
+    for chunk in chunks:
+        ingestor.feed(chunk)
+    return ingestor.close()
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from model import Level, Report
 from .analysis import AnalysisController
 from .decision_support import DecisionSupportController
+from .history import LevelTrend
 from .level_manager import LevelManager
 from .journal import JournalManager
 
@@ -50,8 +51,15 @@ class InterfaceController:
      
         self._journal.add_entry("Интерфейс обновлён", level="INFO")
 
-    def handle_user_choice(self, scenario: str, level_id: Optional[int] = None) -> None:
-      
+    def handle_user_choice(
+        self,
+        scenario: str,
+        level_id: Optional[int] = None,
+    ) -> Optional[Dict[int, LevelTrend]]:
+        """
+        Выполняет сценарий. historical_analysis возвращает тренды по уровням
+        (все уровни или только level_id), остальные сценарии — None.
+        """
         self._journal.add_entry(
             f"Выбран сценарий '{scenario}' (уровень={level_id})",
             level="INFO",
@@ -84,10 +92,17 @@ class InterfaceController:
             self._journal.add_entry("Сценарий мониторинга активирован", level="INFO")
 
         elif scenario == "historical_analysis":
+            levels = self._levels.get_levels()
+            if level_id is not None:
+                levels = [lvl for lvl in levels if lvl.level_id == level_id]
+            trends = self._analysis.historical_trends(levels)
+            falling = sum(1 for t in trends.values() if t.passability_change < 0)
             self._journal.add_entry(
-                "Сценарий исторического анализа активирован",
+                f"Исторический анализ: {len(trends)} уровней, "
+                f"проходимость снизилась у {falling}",
                 level="INFO",
             )
+            return trends
 
         else:
             self._journal.add_entry(
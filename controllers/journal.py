@@ -2,10 +2,10 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List
+from typing import Iterable, List
 
 
-@dataclass
+@dataclass(slots=True)
 class LogEntry:
  
     timestamp: datetime
@@ -26,5 +26,9 @@ class JournalManager:
     def view_history(self) -> List[LogEntry]:
         return list(self._entries)
 
+    def restore_history(self, entries: Iterable[LogEntry]) -> None:
+        """Дописывает в начало журнала записи, восстановленные из снимка."""
+        self._entries[:0] = entries
+
     def clear_history(self) -> None:
         self._entries.clear()
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 from model import Level, LevelRepository
 
@@ -10,6 +10,15 @@ class LevelManager:
 
     def __init__(self, level_repository: LevelRepository) -> None:
         self._levels = level_repository
+        # Вызываются с level_id после изменения или удаления уровня
+        self._listeners: Tuple[Callable[[int], None], ...] = ()
+
+    def subscribe(self, listener: Callable[[int], None]) -> None:
+        self._listeners = (*self._listeners, listener)
+
+    def _changed(self, level_id: int) -> None:
+        for listener in self._listeners:
+            listener(level_id)
 
     def create_level(self, data: Dict) -> Level:
     
@@ -39,13 +48,16 @@ class LevelManager:
             level.description = updates["description"]
 
         self._levels.save(level)
+        self._changed(level_id)
         return level
 
     def save_level(self, level: Level) -> None:
         self._levels.save(level)
+        self._changed(level.level_id)
 
     def get_levels(self) -> List[Level]:
         return self._levels.get_all()
 
     def delete_level(self, level_id: int) -> None:
         self._levels.delete(level_id)
+        self._changed(level_id)
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import math
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+from operator import sub
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from model import RecordColumns, RunningStats, StorageRepository, level_from_event
+
+
+# Меньше строк на процесс не окупают запуск пула
+MIN_ROWS_PER_WORKER = 250_000
+
+# Колонки, которые читают процессы: id сенсора, значение, код события
+_COLUMNS = (("sensor_ids", "q"), ("values", "d"), ("event_codes", "I"))
+
+# Частичный результат: (код события, id сенсора) -> RunningStats.state
+Partial = Dict[Tuple[int, int], Tuple[int, float, float, float, float]]
+
+
+def _partial(sensor_ids: Sequence[int], values: Sequence[float], codes: Sequence[int]) -> Partial:
+    """Статистика по парам (код события, сенсор) для одного шарда строк."""
+    groups: Dict[Tuple[int, int], array] = {}
+    for key, value in zip(zip(codes, sensor_ids), values):
+        bucket = groups.get(key)
+        if bucket is None:
+            bucket = groups[key] = array("d")
+        bucket.append(value)
+    result: Partial = {}
+    for key, bucket in groups.items():
+        count = len(bucket)
+        mean = math.fsum(bucket) / count
+        m2 = math.fsum(map(pow, map(sub, bucket, repeat(mean)), repeat(2)))
+        result[key] = (count, mean, m2, min(bucket), max(bucket))
+    return result
+
+
+def _shard(names: Tuple[str, str, str], lo: int, hi: int) -> Partial:
+    # Процесс подключается к разделяемой памяти родителя: строки не копируются
+    # и не сериализуются, обратно уходят только агрегаты
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    views = [
+        block.buf.cast(typecode)[lo:hi]
+        for block, (_column, typecode) in zip(blocks, _COLUMNS)
+    ]
+    try:
+        return _partial(*views)
+    finally:
+        for view in views:
+            view.release()
+        for block in blocks:
+            block.close()
+
+
+def _share(columns: RecordColumns) -> List[shared_memory.SharedMemory]:
+    blocks = []
+    try:
+        for name, _typecode in _COLUMNS:
+            column = getattr(columns, name)
+            size = len(column) * column.itemsize
+            block = shared_memory.SharedMemory(create=True, size=max(1, size))
+            blocks.append(block)
+            block.buf[:size] = memoryview(column).cast("B")
+    except BaseException:
+        _release(blocks)
+        raise
+    return blocks
+
+
+def _release(blocks: List[shared_memory.SharedMemory]) -> None:
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+def parallel_level_stats(
+    storage: StorageRepository,
+    workers: Optional[int] = None,
+    min_rows_per_worker: int = MIN_ROWS_PER_WORKER,
+) -> Dict[int, Dict[int, RunningStats]]:
+    """
+    RunningStats по каждому уровню и сенсору, посчитанные пулом процессов.
+
+    Колонки хранилища (export_columns) копируются один раз в разделяемую
+    память и делятся на диапазоны строк; каждый процесс сворачивает свой
+    диапазон в частичные агрегаты, которые сливаются формулой Чана.
+    """
+    columns = storage.export_columns()
+    rows = len(columns.values)
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    workers = max(1, min(workers, rows // max(1, min_rows_per_worker)))
+
+    if workers == 1:
+        partials = [_partial(columns.sensor_ids, columns.values, columns.event_codes)]
+    else:
+        step = -(-rows // workers)
+        bounds = [(lo, min(lo + step, rows)) for lo in range(0, rows, step)]
+        blocks = _share(columns)
+        try:
+            names = tuple(block.name for block in blocks)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                partials = list(pool.map(
+                    _shard, repeat(names), [lo for lo, _hi in bounds], [hi for _lo, hi in bounds]
+                ))
+        finally:
+            _release(blocks)
+
+    levels = [level_from_event(name) for name in columns.event_names]
+    result: Dict[int, Dict[int, RunningStats]] = {}
+    for partial in partials:
+        for (code, sensor_id), state in partial.items():
+            level_id = levels[code]
+            if level_id is None:
+                continue
+            by_sensor = result.setdefault(level_id, {})
+            stats = by_sensor.get(sensor_id)
+            if stats is None:
+                by_sensor[sensor_id] = RunningStats.from_state(state)
+            else:
+                stats.merge(RunningStats.from_state(state))
+    return result
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from model import RunningStats, Sensor, SensorRepository
+
+
+# Показание: id сенсора, значение, время чтения
+Reading = Tuple[int, float, datetime]
+ReadingSink = Callable[[List[Reading]], None]
+
+
+def read_sensors(sensors: Iterable[Sensor]) -> List[Reading]:
+    """
+    Однократное чтение всех сенсоров. Асинхронные read_value ожидаются
+    вместе, поэтому общее время — самое долгое чтение, а не их сумма.
+    """
+    readings: List[Reading] = []
+    pending: List[Tuple[int, int, Awaitable[float]]] = []
+    for sensor in sensors:
+        value = sensor.read_value()
+        if inspect.isawaitable(value):
+            pending.append((len(readings), sensor.sensor_id, value))
+            value = 0.0
+        readings.append((sensor.sensor_id, value, datetime.now()))
+    if pending:
+        async def gather() -> List[float]:
+            return await asyncio.gather(*(awaitable for _i, _id, awaitable in pending))
+
+        for (index, sensor_id, _awaitable), value in zip(pending, asyncio.run(gather())):
+            readings[index] = (sensor_id, value, datetime.now())
+    return readings
+
+
+class PollingScheduler:
+    """
+    Опрос сенсоров по расписанию в собственном цикле asyncio (фоновый поток).
+
+    Каждый сенсор опрашивается своей задачей с частотой poll_frequency
+    (раз в секунду; 0 и меньше — сенсор не опрашивается), поэтому медленный
+    асинхронный read_value одного сенсора не задерживает остальные.
+    Показания копятся в буфере и раз в batch_interval секунд уходят
+    в sink одним пакетом. sink (запись в хранилище) выполняется в отдельном
+    потоке, поэтому медленная запись не сдвигает расписание опроса; ошибка
+    чтения сенсора учитывается и не останавливает его опрос.
+
+    Метрики: задержка опроса относительно расписания (lag), пропущенные
+    такты (опрос отстал больше чем на период), размеры пакетов, ошибки
+    чтения и записи.
+    """
+
+    def __init__(
+        self,
+        sensor_repository: SensorRepository,
+        batch_interval: float = 0.1,
+    ) -> None:
+        if batch_interval <= 0:
+            raise ValueError("Период записи пакетов должен быть положительным")
+        self._sensors = sensor_repository
+        self.batch_interval = batch_interval
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._buffer: List[Reading] = []
+        self._reset_metrics()
+
+    def _reset_metrics(self) -> None:
+        self._lag = RunningStats()
+        self._polls: Dict[int, int] = {}
+        self._missed = 0
+        self._batches = 0
+        self._batch_sizes = RunningStats()
+        self._failed = 0
+        self._read_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    # ------------------------------------------------------------------
+    # Запуск и остановка
+    # ------------------------------------------------------------------
+
+    def start(self, sink: ReadingSink) -> None:
+        if self._thread is not None:
+            return
+        self._reset_metrics()
+        ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._main, args=(sink, ready), name="sensor-polling", daemon=True
+        )
+        self._thread.start()
+        ready.wait()
+
+    def stop(self) -> None:
+        """Останавливает опрос; накопленные показания записываются."""
+        if self._thread is None:
+            return
+        loop, stopping = self._loop, self._stopping
+        if loop is not None and stopping is not None:
+            loop.call_soon_threadsafe(stopping.set)
+        self._thread.join()
+        self._thread = None
+
+    def _main(self, sink: ReadingSink, ready: threading.Event) -> None:
+        loop = asyncio.new_event_loop()
+        # Один поток записи: пакеты уходят в sink по порядку
+        writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="polling-sink")
+        try:
+            loop.run_until_complete(self._run(sink, loop, writer, ready))
+        finally:
+            writer.shutdown()
+            loop.close()
+            self._loop = None
+
+    async def _run(
+        self,
+        sink: ReadingSink,
+        loop: asyncio.AbstractEventLoop,
+        writer: ThreadPoolExecutor,
+        ready: threading.Event,
+    ) -> None:
+        self._loop = loop
+        self._stopping = asyncio.Event()
+        ready.set()
+        pollers = [
+            asyncio.ensure_future(self._poll(sensor))
+            for sensor in self._sensors.get_all()
+            if sensor.poll_frequency > 0
+        ]
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.batch_interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self._flush(sink, writer)
+        finally:
+            for poller in pollers:
+                poller.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+            await self._flush(sink, writer)
+
+    # ------------------------------------------------------------------
+    # Опрос
+    # ------------------------------------------------------------------
+
+    async def _poll(self, sensor: Sensor) -> None:
+        loop = asyncio.get_running_loop()
+        period = 1.0 / sensor.poll_frequency
+        due = loop.time()
+        while True:
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag = loop.time() - due
+            self._lag.add(lag)
+            try:
+                value = sensor.read_value()
+                if inspect.isawaitable(value):
+                    value = await value
+            except Exception:  # сбой одного чтения не останавливает опрос сенсора
+                self._read_errors += 1
+            else:
+                self._buffer.append((sensor.sensor_id, value, datetime.now()))
+                self._polls[sensor.sensor_id] = self._polls.get(sensor.sensor_id, 0) + 1
+            due += period
+            behind = loop.time() - due
+            if behind > period:
+                # Отставание больше периода: пропущенные такты не догоняются
+                skipped = int(behind // period)
+                self._missed += skipped
+                due += skipped * period
+
+    async def _flush(self, sink: ReadingSink, writer: ThreadPoolExecutor) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._batches += 1
+        self._batch_sizes.add(len(batch))
+        try:
+            # Запись ждёт storage.lock и хранилище вне цикла опроса
+            await asyncio.get_running_loop().run_in_executor(writer, sink, batch)
+        except Exception:  # опрос продолжается, потерянные показания учитываются
+            self._failed += len(batch)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "polls": float(sum(self._polls.values())),
+            "batches": float(self._batches),
+            "mean_batch_size": self._batch_sizes.mean,
+            "mean_lag": self._lag.mean,
+            "max_lag": self._lag.maximum if self._lag.count else 0.0,
+            "missed_ticks": float(self._missed),
+            "failed_readings": float(self._failed),
+            "read_errors": float(self._read_errors),
+        }
+
+    def polls(self, sensor_id: int) -> int:
+        return self._polls.get(sensor_id, 0)
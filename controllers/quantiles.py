@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from model import StorageListener, StorageRecord, StorageRepository, level_from_event
+
+
+# k по умолчанию: около 600 хранимых значений на поток при любом n
+DEFAULT_K = 200
+
+
+class KllSketch:
+    """
+    Потоковый скетч квантилей KLL (Karnin, Lang, Liberty, 2016).
+
+    Хранит O(k · log(n / k)) значений вместо n. Компакторы уровня h держат
+    значения с весом 2**h; переполненный компактор сортируется и отдаёт
+    наверх каждое второе значение (со случайным сдвигом).
+
+    Точность: оценка quantile(q) имеет ранг q ± ε, где нормированная ошибка
+    ранга ε ≈ 1.7 / k с высокой вероятностью (для k = 200 — около 1 %).
+    count, min и max точные; слияние (merge) скетчей даёт ту же гарантию,
+    что и скетч по объединённому потоку, поэтому скетчи можно собирать
+    по шардам и окнам времени.
+    """
+
+    # Коэффициент убывания ёмкости к нижним уровням (из статьи KLL)
+    _DECAY = 2.0 / 3.0
+
+    def __init__(self, k: int = DEFAULT_K, seed: Optional[int] = None) -> None:
+        if k < 8:
+            raise ValueError("Параметр k скетча должен быть не меньше 8")
+        self.k = k
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self._random = random.Random(seed)
+        self._compactors: List[List[float]] = []
+        self._size = 0
+        self._max_size = 0
+        self._grow()
+
+    def _grow(self) -> None:
+        self._compactors.append([])
+        self._max_size = sum(self._capacity(h) for h in range(len(self._compactors)))
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self._compactors) - height - 1
+        return int(math.ceil(self.k * self._DECAY ** depth)) + 1
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self._compactors[0].append(value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.update(value)
+
+    def _compress(self) -> None:
+        for height in range(len(self._compactors)):
+            compactor = self._compactors[height]
+            if len(compactor) < self._capacity(height):
+                continue
+            if height + 1 == len(self._compactors):
+                self._grow()
+            compactor.sort()
+            # Нечётный остаток остаётся на своём уровне
+            keep = [compactor.pop()] if len(compactor) % 2 else []
+            promoted = compactor[self._random.randint(0, 1)::2]
+            self._compactors[height + 1].extend(promoted)
+            self._compactors[height] = keep
+            self._size = sum(len(c) for c in self._compactors)
+            if self._size < self._max_size:
+                break
+
+    def merge(self, other: "KllSketch") -> None:
+        """Добавляет к скетчу все значения другого скетча (того же или любого k)."""
+        if not other.count:
+            return
+        while len(self._compactors) < len(other._compactors):
+            self._grow()
+        for height, compactor in enumerate(other._compactors):
+            self._compactors[height].extend(compactor)
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._size = sum(len(c) for c in self._compactors)
+        while self._size >= self._max_size:
+            self._compress()
+
+    def _weighted(self) -> List[Tuple[float, int]]:
+        items = [
+            (value, 1 << height)
+            for height, compactor in enumerate(self._compactors)
+            for value in compactor
+        ]
+        items.sort()
+        return items
+
+    def rank(self, value: float) -> float:
+        """Оценка доли значений, не превышающих value."""
+        if not self.count:
+            return 0.0
+        total = weight_below = 0
+        for height, compactor in enumerate(self._compactors):
+            weight = 1 << height
+            total += weight * len(compactor)
+            weight_below += weight * sum(1 for v in compactor if v <= value)
+        return weight_below / total
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        """Оценки квантилей для долей qs (0 <= q <= 1) за один проход."""
+        if not self.count:
+            return [0.0 for _ in qs]
+        items = self._weighted()
+        total = sum(weight for _value, weight in items)
+        result: List[float] = []
+        for q in qs:
+            if not 0.0 <= q <= 1.0:
+                raise ValueError(f"Доля квантиля вне [0, 1]: {q}")
+            if q == 0.0:
+                result.append(self.minimum)
+                continue
+            if q == 1.0:
+                result.append(self.maximum)
+                continue
+            target = q * total
+            running = 0
+            for value, weight in items:
+                running += weight
+                if running >= target:
+                    result.append(value)
+                    break
+            else:
+                result.append(self.maximum)
+        return result
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles((q,))[0]
+
+    @property
+    def stored(self) -> int:
+        """Число хранимых значений (count — число поступивших)."""
+        return self._size
+
+
+class QuantileRegistry(StorageListener):
+    """
+    Скетчи квантилей по каждому сенсору и по парам (уровень, сенсор):
+    на одном уровне показания разных сенсоров (проценты нагрузки, секунды
+    прохождения) не смешиваются в одно распределение.
+
+    С хранилищем (storage) при создании просматривает уже сохранённые
+    показания порциями и дальше получает записанные, поэтому переживает
+    перезапуск и восстановление снимка. Удаление показаний скетчи не
+    уменьшает: KLL умеет только добавлять. Реестры разных шардов или окон
+    времени сливаются через merge.
+    """
+
+    def __init__(
+        self,
+        k: int = DEFAULT_K,
+        seed: Optional[int] = None,
+        storage: Optional[StorageRepository] = None,
+    ) -> None:
+        self.k = k
+        self._seed = seed
+        self._sensors: Dict[int, KllSketch] = {}
+        self._levels: Dict[int, Dict[int, KllSketch]] = {}
+        if storage is not None:
+            for chunk in storage.iter_chunks():
+                self.records_added(chunk)
+            storage.subscribe(self)
+
+    def records_added(self, records: Sequence[StorageRecord]) -> None:
+        for record in records:
+            self.update(record.sensor_id, level_from_event(record.event_type), record.value)
+
+    def records_removed(self, records: Sequence[StorageRecord]) -> None:
+        # Квантили остаются по всем записанным показаниям
+        return
+
+    def _sketch(self, sketches: Dict[int, KllSketch], key: int) -> KllSketch:
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = KllSketch(self.k, self._seed)
+        return sketch
+
+    def update(self, sensor_id: int, level_id: Optional[int], value: float) -> None:
+        self._sketch(self._sensors, sensor_id).update(value)
+        if level_id is not None:
+            self._sketch(self._levels.setdefault(level_id, {}), sensor_id).update(value)
+
+    def sensor(self, sensor_id: int) -> KllSketch:
+        sketch = self._sensors.get(sensor_id)
+        return sketch if sketch is not None else KllSketch(self.k, self._seed)
+
+    def level(self, level_id: int, sensor_id: int) -> KllSketch:
+        sketch = self._levels.get(level_id, {}).get(sensor_id)
+        return sketch if sketch is not None else KllSketch(self.k, self._seed)
+
+    def level_sensors(self, level_id: int) -> Dict[int, KllSketch]:
+        """Скетчи сенсоров уровня: sensor_id -> KllSketch."""
+        return dict(self._levels.get(level_id, {}))
+
+    def merge(self, other: "QuantileRegistry") -> None:
+        for key, sketch in other._sensors.items():
+            self._sketch(self._sensors, key).merge(sketch)
+        for level_id, by_sensor in other._levels.items():
+            sketches = self._levels.setdefault(level_id, {})
+            for key, sketch in by_sensor.items():
+                self._sketch(sketches, key).merge(sketch)
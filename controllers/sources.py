@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import json
+import math
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import IO, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from model import Sensor, StorageRecord
+from model.encoding import datetime_to_micros
+from .ingest import parse_timestamp
+
+
+class SensorSource(ABC):
+    """Источник значений для SourcedSensor.read_value."""
+
+    @abstractmethod
+    def read(self, sensor: Sensor) -> float:
+        raise NotImplementedError
+
+
+class SourcedSensor(Sensor):
+    """
+    Сенсор, значения которого берутся из источника (запись, генератор).
+
+    source — не поле dataclass: в снимок и SQLite сенсор попадает как
+    обычный Sensor с последним прочитанным значением.
+    """
+
+    __slots__ = ("source",)
+
+    def __init__(
+        self,
+        sensor_id: int,
+        type: str,
+        unit: str,
+        poll_frequency: int,
+        source: SensorSource,
+        value: float = 0.0,
+    ) -> None:
+        super().__init__(sensor_id, type, unit, poll_frequency, value)
+        self.source = source
+
+    def read_value(self) -> float:
+        self.value = self.source.read(self)
+        return self.value
+
+
+# ----------------------------------------------------------------------
+# Синтетические показания
+# ----------------------------------------------------------------------
+
+# (тип, единица, базовое значение) — как у сенсоров конфигуратора
+DEFAULT_PROFILES: Tuple[Tuple[str, str, float], ...] = (
+    ("load", "%", 0.7),
+    ("completion_time", "sec", 120.0),
+)
+
+
+class _Series:
+    __slots__ = ("rng", "base", "reads")
+
+    def __init__(self, seed: int, base: float) -> None:
+        self.rng = random.Random(seed)
+        self.base = base
+        self.reads = 0
+
+
+class SyntheticSource(SensorSource):
+    """
+    Воспроизводимый генератор: у каждого сенсора свой Random(seed, sensor_id),
+    поэтому последовательность значений сенсора не зависит от порядка и
+    частоты опроса остальных.
+
+    Значение = база * (1 + amplitude * sin(2π n / period) + шум), где база —
+    value сенсора при первом чтении, n — номер чтения, шум ~ N(0, noise).
+    С вероятностью spike_rate значение умножается на spike (выброс).
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        noise: float = 0.05,
+        amplitude: float = 0.1,
+        period: int = 60,
+        spike_rate: float = 0.0,
+        spike: float = 3.0,
+    ) -> None:
+        if period <= 0:
+            raise ValueError("Период должен быть положительным")
+        self.seed = seed
+        self.noise = noise
+        self.amplitude = amplitude
+        self.period = period
+        self.spike_rate = spike_rate
+        self.spike = spike
+        self._series: Dict[int, _Series] = {}
+        self._lock = threading.Lock()
+
+    def read(self, sensor: Sensor) -> float:
+        with self._lock:
+            return self._read(sensor)
+
+    def _read(self, sensor: Sensor) -> float:
+        series = self._series.get(sensor.sensor_id)
+        if series is None:
+            series = self._series[sensor.sensor_id] = _Series(
+                self.seed * 1_000_003 + sensor.sensor_id, sensor.value
+            )
+        rng = series.rng
+        phase = 2.0 * math.pi * series.reads / self.period
+        series.reads += 1
+        value = series.base * (1.0 + self.amplitude * math.sin(phase) + rng.gauss(0.0, self.noise))
+        if self.spike_rate and rng.random() < self.spike_rate:
+            value *= self.spike
+        return value
+
+
+def synthetic_sensors(
+    count: int,
+    source: SensorSource,
+    poll_frequency: int = 5,
+    start_id: int = 1,
+    profiles: Sequence[Tuple[str, str, float]] = DEFAULT_PROFILES,
+) -> List[SourcedSensor]:
+    """count сенсоров с id от start_id; профили (тип, единица, база) чередуются."""
+    return [
+        SourcedSensor(sensor_id, kind, unit, poll_frequency, source, base)
+        for sensor_id, (kind, unit, base) in zip(
+            range(start_id, start_id + count),
+            (profiles[i % len(profiles)] for i in range(count)),
+        )
+    ]
+
+
+# ----------------------------------------------------------------------
+# Воспроизведение записи
+# ----------------------------------------------------------------------
+
+def write_ndjson(records: Iterable[StorageRecord], path: str) -> int:
+    """
+    Сохраняет показания в NDJSON (формат POST /ingest/readings) для
+    последующего воспроизведения ReplaySource. Возвращает число строк.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for record in records:
+            file.write(json.dumps({
+                "sensor_id": record.sensor_id,
+                "value": record.value,
+                "timestamp": record.timestamp.isoformat(),
+            }))
+            file.write("\n")
+            count += 1
+    return count
+
+
+class ReplaySource(SensorSource):
+    """
+    Воспроизведение записанных показаний (NDJSON, как у /ingest/readings)
+    в реальном времени (speed=1) или ускоренно (speed=60 — минута записи
+    за секунду).
+
+    Файл читается построчно по мере хода времени: чтение сенсора отдаёт его
+    последнее показание, время которого уже наступило; до первого показания —
+    собственное value сенсора. С loop=True запись повторяется по кругу.
+    Битые строки пропускаются и считаются в skipped.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        speed: float = 1.0,
+        loop: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if speed <= 0:
+            raise ValueError("Скорость воспроизведения должна быть положительной")
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self._clock = clock
+        self._values: Dict[int, float] = {}
+        self._started: Optional[float] = None
+        # Время первой строки записи и сдвиг очередного круга, в секундах
+        self._origin: Optional[float] = None
+        self._shift = 0.0
+        # Время последней строки первого круга
+        self._end = -math.inf
+        self.replayed = 0
+        self.skipped = 0
+        # Чтение идёт и из опроса в фоновом потоке, и из collect_data
+        self._lock = threading.Lock()
+        self._file: Optional[IO[bytes]] = open(path, "rb")
+        self._next = self._read_next()
+
+    @property
+    def finished(self) -> bool:
+        return self._next is None
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_next(self) -> Optional[Tuple[float, int, float]]:
+        while self._file is not None:
+            line = self._file.readline()
+            if not line:
+                if not self.loop or self._origin is None or self._end <= self._origin:
+                    # Конец записи; пустая или мгновенная запись не зацикливается
+                    self.close()
+                    return None
+                self._shift += self._end - self._origin
+                self._file.seek(0)
+                continue
+            try:
+                item = json.loads(line)
+                sensor_id, value = item["sensor_id"], float(item["value"])
+                ts = datetime_to_micros(parse_timestamp(item["timestamp"], datetime.now)) / 1e6
+            except (ValueError, TypeError, KeyError, OverflowError, OSError):
+                self.skipped += 1
+                continue
+            if self._origin is None:
+                self._origin = ts
+            if not self._shift:
+                self._end = max(self._end, ts)
+            return ts + self._shift, sensor_id, value
+        return None
+
+    def _advance(self) -> None:
+        now = self._clock()
+        if self._started is None:
+            self._started = now
+        target = self._origin + (now - self._started) * self.speed if self._origin is not None else 0.0
+        if self._next is not None and self._shift and target - self._next[0] > self._end - self._origin:
+            # Отстали больше чем на круг (редкие чтения, большая скорость):
+            # целые круги пропускаются, а не перечитываются
+            span = self._end - self._origin
+            laps = (target - self._next[0]) // span
+            ts, sensor_id, value = self._next
+            self._shift += laps * span
+            self._next = (ts + laps * span, sensor_id, value)
+        while self._next is not None and self._next[0] <= target:
+            _ts, sensor_id, value = self._next
+            self._values[sensor_id] = value
+            self.replayed += 1
+            self._next = self._read_next()
+
+    def read(self, sensor: Sensor) -> float:
+        with self._lock:
+            self._advance()
+            return self._values.get(sensor.sensor_id, sensor.value)
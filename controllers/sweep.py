@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .analysis import COMPLETION_NORM, passability
+
+
+# Оси сетки параметров в порядке хранения (последняя меняется быстрее всех)
+AXES = ("difficulty", "enemies", "reward")
+
+# Метрики сетки: оценки предпросмотра и проходимость из модели прогноза
+METRICS = ("expected_players", "completion", "avg_time", "server_load", "passability")
+
+# Нагрузка на сервер по порядку кодов в метрике server_load
+SERVER_LOADS = ("Небольшая", "Умеренная", "Высокая")
+
+# Сетки меньше этого размера считаются в текущем процессе
+PARALLEL_THRESHOLD = 200_000
+
+
+def _clamp(difficulty: int, enemies: int, reward: int) -> Tuple[int, int, int]:
+    return max(0, min(100, difficulty)), max(0, min(200, enemies)), max(50, min(200, reward))
+
+
+def _server_load_code(expected_players: int) -> int:
+    if expected_players < 700:
+        return 0
+    if expected_players < 1000:
+        return 1
+    return 2
+
+
+def compute_preview(difficulty: int, enemies: int, reward: int):
+    """
+    Простейшая псевдо-модель, чтобы значения на экране менялись от слайдеров.
+    Это визуальный расчет, не заменяет внутренний прогноз ядра.
+    """
+    diff, enem, rew = _clamp(difficulty, enemies, reward)
+
+    expected_players = max(100, int(900 - diff * 3 + rew * 2 - enem * 2))
+    completion = max(5, min(98, int(72 + (rew - 100) * 0.2 - (diff - 50) * 0.35 - (enem - 10) * 0.25)))
+    avg_time = max(5, int(30 + (diff - 50) * 0.25 + (enem - 10) * 0.5 - (rew - 100) * 0.05))
+
+    return {
+        "expected_players": expected_players,
+        "completion": completion,
+        "avg_time": avg_time,
+        "server_load": SERVER_LOADS[_server_load_code(expected_players)],
+    }
+
+
+def _evaluate(
+    difficulties: Sequence[int],
+    enemies: Sequence[int],
+    rewards: Sequence[int],
+    completion_mean: float,
+) -> Dict[str, array]:
+    """
+    Метрики для всех сочетаний осей. Слагаемые формул считаются один раз
+    на значение оси, во внутреннем цикле остаются сложения и min/max
+    (порядок операций тот же, что в compute_preview).
+    """
+    diffs = [max(0, min(100, d)) for d in difficulties]
+    enems = [max(0, min(200, e)) for e in enemies]
+    rews = [max(50, min(200, r)) for r in rewards]
+
+    players_r = [r * 2 for r in rews]
+    completion_r = [72 + (r - 100) * 0.2 for r in rews]
+    time_r = [(r - 100) * 0.05 for r in rews]
+
+    result = {name: array("d") for name in METRICS}
+    players_out, completion_out = result["expected_players"], result["completion"]
+    time_out, load_out = result["avg_time"], result["server_load"]
+    pass_out = result["passability"]
+    for d in diffs:
+        d_players = d * 3
+        d_completion = (d - 50) * 0.35
+        d_time = 30 + (d - 50) * 0.25
+        score = passability(d / 100, completion_mean)
+        for e in enems:
+            e_completion = (e - 10) * 0.25
+            e_time = d_time + (e - 10) * 0.5
+            e_players = 900 - d_players - e * 2
+            players = [max(100, e_players + r) for r in players_r]
+            players_out.extend(players)
+            completion_out.extend([
+                max(5, min(98, int(c - d_completion - e_completion))) for c in completion_r
+            ])
+            time_out.extend([max(5, int(e_time - t)) for t in time_r])
+            load_out.extend([0 if p < 700 else 1 if p < 1000 else 2 for p in players])
+        pass_out.extend([score] * (len(enems) * len(rews)))
+    return result
+
+
+def _evaluate_chunk(args: Tuple[Sequence[int], Sequence[int], Sequence[int], float]) -> Dict[str, bytes]:
+    # Массивы передаются между процессами байтами — без списков Python
+    return {name: column.tobytes() for name, column in _evaluate(*args).items()}
+
+
+@dataclass
+class SweepResult:
+    """
+    Плотная сетка метрик: для каждой метрики массив array("d") размера
+    len(difficulty) * len(enemies) * len(reward) в порядке осей AXES.
+    """
+
+    axes: Dict[str, List[int]]
+    values: Dict[str, array]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(len(self.axes[name]) for name in AXES)
+
+    def _offset(self, index: Dict[str, int]) -> int:
+        offset = 0
+        for name, size in zip(AXES, self.shape):
+            offset = offset * size + index[name]
+        return offset
+
+    def value(self, metric: str, difficulty: int, enemies: int, reward: int) -> float:
+        """Значение метрики по индексам осей."""
+        index = {"difficulty": difficulty, "enemies": enemies, "reward": reward}
+        return self.values[metric][self._offset(index)]
+
+    def heatmap(
+        self,
+        metric: str,
+        rows: str = "difficulty",
+        cols: str = "enemies",
+        **fixed: int,
+    ) -> List[List[float]]:
+        """
+        Двумерный срез метрики для тепловой карты: строки и столбцы — оси
+        rows и cols, оставшаяся ось фиксирована индексом (по умолчанию 0).
+        """
+        if rows == cols or {rows, cols} - set(AXES):
+            raise ValueError(f"Оси тепловой карты должны быть двумя разными из {AXES}")
+        (other,) = set(AXES) - {rows, cols}
+        index = {other: fixed.get(other, 0)}
+        column = self.values[metric]
+        grid = []
+        for i in range(len(self.axes[rows])):
+            index[rows] = i
+            line = []
+            for j in range(len(self.axes[cols])):
+                index[cols] = j
+                line.append(column[self._offset(index)])
+            grid.append(line)
+        return grid
+
+
+class SweepEngine:
+    """
+    Перебор сетки параметров уровня (сложность, противники, награды)
+    через модель предпросмотра и модель проходимости.
+
+    Большие сетки делятся по оси сложности между процессами
+    (ProcessPoolExecutor); результат собирается в том же порядке.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        parallel_threshold: int = PARALLEL_THRESHOLD,
+    ) -> None:
+        # Число процессов; None — по числу ядер, 1 — без пула
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.parallel_threshold = parallel_threshold
+
+    def run(
+        self,
+        difficulties: Sequence[int],
+        enemies: Sequence[int],
+        rewards: Sequence[int],
+        completion_mean: float = COMPLETION_NORM / 2,
+    ) -> SweepResult:
+        """
+        completion_mean — среднее время прохождения (секунды) для модели
+        проходимости, например completion_time_mean из analyze_data.
+        """
+        axes = {
+            "difficulty": list(difficulties),
+            "enemies": list(enemies),
+            "reward": list(rewards),
+        }
+        size = len(axes["difficulty"]) * len(axes["enemies"]) * len(axes["reward"])
+        workers = min(self.workers, len(axes["difficulty"]))
+        if workers <= 1 or size < self.parallel_threshold:
+            values = _evaluate(axes["difficulty"], axes["enemies"], axes["reward"], completion_mean)
+            return SweepResult(axes, values)
+
+        step = -(-len(axes["difficulty"]) // workers)
+        chunks = [
+            (axes["difficulty"][i:i + step], axes["enemies"], axes["reward"], completion_mean)
+            for i in range(0, len(axes["difficulty"]), step)
+        ]
+        values = {name: array("d") for name in METRICS}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_evaluate_chunk, chunks):
+                for name, data in part.items():
+                    values[name].frombytes(data)
+        return SweepResult(axes, values)
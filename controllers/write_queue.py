@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from model import RunningStats, StorageRecord, StorageRepository
+from .journal import JournalManager
+
+
+# Что делать, если в очереди нет места под новый пакет
+BLOCK = "block"              # ждать, пока писатель освободит место
+DROP_OLDEST = "drop_oldest"  # выбросить самые старые пакеты
+REJECT = "reject"            # отказать в приёме нового пакета
+POLICIES = (BLOCK, DROP_OLDEST, REJECT)
+
+# Вызывается в потоке писателя с пакетом, который записан в хранилище
+WrittenHook = Callable[[List[StorageRecord]], None]
+
+
+class WriteQueue:
+    """
+    Ограниченная очередь записи показаний с фоновым потоком-писателем.
+
+    Сбор данных кладёт пакеты в очередь (put) и не ждёт хранилище; писатель
+    забирает всё накопленное и пишет одним save_records (не больше
+    max_write записей за раз). Размер очереди ограничен capacity записями,
+    при переполнении действует политика BLOCK, DROP_OLDEST или REJECT.
+    close() дописывает очередь и останавливает писателя.
+
+    on_written пакета вызывается после его записи под storage.lock; для
+    отброшенных, отклонённых и не записанных из-за ошибки пакетов — нет.
+    Ошибки записи и on_written писатель переживает и отмечает в журнале (WARN).
+    """
+
+    def __init__(
+        self,
+        storage: StorageRepository,
+        capacity: int = 100_000,
+        policy: str = BLOCK,
+        max_write: int = 50_000,
+        journal: Optional[JournalManager] = None,
+    ) -> None:
+        if capacity <= 0 or max_write <= 0:
+            raise ValueError("Ёмкость очереди и размер записи должны быть положительными")
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {policy}")
+        self._storage = storage
+        self._journal = journal or JournalManager()
+        self.capacity = capacity
+        self.policy = policy
+        self.max_write = max_write
+        # Пакет, момент постановки в очередь (для задержки до записи) и on_written
+        self._batches: Deque[Tuple[List[StorageRecord], float, Optional[WrittenHook]]] = deque()
+        self._depth = 0
+        self._writing = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._max_depth = 0
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._failed = 0
+        self._writes = 0
+        self._write_latency = RunningStats()
+        self._queue_latency = RunningStats()
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        """Записи, ещё не отданные хранилищу (в очереди и в текущей записи)."""
+        with self._cond:
+            return self._depth + self._writing
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    # ------------------------------------------------------------------
+    # Постановка в очередь
+    # ------------------------------------------------------------------
+
+    def put(self, records: Sequence[StorageRecord], on_written: Optional[WrittenHook] = None) -> bool:
+        """
+        Ставит пакет в очередь. False — пакет не принят (политика REJECT
+        или очередь закрыта). Пакет больше capacity принимается только
+        в пустую очередь.
+        """
+        size = len(records)
+        if not size:
+            return True
+        with self._cond:
+            if self._closed:
+                self._rejected += size
+                return False
+            while self._batches and self._depth + size > self.capacity:
+                if self.policy == REJECT:
+                    self._rejected += size
+                    return False
+                if self.policy == DROP_OLDEST:
+                    dropped, _queued_at, _hook = self._batches.popleft()
+                    self._depth -= len(dropped)
+                    self._dropped += len(dropped)
+                else:
+                    self._cond.wait()
+                    if self._closed:
+                        self._rejected += size
+                        return False
+            self._batches.append((list(records), time.perf_counter(), on_written))
+            self._depth += size
+            self._enqueued += size
+            self._max_depth = max(self._max_depth, self._depth + self._writing)
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт, пока всё поставленное записано; False — не успели за timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._batches and not self._writing, timeout
+            )
+
+    def close(self) -> None:
+        """Дописывает очередь и останавливает писателя; новые пакеты не принимаются."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    # ------------------------------------------------------------------
+    # Писатель
+    # ------------------------------------------------------------------
+
+    def _take(self) -> Tuple[List[StorageRecord], List[float], List[Tuple[List[StorageRecord], WrittenHook]]]:
+        records: List[StorageRecord] = []
+        queued: List[float] = []
+        hooks: List[Tuple[List[StorageRecord], WrittenHook]] = []
+        while self._batches:
+            if records and len(records) + len(self._batches[0][0]) > self.max_write:
+                break
+            batch, queued_at, on_written = self._batches.popleft()
+            records.extend(batch)
+            queued.append(queued_at)
+            if on_written is not None:
+                hooks.append((batch, on_written))
+        self._depth -= len(records)
+        self._writing = len(records)
+        return records, queued, hooks
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._batches or self._closed)
+                if not self._batches:
+                    return
+                records, queued, hooks = self._take()
+                # Место освободилось: будим заблокированных в put
+                self._cond.notify_all()
+
+            started = time.perf_counter()
+            failed = 0
+            with self._storage.lock:
+                try:
+                    self._storage.save_records(records)
+                except Exception as exc:  # писатель не должен умирать из-за одного пакета
+                    failed = len(records)
+                    self._journal.add_entry(
+                        f"Не удалось записать {failed} показаний из очереди: {exc}", level="WARN"
+                    )
+                finished = time.perf_counter()
+                if not failed:
+                    for batch, on_written in hooks:
+                        try:
+                            on_written(batch)
+                        except Exception as exc:  # ошибка обработчика не отменяет запись
+                            self._journal.add_entry(
+                                f"Ошибка обработки записанного пакета: {exc}", level="WARN"
+                            )
+
+            with self._cond:
+                self._writes += 1
+                self._write_latency.add(finished - started)
+                for queued_at in queued:
+                    self._queue_latency.add(finished - queued_at)
+                self._written += len(records) - failed
+                self._failed += failed
+                self._writing = 0
+                self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "depth": float(self._depth + self._writing),
+                "max_depth": float(self._max_depth),
+                "enqueued": float(self._enqueued),
+                "written": float(self._written),
+                "dropped": float(self._dropped),
+                "rejected": float(self._rejected),
+                "failed": float(self._failed),
+                "writes": float(self._writes),
+                "mean_write_latency": self._write_latency.mean,
+                "max_write_latency": self._write_latency.maximum if self._write_latency.count else 0.0,
+                "mean_queue_latency": self._queue_latency.mean,
+                "max_queue_latency": self._queue_latency.maximum if self._queue_latency.count else 0.0,
+            }
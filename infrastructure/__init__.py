@@ -1,6 +1,7 @@
 from .container import DependencyContainer
 from .configurator import SystemConfigurator
 from .factories import RepositoryFactory, ControllerFactory
+from .snapshot import SnapshotManager
 from .views import View, LevelsView, RecommendationsView, ReportsView
 
 __all__ = [
@@ -8,6 +9,7 @@ __all__ = [
     "SystemConfigurator",
     "RepositoryFactory",
     "ControllerFactory",
+    "SnapshotManager",
     "View",
     "LevelsView",
     "RecommendationsView",
@@ -16,6 +18,7 @@ __all__ = [
 from .container import DependencyContainer
 from .configurator import SystemConfigurator
 from .factories import RepositoryFactory, ControllerFactory
+from .snapshot import SnapshotManager
 from .views import View, LevelsView, RecommendationsView, ReportsView
 
 __all__ = [
@@ -23,6 +26,7 @@ __all__ = [
     "SystemConfigurator",
     "RepositoryFactory",
     "ControllerFactory",
+    "SnapshotManager",
     "View",
     "LevelsView",
     "RecommendationsView",
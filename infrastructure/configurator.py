@@ -1,9 +1,17 @@
 from __future__ import annotations
-from model import Sensor
-
-from typing import Any
-
-from controllers import LevelManager, JournalManager
+from model import Sensor, TrendIndex
+
+from typing import Any, Iterable, Optional
+
+from controllers import (
+    AnomalyDetector,
+    ForecastCache,
+    LevelManager,
+    JournalManager,
+    PollingScheduler,
+    QuantileRegistry,
+    WriteQueue,
+)
 from .container import DependencyContainer
 from .factories import RepositoryFactory, ControllerFactory
 
@@ -11,7 +19,24 @@ from .factories import RepositoryFactory, ControllerFactory
 class SystemConfigurator:
 
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        backend: str = "memory",
+        polling: bool = False,
+        write_queue: Optional[str] = None,
+        sensors: Optional[Iterable[Sensor]] = None,
+        **backend_options: Any,
+    ) -> None:
+        self._backend = backend
+        # Фоновый опрос сенсоров по poll_frequency между initialize_sensors
+        # и finish_collection
+        self._polling = polling
+        # Политика переполнения очереди записи показаний ("block",
+        # "drop_oldest", "reject"); None — запись в потоке сбора
+        self._write_queue = write_queue
+        # Сенсоры вместо двух стандартных (например, synthetic_sensors для нагрузки)
+        self._sensors = list(sensors) if sensors is not None else None
+        self._backend_options = backend_options
         self._repo_factory: RepositoryFactory | None = None
         self._ctrl_factory: ControllerFactory | None = None
 
@@ -19,16 +44,37 @@ class SystemConfigurator:
 
         journal = JournalManager()
         container.register(JournalManager, journal)
+        # Выбросы в показаниях отмечаются в журнале при сборе данных
+        container.register(AnomalyDetector, AnomalyDetector())
 
         # Репозитории
-        repo_factory = RepositoryFactory(container)
+        repo_factory = RepositoryFactory(
+            container, backend=self._backend, **self._backend_options
+        )
         self._repo_factory = repo_factory
 
         sensor_repo = repo_factory.create("sensor")
-        sensor_repo.add_sensor(Sensor(1, "load", "%", 5, 0.7))  # нагрузка
-        sensor_repo.add_sensor(Sensor(2, "completion_time", "sec", 5, 120.0))
+        if self._sensors is not None:
+            sensor_repo.save_many(self._sensors)
+        else:
+            sensor_repo.add_sensor(Sensor(1, "load", "%", 5, 0.7))  # нагрузка
+            sensor_repo.add_sensor(Sensor(2, "completion_time", "sec", 5, 120.0))
         level_repo = repo_factory.create("level")
         storage_repo = repo_factory.create("storage")
+        # Скетчи квантилей следят за хранилищем: после перезапуска и
+        # восстановления снимка строятся по сохранённым показаниям
+        container.register(QuantileRegistry, QuantileRegistry(storage=storage_repo))
+        # Тренды для исторического анализа тоже строятся при запуске, а не
+        # при первом запросе
+        container.register(TrendIndex, TrendIndex(storage_repo))
+        container.register(
+            PollingScheduler, PollingScheduler(sensor_repo) if self._polling else None
+        )
+        container.register(
+            WriteQueue,
+            WriteQueue(storage_repo, policy=self._write_queue, journal=journal)
+            if self._write_queue is not None else None,
+        )
         forecast_repo = repo_factory.create("forecast")
         report_repo = repo_factory.create("report")
 
@@ -36,6 +82,11 @@ class SystemConfigurator:
         level_manager = LevelManager(level_repo)
         container.register(LevelManager, level_manager)
 
+        # Кэш прогнозов сбрасывается новыми показаниями и правкой уровней
+        forecast_cache = ForecastCache(storage_repo)
+        level_manager.subscribe(forecast_cache.invalidate)
+        container.register(ForecastCache, forecast_cache)
+
         # Фабрика контроллеров
         ctrl_factory = ControllerFactory(container)
         self._ctrl_factory = ctrl_factory
@@ -8,6 +8,14 @@ from model import (
     InMemoryStorageRepository,
     InMemoryForecastRepository,
     InMemoryReportRepository,
+    ColumnarStorageRepository,
+    MappedLogStorageRepository,
+    SqliteSensorRepository,
+    SqliteLevelRepository,
+    SqliteStorageRepository,
+    SqliteForecastRepository,
+    SqliteReportRepository,
+    TrendIndex,
 )
 from controllers import (
     DataCollectionController,
@@ -16,6 +24,11 @@ from controllers import (
     InterfaceController,
     LevelManager,
     JournalManager,
+    QuantileRegistry,
+    ForecastCache,
+    AnomalyDetector,
+    PollingScheduler,
+    WriteQueue,
 )
 from .container import DependencyContainer
 
@@ -23,8 +36,16 @@ from .container import DependencyContainer
 class RepositoryFactory:
   
 
-    def __init__(self, container: DependencyContainer) -> None:
+    def __init__(
+        self,
+        container: DependencyContainer,
+        backend: str = "memory",
+        **options: Any,
+    ) -> None:
         self._container = container
+        self._backend = backend
+        # Параметры конструкторов бэкенда по умолчанию (например, database для sqlite)
+        self._options = options
         self._repo_types: Dict[str, Any] = {
             "sensor": InMemorySensorRepository,
             "level": InMemoryLevelRepository,
@@ -32,11 +53,34 @@ class RepositoryFactory:
             "forecast": InMemoryForecastRepository,
             "report": InMemoryReportRepository,
         }
+        # Альтернативные бэкенды; ключи, которых бэкенд не переопределяет,
+        # создаются из _repo_types.
+        self._backends: Dict[str, Dict[str, Any]] = {
+            "memory": {},
+            "columnar": {"storage": ColumnarStorageRepository},
+            "mmap": {"storage": MappedLogStorageRepository},
+            "sqlite": {
+                "sensor": SqliteSensorRepository,
+                "level": SqliteLevelRepository,
+                "storage": SqliteStorageRepository,
+                "forecast": SqliteForecastRepository,
+                "report": SqliteReportRepository,
+            },
+        }
 
-    def create(self, key: str) -> Any:
+    def create(self, key: str, backend: str | None = None, **options: Any) -> Any:
         if key not in self._repo_types:
             raise KeyError(f"Неизвестный тип репозитория: {key}")
-        repo = self._repo_types[key]()
+        if backend is None or backend == self._backend:
+            backend = self._backend
+            options = {**self._options, **options}
+        if backend not in self._backends:
+            raise KeyError(f"Неизвестный бэкенд репозитория: {backend}")
+        repo_cls = self._backends[backend].get(key)
+        if repo_cls is None:
+            repo = self._repo_types[key]()
+        else:
+            repo = repo_cls(**options)
         self._container.register(f"repo:{key}", repo)
         return repo
 
@@ -69,12 +113,19 @@ class ControllerFactory:
                 sensor_repository=self._container.resolve("repo:sensor"),
                 storage_repository=self._container.resolve("repo:storage"),
                 journal=journal,
+                detector=self._container.resolve(AnomalyDetector),
+                scheduler=self._container.resolve(PollingScheduler),
+                writer=self._container.resolve(WriteQueue),
             )
         elif key == "analysis":
             ctrl = AnalysisController(
                 storage_repository=self._container.resolve("repo:storage"),
                 forecast_repository=self._container.resolve("repo:forecast"),
                 journal=journal,
+                sensor_repository=self._container.resolve("repo:sensor"),
+                quantiles=self._container.resolve(QuantileRegistry),
+                forecast_cache=self._container.resolve(ForecastCache),
+                trends=self._container.resolve(TrendIndex),
             )
         elif key == "decision":
             ctrl = DecisionSupportController(
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import gc
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from controllers import JournalManager, LogEntry
+from model import Sensor, Level, Report, Forecast, RecordColumns
+from .container import DependencyContainer
+
+
+# Заголовок: сигнатура, версия, число секций
+_HEADER = struct.Struct("<8sII")
+_MAGIC = b"OMISSNP1"
+_VERSION = 1
+# Секция: длина имени, имя, длина сжатых данных, данные
+_NAME = struct.Struct("<H")
+_PAYLOAD = struct.Struct("<Q")
+# Показания: число строк и длина JSON со списком событий
+_COLUMNS_HEADER = struct.Struct("<QI")
+# Колонки пишутся в little-endian независимо от платформы
+_SWAP = sys.byteorder != "little"
+
+# Ключ репозитория -> класс сущности и его поля со временем
+_ENTITIES: Dict[str, Tuple[type, Tuple[str, ...]]] = {
+    "sensor": (Sensor, ()),
+    "level": (Level, ()),
+    "forecast": (Forecast, ("created_at",)),
+    "report": (Report, ("created_at",)),
+}
+
+
+def _dump_entities(objs: List[Any], time_fields: Tuple[str, ...]) -> bytes:
+    rows = []
+    for obj in objs:
+        row = asdict(obj)
+        for name in time_fields:
+            row[name] = row[name].isoformat()
+        rows.append(row)
+    return json.dumps(rows, ensure_ascii=False).encode("utf-8")
+
+
+def _load_entities(data: bytes, cls: type, time_fields: Tuple[str, ...]) -> List[Any]:
+    objs = []
+    for row in json.loads(data):
+        for name in time_fields:
+            row[name] = datetime.fromisoformat(row[name])
+        objs.append(cls(**row))
+    return objs
+
+
+def _unconfigured(repo: Any, sensors: List[Sensor]) -> List[Sensor]:
+    """
+    Сенсоры снимка без тех, что уже настроены подклассом Sensor
+    (SourcedSensor и т. п.): источника в снимке нет, и замена обычным
+    Sensor его бы потеряла. Такие сенсоры остаются как в конфигурации.
+    """
+    restored = []
+    for sensor in sensors:
+        current = repo.load(sensor.sensor_id)
+        if current is None or type(current) is Sensor:
+            restored.append(sensor)
+    return restored
+
+
+def _dump_columns(columns: RecordColumns) -> bytes:
+    names = json.dumps(columns.event_names, ensure_ascii=False).encode("utf-8")
+    parts = [_COLUMNS_HEADER.pack(len(columns.record_ids), len(names)), names]
+    for column in columns[:5]:
+        if _SWAP:
+            column = array(column.typecode, column)
+            column.byteswap()
+        parts.append(column.tobytes())
+    return b"".join(parts)
+
+
+def _load_columns(data: bytes) -> RecordColumns:
+    count, names_size = _COLUMNS_HEADER.unpack_from(data, 0)
+    offset = _COLUMNS_HEADER.size
+    names = json.loads(data[offset:offset + names_size])
+    offset += names_size
+    view = memoryview(data)
+    columns = []
+    for typecode in ("q", "q", "q", "d", "I"):
+        column = array(typecode)
+        size = count * column.itemsize
+        column.frombytes(view[offset:offset + size])
+        if _SWAP:
+            column.byteswap()
+        columns.append(column)
+        offset += size
+    return RecordColumns(*columns, names)
+
+
+class SnapshotManager:
+    """
+    Снимок состояния контейнера в одном двоичном файле.
+
+    В снимок попадают журнал и все репозитории, которые не хранят данные
+    сами (persistent = False). Показания пишутся колонками (массивы
+    фиксированной ширины), остальное — JSON; каждая секция сжата zlib.
+    Файл заменяется атомарно, поэтому оборванная запись не портит
+    предыдущий снимок.
+    """
+
+    def __init__(self, path: str, interval: Optional[float] = None) -> None:
+        self.path = path
+        # Период фонового сохранения в секундах; None — только вручную и при остановке
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Сохранение и загрузка
+    # ------------------------------------------------------------------
+
+    def save(self, container: DependencyContainer) -> None:
+        sections: List[Tuple[str, bytes]] = []
+        for key, (_cls, time_fields) in _ENTITIES.items():
+            repo = container.resolve(f"repo:{key}")
+            if not repo.persistent:
+                sections.append((key, _dump_entities(repo.get_all(), time_fields)))
+        storage = container.resolve("repo:storage")
+        if not storage.persistent:
+            with storage.lock:
+                columns = storage.export_columns()
+            sections.append(("storage", _dump_columns(columns)))
+        journal: JournalManager = container.resolve(JournalManager)
+        sections.append(
+            ("journal", _dump_entities(journal.view_history(), ("timestamp",)))
+        )
+
+        with self._lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, len(sections)))
+                for name, data in sections:
+                    raw_name = name.encode("utf-8")
+                    packed = zlib.compress(data, 1)
+                    f.write(_NAME.pack(len(raw_name)))
+                    f.write(raw_name)
+                    f.write(_PAYLOAD.pack(len(packed)))
+                    f.write(packed)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+    def load(self, container: DependencyContainer) -> bool:
+        """Восстанавливает состояние из файла; False, если снимка нет."""
+        if not os.path.exists(self.path):
+            return False
+        with self._lock, open(self.path, "rb") as f:
+            data = f.read()
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Файл {self.path!r} не является снимком состояния")
+
+        offset = _HEADER.size
+        sections: Dict[str, bytes] = {}
+        for _ in range(count):
+            (name_size,) = _NAME.unpack_from(data, offset)
+            offset += _NAME.size
+            name = data[offset:offset + name_size].decode("utf-8")
+            offset += name_size
+            (size,) = _PAYLOAD.unpack_from(data, offset)
+            offset += _PAYLOAD.size
+            sections[name] = zlib.decompress(data[offset:offset + size])
+            offset += size
+
+        # Миллионы новых объектов без циклических ссылок: сборщик мусора
+        # на время загрузки только замедлял бы её
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for key, (cls, time_fields) in _ENTITIES.items():
+                if key in sections:
+                    repo = container.resolve(f"repo:{key}")
+                    objs = _load_entities(sections[key], cls, time_fields)
+                    if key == "sensor":
+                        objs = _unconfigured(repo, objs)
+                    repo.save_many(objs)
+            if "storage" in sections:
+                storage = container.resolve("repo:storage")
+                storage.import_columns(_load_columns(sections["storage"]))
+            if "journal" in sections:
+                journal: JournalManager = container.resolve(JournalManager)
+                entries = _load_entities(sections["journal"], LogEntry, ("timestamp",))
+                journal.restore_history(entries)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return True
+
+    # ------------------------------------------------------------------
+    # Периодическое сохранение
+    # ------------------------------------------------------------------
+
+    def start(self, container: DependencyContainer) -> None:
+        if self.interval is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(container,), name="snapshot", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, container: DependencyContainer) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.save(container)
+            except Exception as exc:  # состояние менялось во время обхода — повторим позже
+                journal: JournalManager = container.resolve(JournalManager)
+                journal.add_entry(f"Не удалось сохранить снимок: {exc}", level="WARN")
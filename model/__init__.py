@@ -1,12 +1,27 @@
-from .entities import Sensor, Level, StorageRecord, Report, Forecast
+from .entities import (
+    Sensor,
+    Level,
+    StorageRecord,
+    Report,
+    Forecast,
+    MEASURE_LEVEL_PREFIX,
+    level_event,
+    level_from_event,
+)
+from .encoding import RecordColumns
 from .repository_base import (
     Repository,
     SensorRepository,
     LevelRepository,
     StorageRepository,
+    StorageListener,
     ReportRepository,
     ForecastRepository,
 )
+from .rollups import Rollup, RollupStore, DEFAULT_RESOLUTIONS
+from .running_stats import RunningStats, RunningStatsIndex
+from .time_windows import TimeWindowIndex
+from .trends import LinearTrend, TrendIndex
 from .repository_memory import (
     InMemorySensorRepository,
     InMemoryLevelRepository,
@@ -14,6 +29,16 @@ from .repository_memory import (
     InMemoryReportRepository,
     InMemoryForecastRepository,
 )
+from .repository_columnar import ColumnarStorageRepository
+from .repository_mmap import MappedLogStorageRepository, LogColumns
+from .repository_sqlite import (
+    SqliteDatabase,
+    SqliteSensorRepository,
+    SqliteLevelRepository,
+    SqliteStorageRepository,
+    SqliteReportRepository,
+    SqliteForecastRepository,
+)
 
 __all__ = [
     "Sensor",
@@ -21,10 +46,23 @@ __all__ = [
     "StorageRecord",
     "Report",
     "Forecast",
+    "MEASURE_LEVEL_PREFIX",
+    "level_event",
+    "level_from_event",
+    "RecordColumns",
     "Repository",
     "SensorRepository",
     "LevelRepository",
     "StorageRepository",
+    "StorageListener",
+    "Rollup",
+    "RollupStore",
+    "DEFAULT_RESOLUTIONS",
+    "RunningStats",
+    "RunningStatsIndex",
+    "TimeWindowIndex",
+    "LinearTrend",
+    "TrendIndex",
     "ReportRepository",
     "ForecastRepository",
     "InMemorySensorRepository",
@@ -32,4 +70,13 @@ __all__ = [
     "InMemoryStorageRepository",
     "InMemoryReportRepository",
     "InMemoryForecastRepository",
+    "ColumnarStorageRepository",
+    "MappedLogStorageRepository",
+    "LogColumns",
+    "SqliteDatabase",
+    "SqliteSensorRepository",
+    "SqliteLevelRepository",
+    "SqliteStorageRepository",
+    "SqliteReportRepository",
+    "SqliteForecastRepository",
 ]
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple
+
+
+# Точка отсчёта для компактного хранения времени. Сущности используют
+# «наивные» datetime, поэтому и эпоха наивная: перевод без учёта часовых поясов.
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def datetime_to_micros(value: datetime) -> int:
+    """Время -> целое число микросекунд от EPOCH (без потери точности)."""
+    return (value - EPOCH) // _MICROSECOND
+
+
+def micros_to_datetime(value: int) -> datetime:
+    """Обратное преобразование к datetime_to_micros."""
+    return EPOCH + timedelta(microseconds=value)
+
+
+class EventCodeTable:
+    """Таблица интернирования строк event_type: строка <-> целочисленный код."""
+
+    def __init__(self) -> None:
+        self._codes: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def encode(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self._names)
+            self._codes[name] = code
+            self._names.append(name)
+        return code
+
+    def decode(self, code: int) -> str:
+        return self._names[code]
+
+    def lookup(self, name: str) -> int | None:
+        return self._codes.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class RecordColumns(NamedTuple):
+    """
+    Показания в колоночном виде (для снимков и пакетного переноса).
+
+    Строка i: record_ids[i], timestamps[i] (мкс от EPOCH), sensor_ids[i],
+    values[i] и событие event_names[event_codes[i]].
+    """
+
+    record_ids: array    # "q"
+    timestamps: array    # "q"
+    sensor_ids: array    # "q"
+    values: array        # "d"
+    event_codes: array   # "I"
+    event_names: List[str]
@@ -1,14 +1,43 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Optional
 
 
+# Префикс event_type для показаний, снятых во время тестирования уровня.
+MEASURE_LEVEL_PREFIX = "MEASURE_LEVEL_"
 
 
+def level_event(level_id: Optional[int]) -> str:
+    """
+    event_type показаний уровня (или "MEASURE" без уровня). Строка
+    интернируется: все записи уровня ссылаются на один объект.
+    """
+    if level_id is None:
+        return "MEASURE"
+    return sys.intern(f"{MEASURE_LEVEL_PREFIX}{level_id}")
 
-@dataclass
+
+# Различных event_type немного (по одному на уровень), а level_id читается
+# у каждой записи при анализе
+@lru_cache(maxsize=4096)
+def level_from_event(event_type: str) -> Optional[int]:
+    """Id уровня из event_type вида 'MEASURE_LEVEL_{id}', иначе None."""
+    if not event_type.startswith(MEASURE_LEVEL_PREFIX):
+        return None
+    try:
+        return int(event_type[len(MEASURE_LEVEL_PREFIX):])
+    except ValueError:
+        return None
+
+
+# Сущности без __dict__ (slots): меньше памяти на объект, а показаний
+# и записей журнала в памяти миллионы
+
+@dataclass(slots=True)
 class Sensor:
  
     sensor_id: int
@@ -45,16 +74,22 @@ class Level:
         return self.difficulty
 
 
-@dataclass
+@dataclass(slots=True)
 class StorageRecord:
 
     timestamp: datetime
     sensor_id: int
     value: float
     event_type: str
+    # Присваивается хранилищем при сохранении; в сравнении не участвует
+    record_id: Optional[int] = field(default=None, compare=False)
 
+    @property
+    def level_id(self) -> Optional[int]:
+        return level_from_event(self.event_type)
 
-@dataclass
+
+@dataclass(slots=True)
 class Report:
 
     report_id: int
@@ -68,7 +103,7 @@ class Report:
         return f"[FORMAT={fmt}] {self.content}"
 
 
-@dataclass
+@dataclass(slots=True)
 class Forecast:
 
     forecast_id: int
@@ -1,10 +1,36 @@
 from __future__ import annotations
 
+import threading
 from abc import ABC, abstractmethod
-from typing import Generic, List, Optional, TypeVar
+from array import array
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import (
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    TYPE_CHECKING,
+)
 
+from .encoding import EventCodeTable, RecordColumns, datetime_to_micros, micros_to_datetime
 from .entities import Sensor, Level, StorageRecord, Report, Forecast
 
+if TYPE_CHECKING:
+    from .rollups import Rollup, RollupStore
+
+
+# Размер порции, которой индексы просматривают историю при построении
+BACKFILL_CHUNK = 10_000
+
+# Состояние RunningStats: count, mean, m2, min, max
+StatsState = Tuple[int, float, float, float, float]
+
 
 T = TypeVar("T")
 ID = TypeVar("ID")
@@ -13,12 +39,20 @@ ID = TypeVar("ID")
 
 
 class Repository(ABC, Generic[T, ID]):
- 
+
+    # True, если данные сами переживают перезапуск (файл, БД);
+    # такие репозитории не попадают в снимок состояния
+    persistent = False
 
     @abstractmethod
     def save(self, obj: T) -> None:
         raise NotImplementedError
 
+    def save_many(self, objs: Iterable[T]) -> None:
+        """Пакетная запись; бэкенды переопределяют её, чтобы не платить за каждый объект."""
+        for obj in objs:
+            self.save(obj)
+
     @abstractmethod
     def load(self, identifier: ID) -> Optional[T]:
         raise NotImplementedError
@@ -31,6 +65,42 @@ class Repository(ABC, Generic[T, ID]):
     def get_all(self) -> List[T]:
         raise NotImplementedError
 
+    # Потоковый доступ. Реализации по умолчанию опираются на get_all();
+    # бэкенды переопределяют их, чтобы не копировать всё содержимое.
+
+    def iter_all(self) -> Iterator[T]:
+        return iter(self.get_all())
+
+    def tail(self, n: int) -> List[T]:
+        """Последние n объектов в порядке хранения."""
+        if n <= 0:
+            return []
+        return self.get_all()[-n:]
+
+    def latest(self) -> Optional[T]:
+        last = self.tail(1)
+        return last[0] if last else None
+
+
+class TimedRepository(Repository[T, ID], ABC):
+    """Репозиторий объектов с меткой времени: добавляет выборку по интервалу."""
+
+    @staticmethod
+    @abstractmethod
+    def _time_of(obj: T) -> datetime:
+        raise NotImplementedError
+
+    def iter_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[T]:
+        """Объекты с start <= время < end; None — граница не задана."""
+        for obj in self.iter_all():
+            moment = self._time_of(obj)
+            if (start is None or moment >= start) and (end is None or moment < end):
+                yield obj
+
 
 
 
@@ -42,14 +112,168 @@ class LevelRepository(Repository[Level, int], ABC):
     pass
 
 
-class StorageRepository(Repository[StorageRecord, int], ABC):
-    
-    pass
+class StorageListener(ABC):
+    """Подписчик хранилища показаний: получает добавленные и удалённые записи."""
 
+    @abstractmethod
+    def records_added(self, records: Sequence[StorageRecord]) -> None:
+        raise NotImplementedError
 
-class ReportRepository(Repository[Report, int], ABC):
-    pass
+    @abstractmethod
+    def records_removed(self, records: Sequence[StorageRecord]) -> None:
+        raise NotImplementedError
 
 
-class ForecastRepository(Repository[Forecast, int], ABC):
-    pass
+class StorageRepository(TimedRepository[StorageRecord, int], ABC):
+
+    # Реализации по умолчанию — полный просмотр; хранилища с индексами
+    # переопределяют их.
+
+    # Подписчики; бэкенды уведомляют их, только если список не пуст
+    _listeners: Tuple[StorageListener, ...] = ()
+    _rollups: Optional["RollupStore"] = None
+
+    @staticmethod
+    def _time_of(obj: StorageRecord) -> datetime:
+        return obj.timestamp
+
+    @property
+    def lock(self) -> threading.RLock:
+        """
+        Общая блокировка записи и чтения. Показания пишутся и из фоновых
+        потоков (опрос, очередь записи), а подписчики обновляются в потоке
+        записи: запись вместе с уведомлением и чтение индексов, построенных
+        по хранилищу, выполняются под ней.
+        """
+        lock = self.__dict__.get("_lock_rw")
+        if lock is None:
+            # setdefault атомарен: при гонке все получат одну блокировку
+            lock = self.__dict__.setdefault("_lock_rw", threading.RLock())
+        return lock
+
+    def subscribe(self, listener: StorageListener) -> None:
+        self._listeners = (*self._listeners, listener)
+
+    def unsubscribe(self, listener: StorageListener) -> None:
+        self._listeners = tuple(l for l in self._listeners if l is not listener)
+
+    def _notify_added(self, records: Sequence[StorageRecord]) -> None:
+        for listener in self._listeners:
+            listener.records_added(records)
+
+    def _notify_removed(self, records: Sequence[StorageRecord]) -> None:
+        for listener in self._listeners:
+            listener.records_removed(records)
+
+    def iter_chunks(self, size: int = BACKFILL_CHUNK) -> Iterator[List[StorageRecord]]:
+        """Все показания порциями не больше size — без копии всей истории в памяти."""
+        records = self.iter_all()
+        while True:
+            chunk = list(islice(records, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def level_sensor_aggregates(self) -> Optional[Dict[Tuple[Optional[int], int], StatsState]]:
+        """
+        Состояние RunningStats по парам (уровень или None, сенсор), если
+        бэкенд умеет считать его сам (SQL GROUP BY); иначе None, и индексы
+        просматривают историю через iter_chunks.
+        """
+        return None
+
+    def _notify_cleared(self, before: datetime) -> None:
+        """Вызывается из clear_old до удаления записей."""
+        if self._listeners:
+            self._notify_removed(list(self.iter_range(end=before)))
+
+    @property
+    def rollups(self) -> "RollupStore":
+        """Агрегаты по уровням разрешения; создаются при первом обращении."""
+        if self._rollups is None:
+            self.enable_rollups()
+        return self._rollups
+
+    def enable_rollups(self, resolutions: Optional[Sequence[timedelta]] = None) -> "RollupStore":
+        """Строит агрегаты по уже сохранённым показаниям и подписывает их на запись."""
+        from .rollups import DEFAULT_RESOLUTIONS, RollupStore
+
+        if self._rollups is not None:
+            self.unsubscribe(self._rollups)
+        self._rollups = RollupStore(self, resolutions or DEFAULT_RESOLUTIONS)
+        return self._rollups
+
+    def get_rollups(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        resolution: timedelta,
+        sensor_id: Optional[int] = None,
+        level_id: Optional[int] = None,
+    ) -> List["Rollup"]:
+        """Агрегаты сенсора или уровня на [start, end) с шагом resolution."""
+        return self.rollups.query(start, end, resolution, sensor_id=sensor_id, level_id=level_id)
+
+    def save_record(self, record: StorageRecord) -> None:
+        self.save(record)
+
+    def save_records(self, records: Iterable[StorageRecord]) -> None:
+        self.save_many(records)
+
+    def get_history(self, sensor_id: int) -> List[StorageRecord]:
+        return [r for r in self.get_all() if r.sensor_id == sensor_id]
+
+    def get_level_history(self, level_id: int) -> List[StorageRecord]:
+        return [r for r in self.get_all() if r.level_id == level_id]
+
+    def iter_level_history(self, level_id: int) -> Iterator[StorageRecord]:
+        return iter(self.get_level_history(level_id))
+
+    def get_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[StorageRecord]:
+        """Показания с start <= timestamp < end; None — граница не задана."""
+        return list(self.iter_range(start, end))
+
+    def export_columns(self) -> RecordColumns:
+        """Все живые показания в колоночном виде (с их record_id)."""
+        events = EventCodeTable()
+        columns = RecordColumns(array("q"), array("q"), array("q"), array("d"), array("I"), [])
+        for record in self.iter_all():
+            columns.record_ids.append(record.record_id)
+            columns.timestamps.append(datetime_to_micros(record.timestamp))
+            columns.sensor_ids.append(record.sensor_id)
+            columns.values.append(record.value)
+            columns.event_codes.append(events.encode(record.event_type))
+        columns.event_names.extend(events.names())
+        return columns
+
+    def import_columns(self, columns: RecordColumns) -> None:
+        """Пакетно добавляет показания из export_columns(), сохраняя record_id."""
+        names = columns.event_names
+        self.save_many(
+            StorageRecord(micros_to_datetime(ts), sensor_id, value, names[code], record_id)
+            for record_id, ts, sensor_id, value, code in zip(
+                columns.record_ids,
+                columns.timestamps,
+                columns.sensor_ids,
+                columns.values,
+                columns.event_codes,
+            )
+        )
+
+
+class ReportRepository(TimedRepository[Report, int], ABC):
+
+    @staticmethod
+    def _time_of(obj: Report) -> datetime:
+        return obj.created_at
+
+
+class ForecastRepository(TimedRepository[Forecast, int], ABC):
+
+    @staticmethod
+    def _time_of(obj: Forecast) -> datetime:
+        return obj.created_at
@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from itertools import compress, islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .encoding import EventCodeTable, RecordColumns, datetime_to_micros, micros_to_datetime
+from .entities import StorageRecord, level_from_event
+from .repository_base import StorageRepository
+
+
+class ColumnarStorageRepository(StorageRepository):
+    """
+    Колоночное хранилище показаний.
+
+    Вместо списка объектов StorageRecord держит четыре типизированных массива
+    (время в микросекундах, id сенсора, значение, код события). Строки
+    event_type интернируются в EventCodeTable. Объекты StorageRecord
+    создаются только при чтении.
+
+    record_id записи — её номер в журнале строк (_base_id + номер строки).
+    Удаление снимает флаг в _alive; очистка старых данных физически
+    отрезает только начало массивов, поэтому номера не меняются. Запись
+    с заданным record_id, как в InMemoryStorageRepository, сохраняет его:
+    занятая строка перезаписывается, пропуск заполняется удалёнными строками.
+    """
+
+    def __init__(self) -> None:
+        self._timestamps = array("q")
+        self._sensor_ids = array("q")
+        self._values = array("d")
+        self._event_codes = array("I")
+        self._alive = array("B")
+        self._events = EventCodeTable()
+        # Уровень для каждого кода события (разбирается один раз на код)
+        self._code_levels: List[Optional[int]] = []
+        # Вторичные индексы: record_id по сенсору и по уровню (по возрастанию)
+        self._by_sensor: Dict[int, array] = {}
+        self._by_level: Dict[int, array] = {}
+        self._base_id = 0
+        self._dead = 0
+        # Пока время строк не убывает, границы по времени ищутся бисекцией
+        self._time_ordered = True
+
+    def __len__(self) -> int:
+        return len(self._values) - self._dead
+
+    def _row(self, row: int) -> StorageRecord:
+        return StorageRecord(
+            timestamp=micros_to_datetime(self._timestamps[row]),
+            sensor_id=self._sensor_ids[row],
+            value=self._values[row],
+            event_type=self._events.decode(self._event_codes[row]),
+            record_id=self._base_id + row,
+        )
+
+    def _rows(self, ids: Iterable[int]) -> List[StorageRecord]:
+        base = self._base_id
+        alive = self._alive
+        return [self._row(i - base) for i in ids if alive[i - base]]
+
+    def _encode_event(self, event_type: str) -> int:
+        code = self._events.encode(event_type)
+        if code == len(self._code_levels):
+            self._code_levels.append(level_from_event(event_type))
+        return code
+
+    def _index(self, record_id: int, sensor_id: int, code: int) -> None:
+        bucket = self._by_sensor.get(sensor_id)
+        if bucket is None:
+            bucket = self._by_sensor[sensor_id] = array("q")
+        if bucket and bucket[-1] >= record_id:
+            # Номер из середины журнала (запись с заданным record_id)
+            bucket.insert(bisect_right(bucket, record_id), record_id)
+        else:
+            bucket.append(record_id)
+        level_id = self._code_levels[code]
+        if level_id is not None:
+            bucket = self._by_level.get(level_id)
+            if bucket is None:
+                bucket = self._by_level[level_id] = array("q")
+            if bucket and bucket[-1] >= record_id:
+                bucket.insert(bisect_right(bucket, record_id), record_id)
+            else:
+                bucket.append(record_id)
+
+    def _unindex(self, record_id: int, sensor_id: int, code: int) -> None:
+        for index, key in (
+            (self._by_sensor, sensor_id),
+            (self._by_level, self._code_levels[code]),
+        ):
+            bucket = index.get(key)
+            if bucket:
+                at = bisect_left(bucket, record_id)
+                if at < len(bucket) and bucket[at] == record_id:
+                    del bucket[at]
+
+    def _pad(self, rows: int, front: bool, ts: int, sensor_id: int, code: int) -> None:
+        """Добавляет rows удалённых строк в начало или конец журнала."""
+        timestamps = self._timestamps
+        if timestamps and (ts > timestamps[0] if front else ts < timestamps[-1]):
+            self._time_ordered = False
+        fill = (
+            (self._timestamps, ts),
+            (self._sensor_ids, sensor_id),
+            (self._values, 0.0),
+            (self._event_codes, code),
+            (self._alive, 0),
+        )
+        for column, value in fill:
+            block = array(column.typecode, [value]) * rows
+            if front:
+                column[0:0] = block
+            else:
+                column.extend(block)
+        self._dead += rows
+        if front:
+            self._base_id -= rows
+
+    def _put(self, obj: StorageRecord) -> bool:
+        """
+        Записывает показание с заданным record_id; False, если ровно такая
+        запись уже сохранена.
+        """
+        record_id = obj.record_id
+        code = self._encode_event(obj.event_type)
+        ts = datetime_to_micros(obj.timestamp)
+        if not self._values:
+            self._base_id = record_id
+        if record_id < self._base_id:
+            self._pad(self._base_id - record_id, True, ts, obj.sensor_id, code)
+        row = record_id - self._base_id
+        if row >= len(self._values):
+            self._pad(row - len(self._values) + 1, False, ts, obj.sensor_id, code)
+
+        if self._alive[row]:
+            current = self._row(row)
+            if current == obj:
+                return False
+            if self._listeners:
+                self._notify_removed((current,))
+        else:
+            self._dead -= 1
+        self._unindex(record_id, self._sensor_ids[row], self._event_codes[row])
+        self._timestamps[row] = ts
+        self._sensor_ids[row] = obj.sensor_id
+        self._values[row] = obj.value
+        self._event_codes[row] = code
+        self._alive[row] = 1
+        self._index(record_id, obj.sensor_id, code)
+        timestamps = self._timestamps
+        if (row and timestamps[row - 1] > ts) or (
+            row + 1 < len(timestamps) and ts > timestamps[row + 1]
+        ):
+            self._time_ordered = False
+        return True
+
+    def save(self, obj: StorageRecord) -> None:
+        if obj.record_id is not None:
+            if self._put(obj) and self._listeners:
+                self._notify_added((obj,))
+            return
+        code = self._encode_event(obj.event_type)
+        ts = datetime_to_micros(obj.timestamp)
+        if self._timestamps and ts < self._timestamps[-1]:
+            self._time_ordered = False
+        obj.record_id = self._base_id + len(self._values)
+        self._timestamps.append(ts)
+        self._sensor_ids.append(obj.sensor_id)
+        self._values.append(obj.value)
+        self._event_codes.append(code)
+        self._alive.append(1)
+        self._index(obj.record_id, obj.sensor_id, code)
+        if self._listeners:
+            self._notify_added((obj,))
+
+    def save_many(self, objs: Iterable[StorageRecord]) -> None:
+        records = list(objs)
+        if not records:
+            return
+        if any(r.record_id is not None for r in records):
+            added = []
+            for record in records:
+                if record.record_id is None:
+                    record.record_id = self._base_id + len(self._values)
+                if self._put(record):
+                    added.append(record)
+            if added and self._listeners:
+                self._notify_added(added)
+            return
+        first_id = self._base_id + len(self._values)
+        timestamps = [datetime_to_micros(r.timestamp) for r in records]
+        codes = [self._encode_event(r.event_type) for r in records]
+        last = self._timestamps[-1] if self._timestamps else timestamps[0]
+        for ts in timestamps:
+            if ts < last:
+                self._time_ordered = False
+                break
+            last = ts
+        # Колонки пополняются целиком, без поштучных append
+        self._timestamps.extend(timestamps)
+        self._sensor_ids.extend(r.sensor_id for r in records)
+        self._values.extend(r.value for r in records)
+        self._event_codes.extend(codes)
+        self._alive.frombytes(b"\x01" * len(records))
+        for offset, (record, code) in enumerate(zip(records, codes)):
+            record.record_id = first_id + offset
+            self._index(record.record_id, record.sensor_id, code)
+        if self._listeners:
+            self._notify_added(records)
+
+    def export_columns(self) -> RecordColumns:
+        names = self._events.names()
+        if not self._dead:
+            first = self._base_id
+            return RecordColumns(
+                array("q", range(first, first + len(self._values))),
+                self._timestamps[:],
+                self._sensor_ids[:],
+                self._values[:],
+                self._event_codes[:],
+                names,
+            )
+        alive = self._alive
+        return RecordColumns(
+            array("q", compress(range(self._base_id, self._base_id + len(alive)), alive)),
+            array("q", compress(self._timestamps, alive)),
+            array("q", compress(self._sensor_ids, alive)),
+            array("d", compress(self._values, alive)),
+            array("I", compress(self._event_codes, alive)),
+            names,
+        )
+
+    def import_columns(self, columns: RecordColumns) -> None:
+        count = len(columns.record_ids)
+        if not count:
+            return
+        remap = [self._encode_event(name) for name in columns.event_names]
+        ids, timestamps, sensor_ids, values, codes = columns[:5]
+        if remap != list(range(len(remap))):
+            codes = array("I", [remap[code] for code in codes])
+        if any(a >= b for a, b in zip(ids, islice(ids, 1, None))):
+            order = sorted(range(count), key=ids.__getitem__)
+            ids, timestamps, sensor_ids, values, codes = (
+                array(column.typecode, [column[i] for i in order])
+                for column in (ids, timestamps, sensor_ids, values, codes)
+            )
+
+        if not self._values:
+            self._base_id = ids[0]
+        next_id = self._base_id + len(self._values)
+        if ids[0] < next_id:
+            raise ValueError("record_id из снимка уже заняты в хранилище")
+        if self._timestamps and timestamps[0] < self._timestamps[-1]:
+            self._time_ordered = False
+        elif any(a > b for a, b in zip(timestamps, islice(timestamps, 1, None))):
+            self._time_ordered = False
+
+        if ids[-1] - next_id + 1 == count:
+            # Номера идут подряд: колонки дописываются целиком
+            self._timestamps.extend(timestamps)
+            self._sensor_ids.extend(sensor_ids)
+            self._values.extend(values)
+            self._event_codes.extend(codes)
+            self._alive.frombytes(b"\x01" * count)
+        else:
+            # Пропуски в номерах заполняются удалёнными строками
+            for record_id, ts, sensor_id, value, code in zip(
+                ids, timestamps, sensor_ids, values, codes
+            ):
+                gap = record_id - self._base_id - len(self._values)
+                if gap:
+                    self._timestamps.extend([ts] * gap)
+                    self._sensor_ids.extend([sensor_id] * gap)
+                    self._values.extend([0.0] * gap)
+                    self._event_codes.extend([code] * gap)
+                    self._alive.frombytes(bytes(gap))
+                    self._dead += gap
+                self._timestamps.append(ts)
+                self._sensor_ids.append(sensor_id)
+                self._values.append(value)
+                self._event_codes.append(code)
+                self._alive.append(1)
+        for record_id, sensor_id, code in zip(ids, sensor_ids, codes):
+            self._index(record_id, sensor_id, code)
+        if self._listeners:
+            self._notify_added([self.load(record_id) for record_id in ids])
+
+    def load(self, identifier: int) -> Optional[StorageRecord]:
+        row = identifier - self._base_id
+        if 0 <= row < len(self._values) and self._alive[row]:
+            return self._row(row)
+        return None
+
+    def delete(self, identifier: int) -> None:
+        row = identifier - self._base_id
+        if 0 <= row < len(self._values) and self._alive[row]:
+            if self._listeners:
+                self._notify_removed((self._row(row),))
+            self._alive[row] = 0
+            self._dead += 1
+
+    def get_all(self) -> List[StorageRecord]:
+        return [self._row(i) for i in compress(range(len(self._values)), self._alive)]
+
+    def iter_all(self) -> Iterator[StorageRecord]:
+        row = 0
+        # Длина читается на каждом шаге: строки могут дописываться по ходу
+        while row < len(self._values):
+            if self._alive[row]:
+                yield self._row(row)
+            row += 1
+
+    def iter_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[StorageRecord]:
+        lo = None if start is None else datetime_to_micros(start)
+        hi = None if end is None else datetime_to_micros(end)
+        if not self._time_ordered:
+            for row, ts in enumerate(self._timestamps):
+                if (lo is None or ts >= lo) and (hi is None or ts < hi) and self._alive[row]:
+                    yield self._row(row)
+            return
+        first = 0 if lo is None else bisect_left(self._timestamps, lo)
+        last = len(self._timestamps) if hi is None else bisect_left(self._timestamps, hi)
+        for row in range(first, last):
+            if self._alive[row]:
+                yield self._row(row)
+
+    def iter_level_history(self, level_id: int) -> Iterator[StorageRecord]:
+        for record_id in self._by_level.get(level_id, ()):
+            row = record_id - self._base_id
+            if self._alive[row]:
+                yield self._row(row)
+
+    def tail(self, n: int) -> List[StorageRecord]:
+        result: List[StorageRecord] = []
+        row = len(self._values) - 1
+        while row >= 0 and len(result) < n:
+            if self._alive[row]:
+                result.append(self._row(row))
+            row -= 1
+        return result[::-1]
+
+    def latest(self) -> Optional[StorageRecord]:
+        last = self.tail(1)
+        return last[0] if last else None
+
+    def save_record(self, record: StorageRecord) -> None:
+        self.save(record)
+
+    def get_history(self, sensor_id: int) -> List[StorageRecord]:
+        return self._rows(self._by_sensor.get(sensor_id, ()))
+
+    def get_level_history(self, level_id: int) -> List[StorageRecord]:
+        return self._rows(self._by_level.get(level_id, ()))
+
+    def clear_old(self, before: datetime) -> None:
+        self._notify_cleared(before)
+        cutoff = datetime_to_micros(before)
+        timestamps = self._timestamps
+        if self._time_ordered:
+            prefix = bisect_left(timestamps, cutoff)
+        else:
+            # Вразнобой записанные старые строки помечаются удалёнными,
+            # отрезается только начало журнала
+            alive = self._alive
+            for row, ts in enumerate(timestamps):
+                if ts < cutoff and alive[row]:
+                    alive[row] = 0
+                    self._dead += 1
+            prefix = 0
+            while prefix < len(alive) and not alive[prefix]:
+                prefix += 1
+        if prefix:
+            self._drop_prefix(prefix)
+
+    def _drop_prefix(self, rows: int) -> None:
+        self._dead -= rows - sum(self._alive[:rows])
+        for column in (
+            self._timestamps,
+            self._sensor_ids,
+            self._values,
+            self._event_codes,
+            self._alive,
+        ):
+            del column[:rows]
+        self._base_id += rows
+        for index in (self._by_sensor, self._by_level):
+            for bucket in index.values():
+                del bucket[:bisect_left(bucket, self._base_id)]
+        if not self._values:
+            self._time_ordered = True
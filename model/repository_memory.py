@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Dict, List, Optional
-
-from .entities import Sensor, Level, StorageRecord, Report, Forecast
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from itertools import islice
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .encoding import RecordColumns, datetime_to_micros, micros_to_datetime
+from .entities import Sensor, Level, StorageRecord, Report, Forecast, level_from_event
 from .repository_base import (
     SensorRepository,
     LevelRepository,
@@ -25,6 +29,9 @@ class InMemorySensorRepository(SensorRepository):
     def save(self, obj: Sensor) -> None:
         self._storage[obj.sensor_id] = obj
 
+    def save_many(self, objs: Iterable[Sensor]) -> None:
+        self._storage.update((obj.sensor_id, obj) for obj in objs)
+
     def load(self, identifier: int) -> Optional[Sensor]:
         return self._storage.get(identifier)
 
@@ -34,6 +41,17 @@ class InMemorySensorRepository(SensorRepository):
     def get_all(self) -> List[Sensor]:
         return list(self._storage.values())
 
+    def iter_all(self) -> Iterator[Sensor]:
+        return iter(self._storage.values())
+
+    def tail(self, n: int) -> List[Sensor]:
+        if n <= 0:
+            return []
+        return list(islice(reversed(self._storage.values()), n))[::-1]
+
+    def latest(self) -> Optional[Sensor]:
+        return next(reversed(self._storage.values()), None)
+
 
 
     def add_sensor(self, sensor: Sensor) -> None:
@@ -55,6 +73,9 @@ class InMemoryLevelRepository(LevelRepository):
     def save(self, obj: Level) -> None:
         self._storage[obj.level_id] = obj
 
+    def save_many(self, objs: Iterable[Level]) -> None:
+        self._storage.update((obj.level_id, obj) for obj in objs)
+
     def load(self, identifier: int) -> Optional[Level]:
         return self._storage.get(identifier)
 
@@ -64,6 +85,17 @@ class InMemoryLevelRepository(LevelRepository):
     def get_all(self) -> List[Level]:
         return list(self._storage.values())
 
+    def iter_all(self) -> Iterator[Level]:
+        return iter(self._storage.values())
+
+    def tail(self, n: int) -> List[Level]:
+        if n <= 0:
+            return []
+        return list(islice(reversed(self._storage.values()), n))[::-1]
+
+    def latest(self) -> Optional[Level]:
+        return next(reversed(self._storage.values()), None)
+
  
     def add_level(self, level: Level) -> None:
         self.save(level)
@@ -75,36 +107,350 @@ class InMemoryLevelRepository(LevelRepository):
         self.save(level)
 
 
-class InMemoryStorageRepository(StorageRepository):
+_timestamp = attrgetter("timestamp")
+
+
+def _insert_ordered(bucket: List[StorageRecord], record: StorageRecord) -> None:
+    # Показания обычно приходят по возрастанию времени — это просто append
+    if not bucket or bucket[-1].timestamp <= record.timestamp:
+        bucket.append(record)
+    else:
+        insort(bucket, record, key=_timestamp)
+
 
+class _Segment:
+    """Показания одного временного интервала (по времени) вместе с их индексами."""
+
+    __slots__ = ("records", "by_sensor", "by_level", "dead")
 
     def __init__(self) -> None:
-        self._records: List[StorageRecord] = []
+        self.records: List[StorageRecord] = []
+        self.by_sensor: Dict[int, List[StorageRecord]] = {}
+        self.by_level: Dict[int, List[StorageRecord]] = {}
+        # Число удалённых (помеченных) записей, ещё не вычищенных уплотнением
+        self.dead = 0
+
+    def add(self, record: StorageRecord) -> None:
+        _insert_ordered(self.records, record)
+        _insert_ordered(self.by_sensor.setdefault(record.sensor_id, []), record)
+        level_id = record.level_id
+        if level_id is not None:
+            _insert_ordered(self.by_level.setdefault(level_id, []), record)
+
+    def between(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ) -> List[StorageRecord]:
+        records = self.records
+        lo = 0 if start is None else bisect_left(records, start, key=_timestamp)
+        hi = len(records) if end is None else bisect_left(records, end, key=_timestamp)
+        return records[lo:hi]
+
+    def rebuild(self, records: List[StorageRecord]) -> None:
+        """Заново строит сегмент из записей, уже упорядоченных по времени."""
+        self.records = records
+        self.by_sensor = by_sensor = {}
+        self.by_level = by_level = {}
+        self.dead = 0
+        levels: Dict[str, Optional[int]] = {}
+        for record in records:
+            by_sensor.setdefault(record.sensor_id, []).append(record)
+            event_type = record.event_type
+            if event_type not in levels:
+                levels[event_type] = level_from_event(event_type)
+            level_id = levels[event_type]
+            if level_id is not None:
+                by_level.setdefault(level_id, []).append(record)
+
+
+class InMemoryStorageRepository(StorageRepository):
+    """
+    Показания разбиты на сегменты по времени (по умолчанию — по часу).
+    Очистка старых данных отбрасывает сегменты целиком, а выборки по
+    интервалу времени просматривают только пересекающиеся с ним сегменты.
+
+    Каждая запись получает постоянный возрастающий record_id. Удаление
+    только помечает запись; сегменты с заметной долей удалённых записей
+    уплотняются понемногу при последующих вызовах save/delete (или сразу
+    через compact()).
+    """
+
+    # Доля удалённых записей, после которой сегмент уплотняется
+    COMPACT_RATIO = 0.25
+    # Сколько ссылок на отброшенные записи вычищается за один шаг
+    PURGE_BATCH = 4096
+
+    def __init__(self, segment_span: timedelta = timedelta(hours=1)) -> None:
+        self._span = segment_span // timedelta(microseconds=1)
+        if self._span <= 0:
+            raise ValueError("Длительность сегмента должна быть положительной")
+        self._segments: Dict[int, _Segment] = {}
+        # Отсортированные номера сегментов
+        self._keys: List[int] = []
+        self._count = 0
+
+        self._next_id = 0
+        self._by_id: Dict[int, StorageRecord] = {}
+        # Границы очисток (id, время): запись с меньшим id и более ранним
+        # временем удалена, даже если ещё не вычищена из _by_id. Id растут,
+        # время убывает — поглощённые более поздней очисткой границы убираются
+        self._horizon_ids: List[int] = []
+        self._horizon_times: List[datetime] = []
+        # Отложенная работа: сегменты к уплотнению и отброшенные записи
+        self._dirty: Dict[int, None] = {}
+        self._purge: List[List[StorageRecord]] = []
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _key(self, timestamp: datetime) -> int:
+        return datetime_to_micros(timestamp) // self._span
+
+    def _ordered(self, keys: Optional[List[int]] = None) -> Iterator[_Segment]:
+        for key in self._keys if keys is None else keys:
+            yield self._segments[key]
+
+    def _live(self, segment: _Segment, records: List[StorageRecord]) -> List[StorageRecord]:
+        if not segment.dead:
+            return records
+        by_id = self._by_id
+        return [r for r in records if by_id.get(r.record_id) is r]
 
     def save(self, obj: StorageRecord) -> None:
-        self._records.append(obj)
+        if self._append(obj) and self._listeners:
+            self._notify_added((obj,))
+        if self._dirty or self._purge:
+            self._compact_step()
+
+    def save_many(self, objs: Iterable[StorageRecord]) -> None:
+        # Отложенное уплотнение — один шаг на пакет, а не на запись
+        added = [obj for obj in objs if self._append(obj)]
+        if added and self._listeners:
+            self._notify_added(added)
+        if self._dirty or self._purge:
+            self._compact_step()
+
+    def _append(self, obj: StorageRecord) -> bool:
+        """Добавляет запись; False, если именно этот объект уже сохранён."""
+        if obj.record_id is None:
+            obj.record_id = self._next_id
+        else:
+            current = self.load(obj.record_id)
+            if current is obj:
+                return False
+            if current is not None:
+                if self._listeners:
+                    self._notify_removed((current,))
+                self._tombstone(current)
+        self._next_id = max(self._next_id, obj.record_id + 1)
+
+        key = self._key(obj.timestamp)
+        segment = self._segments.get(key)
+        if segment is None:
+            segment = self._segments[key] = _Segment()
+            insort(self._keys, key)
+        segment.add(obj)
+        self._by_id[obj.record_id] = obj
+        self._count += 1
+        return True
+
+    def import_columns(self, columns: RecordColumns) -> None:
+        if self._by_id or self._purge:
+            super().import_columns(columns)
+            return
+        # Пустое хранилище (восстановление из снимка): записи раскладываются
+        # по сегментам, и каждый сегмент строится один раз
+        names = columns.event_names
+        span = self._span
+        by_id = self._by_id
+        grouped: Dict[int, List[StorageRecord]] = {}
+        for record_id, ts, sensor_id, value, code in zip(
+            columns.record_ids,
+            columns.timestamps,
+            columns.sensor_ids,
+            columns.values,
+            columns.event_codes,
+        ):
+            record = StorageRecord(micros_to_datetime(ts), sensor_id, value, names[code], record_id)
+            by_id[record_id] = record
+            bucket = grouped.get(ts // span)
+            if bucket is None:
+                bucket = grouped[ts // span] = []
+            bucket.append(record)
+        for key, records in grouped.items():
+            records.sort(key=_timestamp)
+            segment = self._segments[key] = _Segment()
+            segment.rebuild(records)
+        self._keys = sorted(self._segments)
+        self._count = len(by_id)
+        if by_id:
+            self._next_id = max(self._next_id, max(columns.record_ids) + 1)
+        if self._listeners:
+            self._notify_added(list(by_id.values()))
 
     def load(self, identifier: int) -> Optional[StorageRecord]:
-        if 0 <= identifier < len(self._records):
-            return self._records[identifier]
-        return None
+        record = self._by_id.get(identifier)
+        if record is None:
+            return None
+        # Самая поздняя по времени граница среди очисток после сохранения записи
+        index = bisect_right(self._horizon_ids, identifier)
+        if index < len(self._horizon_ids) and record.timestamp < self._horizon_times[index]:
+            return None
+        return record
 
     def delete(self, identifier: int) -> None:
-        if 0 <= identifier < len(self._records):
-            self._records.pop(identifier)
+        record = self.load(identifier)
+        if record is not None:
+            if self._listeners:
+                self._notify_removed((record,))
+            self._tombstone(record)
+        self._compact_step()
+
+    def _tombstone(self, record: StorageRecord) -> None:
+        del self._by_id[record.record_id]
+        self._count -= 1
+        key = self._key(record.timestamp)
+        segment = self._segments[key]
+        segment.dead += 1
+        if segment.dead >= self.COMPACT_RATIO * len(segment.records):
+            self._dirty[key] = None
+
+    def _compact_segment(self, key: int) -> None:
+        segment = self._segments.get(key)
+        if segment is None or not segment.dead:
+            return
+        live = self._live(segment, segment.records)
+        if live:
+            segment.rebuild(live)
+        else:
+            del self._segments[key]
+            self._keys.pop(bisect_left(self._keys, key))
+
+    def _compact_step(self) -> None:
+        # Ограниченная порция отложенной работы за один вызов
+        if self._dirty:
+            key = next(iter(self._dirty))
+            del self._dirty[key]
+            self._compact_segment(key)
+        elif self._purge:
+            batch = self._purge[-1]
+            by_id = self._by_id
+            for record in batch[-self.PURGE_BATCH:]:
+                if by_id.get(record.record_id) is record:
+                    del by_id[record.record_id]
+            del batch[-self.PURGE_BATCH:]
+            if not batch:
+                self._purge.pop()
+
+    def compact(self) -> None:
+        """Выполнить всю отложенную работу: уплотнить сегменты, вычистить ссылки."""
+        for key in list(self._keys):
+            self._compact_segment(key)
+        self._dirty.clear()
+        while self._purge:
+            self._compact_step()
 
     def get_all(self) -> List[StorageRecord]:
-        return list(self._records)
+        result: List[StorageRecord] = []
+        for segment in self._ordered():
+            result.extend(self._live(segment, segment.records))
+        return result
+
+    def iter_all(self) -> Iterator[StorageRecord]:
+        return self.iter_range()
+
+    def iter_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[StorageRecord]:
+        lo = 0 if start is None else bisect_left(self._keys, self._key(start))
+        hi = len(self._keys) if end is None else bisect_right(self._keys, self._key(end))
+        by_id = self._by_id
+        whole = start is None and end is None
+        # Ключи копируются (их немного — по одному на сегмент), записи — нет
+        for key in self._keys[lo:hi]:
+            segment = self._segments.get(key)
+            if segment is None:
+                continue
+            for record in segment.records if whole else segment.between(start, end):
+                if not segment.dead or by_id.get(record.record_id) is record:
+                    yield record
+
+    def iter_level_history(self, level_id: int) -> Iterator[StorageRecord]:
+        by_id = self._by_id
+        for key in list(self._keys):
+            segment = self._segments.get(key)
+            if segment is None:
+                continue
+            for record in segment.by_level.get(level_id, ()):
+                if not segment.dead or by_id.get(record.record_id) is record:
+                    yield record
+
+    def tail(self, n: int) -> List[StorageRecord]:
+        result: List[StorageRecord] = []
+        for key in reversed(self._keys):
+            if len(result) >= n:
+                break
+            segment = self._segments[key]
+            live = self._live(segment, segment.records)
+            result.extend(reversed(live[-(n - len(result)):]))
+        return result[::-1]
+
+    def latest(self) -> Optional[StorageRecord]:
+        last = self.tail(1)
+        return last[0] if last else None
 
    
     def save_record(self, record: StorageRecord) -> None:
         self.save(record)
 
     def get_history(self, sensor_id: int) -> List[StorageRecord]:
-        return [r for r in self._records if r.sensor_id == sensor_id]
+        result: List[StorageRecord] = []
+        for segment in self._ordered():
+            result.extend(self._live(segment, segment.by_sensor.get(sensor_id, [])))
+        return result
+
+    def get_level_history(self, level_id: int) -> List[StorageRecord]:
+        result: List[StorageRecord] = []
+        for segment in self._ordered():
+            result.extend(self._live(segment, segment.by_level.get(level_id, [])))
+        return result
 
     def clear_old(self, before: datetime) -> None:
-        self._records = [r for r in self._records if r.timestamp >= before]
+        self._notify_cleared(before)
+        while self._horizon_times and self._horizon_times[-1] <= before:
+            self._horizon_times.pop()
+            self._horizon_ids.pop()
+        if not self._horizon_ids or self._horizon_ids[-1] < self._next_id:
+            self._horizon_ids.append(self._next_id)
+            self._horizon_times.append(before)
+
+        cutoff = self._key(before)
+        # Сегменты целиком старше границы отбрасываются без просмотра записей;
+        # ссылки на их записи вычищаются из _by_id позже, порциями
+        dropped = bisect_left(self._keys, cutoff)
+        for key in self._keys[:dropped]:
+            segment = self._segments.pop(key)
+            self._dirty.pop(key, None)
+            self._count -= len(segment.records) - segment.dead
+            self._purge.append(segment.records)
+        del self._keys[:dropped]
+
+        # Граничный сегмент фильтруется по записям
+        segment = self._segments.get(cutoff)
+        if segment is not None:
+            kept = segment.between(before, None)
+            if len(kept) != len(segment.records):
+                removed = self._live(segment, segment.between(None, before))
+                self._count -= len(removed)
+                self._purge.append(removed)
+                segment.rebuild(self._live(segment, kept))
+            if not segment.records:
+                del self._segments[cutoff]
+                self._dirty.pop(cutoff, None)
+                self._keys.remove(cutoff)
 
 
 class InMemoryReportRepository(ReportRepository):
@@ -116,6 +462,9 @@ class InMemoryReportRepository(ReportRepository):
     def save(self, obj: Report) -> None:
         self._storage[obj.report_id] = obj
 
+    def save_many(self, objs: Iterable[Report]) -> None:
+        self._storage.update((obj.report_id, obj) for obj in objs)
+
     def load(self, identifier: int) -> Optional[Report]:
         return self._storage.get(identifier)
 
@@ -125,6 +474,17 @@ class InMemoryReportRepository(ReportRepository):
     def get_all(self) -> List[Report]:
         return list(self._storage.values())
 
+    def iter_all(self) -> Iterator[Report]:
+        return iter(self._storage.values())
+
+    def tail(self, n: int) -> List[Report]:
+        if n <= 0:
+            return []
+        return list(islice(reversed(self._storage.values()), n))[::-1]
+
+    def latest(self) -> Optional[Report]:
+        return next(reversed(self._storage.values()), None)
+
  
     def save_report(self, report: Report) -> None:
         self.save(report)
@@ -153,6 +513,9 @@ class InMemoryForecastRepository(ForecastRepository):
     def save(self, obj: Forecast) -> None:
         self._storage[obj.forecast_id] = obj
 
+    def save_many(self, objs: Iterable[Forecast]) -> None:
+        self._storage.update((obj.forecast_id, obj) for obj in objs)
+
     def load(self, identifier: int) -> Optional[Forecast]:
         return self._storage.get(identifier)
 
@@ -162,6 +525,17 @@ class InMemoryForecastRepository(ForecastRepository):
     def get_all(self) -> List[Forecast]:
         return list(self._storage.values())
 
+    def iter_all(self) -> Iterator[Forecast]:
+        return iter(self._storage.values())
+
+    def tail(self, n: int) -> List[Forecast]:
+        if n <= 0:
+            return []
+        return list(islice(reversed(self._storage.values()), n))[::-1]
+
+    def latest(self) -> Optional[Forecast]:
+        return next(reversed(self._storage.values()), None)
+
     def save_forecast(self, forecast: Forecast) -> None:
         self.save(forecast)
 
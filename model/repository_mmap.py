@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import compress
+from datetime import datetime
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from .encoding import EventCodeTable, RecordColumns, datetime_to_micros, micros_to_datetime
+from .entities import StorageRecord, level_from_event
+from .repository_base import StorageRepository
+
+
+# Заголовок: сигнатура, версия, размер строки, флаги,
+# число строк, первая живая строка, число удалённых строк после неё
+_HEADER = struct.Struct("<8sIIIxxxxQQQ")
+_HEADER_SIZE = 64
+_MAGIC = b"OMISLOG1"
+_VERSION = 1
+# Строка: время (мкс), id сенсора, значение, код события, флаги строки
+_ROW = struct.Struct("<qqdII")
+_ROW_SIZE = _ROW.size
+
+_FLAG_TIME_ORDERED = 1
+_ROW_DELETED = 1
+
+
+class LogColumns(NamedTuple):
+    """Представления колонок журнала без копирования (memoryview с шагом)."""
+
+    timestamps: memoryview   # int64, микросекунды от EPOCH
+    sensor_ids: memoryview   # int64
+    values: memoryview       # float64
+    event_codes: memoryview  # uint32, см. MappedLogStorageRepository.event_name
+    flags: memoryview        # uint32, 1 — запись удалена
+
+
+class MappedLogStorageRepository(StorageRepository):
+    """
+    Хранилище показаний в виде отображённого в память файла, куда строки
+    фиксированной ширины (32 байта) только дописываются.
+
+    record_id — номер строки в журнале. Удаление ставит флаг в строке, очистка
+    старых данных сдвигает начало журнала (место в файле не освобождается).
+    Имена событий хранятся рядом, в файле '<path>.events'.
+
+    columns() отдаёт колонки как memoryview поверх отображения, поэтому
+    анализ может пройти по всей истории, не создавая StorageRecord.
+    Представления поддерживают протокол буфера (годятся, например, для
+    numpy.asarray) и действуют до выхода из блока with.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str, initial_capacity: int = 65536) -> None:
+        self.path = path
+        self._events = EventCodeTable()
+        self._code_levels: List[Optional[int]] = []
+        self._exports = 0
+
+        fresh = not os.path.exists(path) or os.path.getsize(path) < _HEADER_SIZE
+        self._file = open(path, "r+b" if not fresh else "w+b")
+        if fresh:
+            self._file.truncate(_HEADER_SIZE + max(1, initial_capacity) * _ROW_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+        if fresh:
+            self._count = 0
+            self._head = 0
+            self._deleted = 0
+            self._flags = _FLAG_TIME_ORDERED
+            self._write_header()
+        else:
+            magic, version, row_size, flags, count, head, deleted = _HEADER.unpack_from(
+                self._map, 0
+            )
+            if magic != _MAGIC or version != _VERSION or row_size != _ROW_SIZE:
+                self._map.close()
+                self._file.close()
+                raise ValueError(f"Файл {path!r} не является журналом показаний")
+            self._count, self._head, self._deleted, self._flags = count, head, deleted, flags
+
+        self._events_file = open(path + ".events", "a+", encoding="utf-8")
+        self._events_file.seek(0)
+        for line in self._events_file.read().splitlines():
+            self._register_event(line)
+
+    # ------------------------------------------------------------------
+    # Служебное
+    # ------------------------------------------------------------------
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(
+            self._map,
+            0,
+            _MAGIC,
+            _VERSION,
+            _ROW_SIZE,
+            self._flags,
+            self._count,
+            self._head,
+            self._deleted,
+        )
+
+    def _capacity(self) -> int:
+        return (len(self._map) - _HEADER_SIZE) // _ROW_SIZE
+
+    def _grow(self) -> None:
+        if self._exports:
+            raise RuntimeError(
+                "Журнал нельзя расширить, пока открыты представления columns()"
+            )
+        self._map.resize(_HEADER_SIZE + 2 * self._capacity() * _ROW_SIZE)
+
+    def _register_event(self, name: str) -> int:
+        code = self._events.encode(name)
+        if code == len(self._code_levels):
+            self._code_levels.append(level_from_event(name))
+        return code
+
+    def _encode_event(self, name: str) -> int:
+        known = self._events.lookup(name)
+        if known is not None:
+            return known
+        if "\n" in name:
+            raise ValueError("event_type не может содержать перевод строки")
+        self._events_file.write(name + "\n")
+        self._events_file.flush()
+        return self._register_event(name)
+
+    def _offset(self, row: int) -> int:
+        return _HEADER_SIZE + row * _ROW_SIZE
+
+    def _live_row(self, identifier: int) -> bool:
+        if not self._head <= identifier < self._count:
+            return False
+        flags = _ROW.unpack_from(self._map, self._offset(identifier))[4]
+        return not flags & _ROW_DELETED
+
+    def _row(self, row: int) -> StorageRecord:
+        ts, sensor_id, value, code, _flags = _ROW.unpack_from(self._map, self._offset(row))
+        return StorageRecord(
+            timestamp=micros_to_datetime(ts),
+            sensor_id=sensor_id,
+            value=value,
+            event_type=self._events.decode(code),
+            record_id=row,
+        )
+
+    def _rows_where(self, predicate) -> List[StorageRecord]:
+        with self.columns() as cols:
+            head = self._head
+            return [
+                self._row(head + i)
+                for i, flags in enumerate(cols.flags)
+                if not flags & _ROW_DELETED and predicate(cols, i)
+            ]
+
+    # ------------------------------------------------------------------
+    # Доступ без копирования
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def columns(self) -> Iterator[LogColumns]:
+        """Колонки живой части журнала (строки head..count) как memoryview."""
+        raw = memoryview(self._map)[self._offset(self._head):self._offset(self._count)]
+        as_q, as_d, as_i = raw.cast("q"), raw.cast("d"), raw.cast("I")
+        views = LogColumns(
+            timestamps=as_q[0::4],
+            sensor_ids=as_q[1::4],
+            values=as_d[2::4],
+            event_codes=as_i[6::8],
+            flags=as_i[7::8],
+        )
+        self._exports += 1
+        try:
+            yield views
+        finally:
+            self._exports -= 1
+            for view in (*views, as_q, as_d, as_i, raw):
+                view.release()
+
+    def event_name(self, code: int) -> str:
+        return self._events.decode(code)
+
+    def event_level(self, code: int) -> Optional[int]:
+        return self._code_levels[code]
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+        self._events_file.close()
+
+    def __len__(self) -> int:
+        return self._count - self._head - self._deleted
+
+    # ------------------------------------------------------------------
+    # Интерфейс репозитория
+    # ------------------------------------------------------------------
+
+    def save(self, obj: StorageRecord) -> None:
+        code = self._encode_event(obj.event_type)
+        ts = datetime_to_micros(obj.timestamp)
+        if self._count == self._capacity():
+            self._grow()
+        if self._count > self._head and self._flags & _FLAG_TIME_ORDERED:
+            if ts < _ROW.unpack_from(self._map, self._offset(self._count - 1))[0]:
+                self._flags &= ~_FLAG_TIME_ORDERED
+        _ROW.pack_into(self._map, self._offset(self._count), ts, obj.sensor_id, obj.value, code, 0)
+        obj.record_id = self._count
+        self._count += 1
+        self._write_header()
+        if self._listeners:
+            self._notify_added((obj,))
+
+    def save_many(self, objs: Iterable[StorageRecord]) -> None:
+        records = list(objs)
+        if not records:
+            return
+        while self._count + len(records) > self._capacity():
+            self._grow()
+        last = (
+            _ROW.unpack_from(self._map, self._offset(self._count - 1))[0]
+            if self._count > self._head
+            else None
+        )
+        offset = self._offset(self._count)
+        pack_into = _ROW.pack_into
+        for record in records:
+            ts = datetime_to_micros(record.timestamp)
+            if last is not None and ts < last:
+                self._flags &= ~_FLAG_TIME_ORDERED
+            last = ts
+            code = self._encode_event(record.event_type)
+            pack_into(self._map, offset, ts, record.sensor_id, record.value, code, 0)
+            record.record_id = self._count
+            self._count += 1
+            offset += _ROW_SIZE
+        # Заголовок обновляется один раз на пакет
+        self._write_header()
+        if self._listeners:
+            self._notify_added(records)
+
+    def load(self, identifier: int) -> Optional[StorageRecord]:
+        if self._live_row(identifier):
+            return self._row(identifier)
+        return None
+
+    def delete(self, identifier: int) -> None:
+        if self._live_row(identifier):
+            if self._listeners:
+                self._notify_removed((self._row(identifier),))
+            offset = self._offset(identifier) + _ROW_SIZE - 4
+            struct.pack_into("<I", self._map, offset, _ROW_DELETED)
+            self._deleted += 1
+            self._write_header()
+
+    def get_all(self) -> List[StorageRecord]:
+        return self._rows_where(lambda cols, i: True)
+
+    def export_columns(self) -> RecordColumns:
+        with self.columns() as cols:
+            exported = []
+            for typecode, view in (
+                ("q", cols.timestamps),
+                ("q", cols.sensor_ids),
+                ("d", cols.values),
+                ("I", cols.event_codes),
+            ):
+                column = array(typecode)
+                # tobytes() собирает строку с шагом в непрерывный буфер на уровне C
+                column.frombytes(view.tobytes())
+                exported.append(column)
+            record_ids = array("q", range(self._head, self._count))
+            if self._deleted:
+                alive = [not flags & _ROW_DELETED for flags in cols.flags]
+                record_ids = array("q", compress(record_ids, alive))
+                exported = [array(c.typecode, compress(c, alive)) for c in exported]
+        return RecordColumns(record_ids, *exported, self._events.names())
+
+    def save_record(self, record: StorageRecord) -> None:
+        self.save(record)
+
+    def get_history(self, sensor_id: int) -> List[StorageRecord]:
+        return self._rows_where(lambda cols, i: cols.sensor_ids[i] == sensor_id)
+
+    def get_level_history(self, level_id: int) -> List[StorageRecord]:
+        codes = {c for c, lvl in enumerate(self._code_levels) if lvl == level_id}
+        return self._rows_where(lambda cols, i: cols.event_codes[i] in codes)
+
+    def _iter_rows(self, first: int, last: Optional[int] = None) -> Iterator[StorageRecord]:
+        # Строки читаются по одной, без удержания представлений columns(),
+        # чтобы запись во время обхода могла расширять файл
+        row = first
+        while row < (self._count if last is None else last):
+            if self._live_row(row):
+                yield self._row(row)
+            row += 1
+
+    def iter_all(self) -> Iterator[StorageRecord]:
+        return self._iter_rows(self._head)
+
+    def iter_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[StorageRecord]:
+        if not self._flags & _FLAG_TIME_ORDERED:
+            return super().iter_range(start, end)
+        with self.columns() as cols:
+            first = 0 if start is None else bisect_left(cols.timestamps, datetime_to_micros(start))
+            last = (
+                len(cols.timestamps)
+                if end is None
+                else bisect_left(cols.timestamps, datetime_to_micros(end))
+            )
+        return self._iter_rows(self._head + first, self._head + last)
+
+    def iter_level_history(self, level_id: int) -> Iterator[StorageRecord]:
+        codes = {c for c, lvl in enumerate(self._code_levels) if lvl == level_id}
+        row = self._head
+        while row < self._count:
+            _ts, _sensor, _value, code, flags = _ROW.unpack_from(self._map, self._offset(row))
+            if code in codes and not flags & _ROW_DELETED:
+                yield self._row(row)
+            row += 1
+
+    def tail(self, n: int) -> List[StorageRecord]:
+        result: List[StorageRecord] = []
+        row = self._count - 1
+        while row >= self._head and len(result) < n:
+            if self._live_row(row):
+                result.append(self._row(row))
+            row -= 1
+        return result[::-1]
+
+    def latest(self) -> Optional[StorageRecord]:
+        last = self.tail(1)
+        return last[0] if last else None
+
+    def clear_old(self, before: datetime) -> None:
+        self._notify_cleared(before)
+        cutoff = datetime_to_micros(before)
+        with self.columns() as cols:
+            if self._flags & _FLAG_TIME_ORDERED:
+                # Журнал упорядочен по времени: достаточно сдвинуть начало
+                skipped = bisect_left(cols.timestamps, cutoff)
+                self._deleted -= sum(1 for f in cols.flags[:skipped] if f & _ROW_DELETED)
+                self._head += skipped
+            else:
+                for i, ts in enumerate(cols.timestamps):
+                    if ts < cutoff and not cols.flags[i] & _ROW_DELETED:
+                        cols.flags[i] = _ROW_DELETED
+                        self._deleted += 1
+        self._write_header()
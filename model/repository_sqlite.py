@@ -0,0 +1,473 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .encoding import datetime_to_micros, micros_to_datetime
+from .entities import Sensor, Level, StorageRecord, Report, Forecast
+from .repository_base import (
+    SensorRepository,
+    LevelRepository,
+    StorageRepository,
+    ReportRepository,
+    ForecastRepository,
+    StatsState,
+)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensors (
+    sensor_id      INTEGER PRIMARY KEY,
+    type           TEXT    NOT NULL,
+    unit           TEXT    NOT NULL,
+    poll_frequency INTEGER NOT NULL,
+    value          REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS levels (
+    level_id    INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    difficulty  REAL NOT NULL,
+    parameters  TEXT NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS readings (
+    record_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts         INTEGER NOT NULL,
+    sensor_id  INTEGER NOT NULL,
+    value      REAL    NOT NULL,
+    event_type TEXT    NOT NULL,
+    level_id   INTEGER
+);
+CREATE INDEX IF NOT EXISTS readings_ts ON readings (ts);
+CREATE INDEX IF NOT EXISTS readings_sensor ON readings (sensor_id, ts);
+CREATE INDEX IF NOT EXISTS readings_level ON readings (level_id, ts)
+    WHERE level_id IS NOT NULL;
+CREATE TABLE IF NOT EXISTS reports (
+    report_id  INTEGER PRIMARY KEY,
+    created_at INTEGER NOT NULL,
+    author     TEXT    NOT NULL,
+    summary    TEXT    NOT NULL,
+    content    TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_created ON reports (created_at);
+CREATE INDEX IF NOT EXISTS reports_author ON reports (author);
+CREATE TABLE IF NOT EXISTS forecasts (
+    forecast_id       INTEGER PRIMARY KEY,
+    level_name        TEXT    NOT NULL,
+    passability_score REAL    NOT NULL,
+    recommendations   TEXT    NOT NULL,
+    created_at        INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS forecasts_created ON forecasts (created_at);
+"""
+
+
+class SqliteDatabase:
+    """
+    Общее подключение SQLite для всех репозиториев.
+
+    Журнал WAL и synchronous=NORMAL: запись не блокирует чтение, fsync
+    выполняется только при контрольных точках. Запросы — постоянные строки
+    с параметрами, поэтому sqlite3 берёт подготовленные выражения из своего
+    кэша. Запись идёт в явных транзакциях; вложенные transaction() сливаются
+    в одну внешнюю.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.path = path
+        self._connection = sqlite3.connect(
+            path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute("BEGIN")
+            self._depth += 1
+            try:
+                yield self._connection
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("ROLLBACK")
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("COMMIT")
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def iterate(
+        self,
+        sql: str,
+        params: Sequence[Any] = (),
+        batch: int = 1024,
+    ) -> Iterator[Tuple]:
+        """Строки результата порциями по batch, без загрузки всего ответа."""
+        with self._lock:
+            cursor = self._connection.execute(sql, params)
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(batch)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class _SqliteRepository:
+    """Общая часть таблиц с целочисленным ключом: запись, чтение, удаление."""
+
+    _TABLE = ""
+    _KEY = ""
+    _COLUMNS = ""
+    # Порядок хранения (прямой и обратный) и колонка времени для iter_range
+    _ORDER = ""
+    _ORDER_DESC = ""
+    _TIME_COLUMN = ""
+
+    persistent = True
+
+    def __init__(self, database: SqliteDatabase) -> None:
+        self._db = database
+        placeholders = ", ".join("?" * len(self._COLUMNS.split(",")))
+        self._insert = (
+            f"INSERT OR REPLACE INTO {self._TABLE} ({self._COLUMNS}) VALUES ({placeholders})"
+        )
+
+    @staticmethod
+    def _from_row(row: Tuple) -> Any:
+        raise NotImplementedError
+
+    @staticmethod
+    def _params(obj: Any) -> Tuple:
+        raise NotImplementedError
+
+    def _sql(self, where: str = "", order: str = "") -> str:
+        return (
+            f"SELECT {self._COLUMNS} FROM {self._TABLE} {where} "
+            f"ORDER BY {order or self._ORDER or self._KEY}"
+        )
+
+    def _select(self, where: str = "", params: Sequence[Any] = ()) -> List[Any]:
+        return [self._from_row(row) for row in self._db.query(self._sql(where), params)]
+
+    def _iter_select(self, where: str = "", params: Sequence[Any] = ()) -> Iterator[Any]:
+        for row in self._db.iterate(self._sql(where), params):
+            yield self._from_row(row)
+
+    def save(self, obj: Any) -> None:
+        with self._db.transaction() as conn:
+            conn.execute(self._insert, self._params(obj))
+
+    def save_many(self, objs: Iterable[Any]) -> None:
+        with self._db.transaction() as conn:
+            conn.executemany(self._insert, [self._params(obj) for obj in objs])
+
+    def load(self, identifier: int) -> Optional[Any]:
+        found = self._select(f"WHERE {self._KEY} = ?", (identifier,))
+        return found[0] if found else None
+
+    def delete(self, identifier: int) -> None:
+        with self._db.transaction() as conn:
+            conn.execute(f"DELETE FROM {self._TABLE} WHERE {self._KEY} = ?", (identifier,))
+
+    def get_all(self) -> List[Any]:
+        return self._select()
+
+    def iter_all(self) -> Iterator[Any]:
+        return self._iter_select()
+
+    def iter_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[Any]:
+        if not self._TIME_COLUMN:
+            raise NotImplementedError(f"У таблицы {self._TABLE} нет колонки времени")
+        lo = datetime_to_micros(start) if start is not None else -(2 ** 63)
+        hi = datetime_to_micros(end) if end is not None else 2 ** 63 - 1
+        return self._iter_select(
+            f"WHERE {self._TIME_COLUMN} >= ? AND {self._TIME_COLUMN} < ?", (lo, hi)
+        )
+
+    def tail(self, n: int) -> List[Any]:
+        if n <= 0:
+            return []
+        rows = self._db.query(
+            self._sql(order=self._ORDER_DESC or f"{self._KEY} DESC") + " LIMIT ?", (n,)
+        )
+        return [self._from_row(row) for row in reversed(rows)]
+
+    def latest(self) -> Optional[Any]:
+        last = self.tail(1)
+        return last[0] if last else None
+
+    def _delete_created_before(self, before: datetime) -> None:
+        with self._db.transaction() as conn:
+            conn.execute(
+                f"DELETE FROM {self._TABLE} WHERE created_at < ?",
+                (datetime_to_micros(before),),
+            )
+
+
+class SqliteSensorRepository(_SqliteRepository, SensorRepository):
+
+    _TABLE = "sensors"
+    _KEY = "sensor_id"
+    _COLUMNS = "sensor_id, type, unit, poll_frequency, value"
+
+    @staticmethod
+    def _from_row(row: Tuple) -> Sensor:
+        return Sensor(*row)
+
+    @staticmethod
+    def _params(obj: Sensor) -> Tuple:
+        return (obj.sensor_id, obj.type, obj.unit, obj.poll_frequency, obj.value)
+
+
+    def add_sensor(self, sensor: Sensor) -> None:
+        self.save(sensor)
+
+    def get_sensor(self, sensor_id: int) -> Optional[Sensor]:
+        return self.load(sensor_id)
+
+    def update_sensor(self, sensor: Sensor) -> None:
+        self.save(sensor)
+
+
+class SqliteLevelRepository(_SqliteRepository, LevelRepository):
+
+    _TABLE = "levels"
+    _KEY = "level_id"
+    _COLUMNS = "level_id, name, difficulty, parameters, description"
+
+    @staticmethod
+    def _from_row(row: Tuple) -> Level:
+        level_id, name, difficulty, parameters, description = row
+        return Level(level_id, name, difficulty, json.loads(parameters), description)
+
+    @staticmethod
+    def _params(obj: Level) -> Tuple:
+        return (
+            obj.level_id,
+            obj.name,
+            obj.difficulty,
+            json.dumps(obj.parameters, ensure_ascii=False),
+            obj.description,
+        )
+
+
+    def add_level(self, level: Level) -> None:
+        self.save(level)
+
+    def get_level(self, level_id: int) -> Optional[Level]:
+        return self.load(level_id)
+
+    def update_level(self, level: Level) -> None:
+        self.save(level)
+
+
+class SqliteStorageRepository(_SqliteRepository, StorageRepository):
+
+    _TABLE = "readings"
+    _KEY = "record_id"
+    _COLUMNS = "record_id, ts, sensor_id, value, event_type, level_id"
+    _ORDER = "ts, record_id"
+    _ORDER_DESC = "ts DESC, record_id DESC"
+    _TIME_COLUMN = "ts"
+
+    @staticmethod
+    def _from_row(row: Tuple) -> StorageRecord:
+        record_id, ts, sensor_id, value, event_type, _level_id = row
+        return StorageRecord(
+            timestamp=micros_to_datetime(ts),
+            sensor_id=sensor_id,
+            value=value,
+            # sqlite3 создаёт строку на каждую строку выборки
+            event_type=sys.intern(event_type),
+            record_id=record_id,
+        )
+
+    @staticmethod
+    def _params(obj: StorageRecord) -> Tuple:
+        return (
+            obj.record_id,
+            datetime_to_micros(obj.timestamp),
+            obj.sensor_id,
+            obj.value,
+            obj.event_type,
+            obj.level_id,
+        )
+
+    def _replaced(self, records: Iterable[StorageRecord]) -> List[StorageRecord]:
+        """Уже сохранённые записи с теми же record_id (для подписчиков)."""
+        replaced = (self.load(r.record_id) for r in records if r.record_id is not None)
+        return [r for r in replaced if r is not None]
+
+    def save(self, obj: StorageRecord) -> None:
+        with self._db.transaction() as conn:
+            if self._listeners:
+                replaced = self._replaced((obj,))
+                if replaced:
+                    self._notify_removed(replaced)
+            cursor = conn.execute(self._insert, self._params(obj))
+            obj.record_id = cursor.lastrowid
+        if self._listeners:
+            self._notify_added((obj,))
+
+    def save_many(self, objs: Iterable[StorageRecord]) -> None:
+        """Пакетная запись одной транзакцией."""
+        records = list(objs)
+        with self._db.transaction() as conn:
+            # Записи без id вставляются одним executemany; id назначаются
+            # подряд, начиная с текущего значения счётчика AUTOINCREMENT
+            fresh = [r for r in records if r.record_id is None]
+            known = [r for r in records if r.record_id is not None]
+            if known and self._listeners:
+                replaced = self._replaced(known)
+                if replaced:
+                    self._notify_removed(replaced)
+            if known:
+                conn.executemany(self._insert, [self._params(r) for r in known])
+            if fresh:
+                conn.executemany(self._insert, [self._params(r) for r in fresh])
+                last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                for offset, record in enumerate(fresh):
+                    record.record_id = last - len(fresh) + 1 + offset
+        if records and self._listeners:
+            self._notify_added(records)
+
+    def delete(self, identifier: int) -> None:
+        if self._listeners:
+            record = self.load(identifier)
+            if record is not None:
+                self._notify_removed((record,))
+        super().delete(identifier)
+
+    def save_record(self, record: StorageRecord) -> None:
+        self.save(record)
+
+    def get_history(self, sensor_id: int) -> List[StorageRecord]:
+        return self._select("WHERE sensor_id = ?", (sensor_id,))
+
+    def get_level_history(self, level_id: int) -> List[StorageRecord]:
+        return self._select("WHERE level_id = ?", (level_id,))
+
+    def iter_level_history(self, level_id: int) -> Iterator[StorageRecord]:
+        return self._iter_select("WHERE level_id = ?", (level_id,))
+
+    def level_sensor_aggregates(self) -> Dict[Tuple[Optional[int], int], StatsState]:
+        # Два прохода (среднее, затем сумма квадратов отклонений) — без потери
+        # точности формулы sum(x^2) - sum(x)^2 / n
+        rows = self._db.query(
+            "SELECT r.level_id, r.sensor_id, a.n, a.mean, "
+            "SUM((r.value - a.mean) * (r.value - a.mean)), a.lo, a.hi "
+            "FROM readings r JOIN ("
+            "  SELECT level_id, sensor_id, COUNT(*) AS n, AVG(value) AS mean, "
+            "  MIN(value) AS lo, MAX(value) AS hi FROM readings GROUP BY level_id, sensor_id"
+            ") a ON r.sensor_id = a.sensor_id AND r.level_id IS a.level_id "
+            "GROUP BY r.level_id, r.sensor_id"
+        )
+        return {
+            (level_id, sensor_id): (count, mean, m2, lo, hi)
+            for level_id, sensor_id, count, mean, m2, lo, hi in rows
+        }
+
+    def clear_old(self, before: datetime) -> None:
+        self._notify_cleared(before)
+        with self._db.transaction() as conn:
+            conn.execute("DELETE FROM readings WHERE ts < ?", (datetime_to_micros(before),))
+
+
+class SqliteReportRepository(_SqliteRepository, ReportRepository):
+
+    _TABLE = "reports"
+    _KEY = "report_id"
+    _TIME_COLUMN = "created_at"
+    _COLUMNS = "report_id, created_at, author, summary, content"
+
+    @staticmethod
+    def _from_row(row: Tuple) -> Report:
+        report_id, created_at, author, summary, content = row
+        return Report(report_id, micros_to_datetime(created_at), author, summary, content)
+
+    @staticmethod
+    def _params(obj: Report) -> Tuple:
+        return (
+            obj.report_id,
+            datetime_to_micros(obj.created_at),
+            obj.author,
+            obj.summary,
+            obj.content,
+        )
+
+
+    def save_report(self, report: Report) -> None:
+        self.save(report)
+
+    def get_report(self, report_id: int) -> Optional[Report]:
+        return self.load(report_id)
+
+    def clear_old(self, before: datetime) -> None:
+        self._delete_created_before(before)
+
+    def find_by_author(self, author: str) -> List[Report]:
+        return self._select("WHERE author = ?", (author,))
+
+
+class SqliteForecastRepository(_SqliteRepository, ForecastRepository):
+
+    _TABLE = "forecasts"
+    _KEY = "forecast_id"
+    _TIME_COLUMN = "created_at"
+    _COLUMNS = "forecast_id, level_name, passability_score, recommendations, created_at"
+
+    @staticmethod
+    def _from_row(row: Tuple) -> Forecast:
+        forecast_id, level_name, score, recommendations, created_at = row
+        return Forecast(
+            forecast_id, level_name, score, recommendations, micros_to_datetime(created_at)
+        )
+
+    @staticmethod
+    def _params(obj: Forecast) -> Tuple:
+        return (
+            obj.forecast_id,
+            obj.level_name,
+            obj.passability_score,
+            obj.recommendations,
+            datetime_to_micros(obj.created_at),
+        )
+
+    def save_forecast(self, forecast: Forecast) -> None:
+        self.save(forecast)
+
+    def get_forecast(self, forecast_id: int) -> Optional[Forecast]:
+        return self.load(forecast_id)
+
+    def clear_old(self, before: datetime) -> None:
+        self._delete_created_before(before)
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .encoding import datetime_to_micros, micros_to_datetime
+from .entities import StorageRecord, level_from_event
+from .repository_base import StorageListener, StorageRepository
+
+
+# Разрешения уровней агрегации по умолчанию: секунда, минута, час
+DEFAULT_RESOLUTIONS = (timedelta(seconds=1), timedelta(minutes=1), timedelta(hours=1))
+
+# Ключ ряда: ("sensor", sensor_id) или ("level", level_id)
+RollupKey = Tuple[str, int]
+
+_MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass
+class Rollup:
+    """Агрегат показаний одного ряда за интервал [start, start + resolution)."""
+
+    start: datetime
+    resolution: timedelta
+    count: int
+    total: float
+    minimum: float
+    maximum: float
+    last: float
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class _Aggregate:
+    __slots__ = ("count", "total", "minimum", "maximum", "last", "last_ts")
+
+    def __init__(self, ts: int, value: float) -> None:
+        self.count = 1
+        self.total = value
+        self.minimum = value
+        self.maximum = value
+        self.last = value
+        self.last_ts = ts
+
+    def add(self, ts: int, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        if ts >= self.last_ts:
+            self.last = value
+            self.last_ts = ts
+
+    def merge(self, other: "_Aggregate") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        if other.last_ts >= self.last_ts:
+            self.last = other.last
+            self.last_ts = other.last_ts
+
+    def copy(self) -> "_Aggregate":
+        clone = _Aggregate(self.last_ts, self.last)
+        clone.count, clone.total = self.count, self.total
+        clone.minimum, clone.maximum = self.minimum, self.maximum
+        return clone
+
+
+class _Tier:
+    """Один уровень агрегации: ряд -> номер интервала -> агрегат."""
+
+    def __init__(self, resolution: timedelta) -> None:
+        self.resolution = resolution
+        self.span = resolution // _MICROSECOND
+        if self.span <= 0:
+            raise ValueError("Разрешение агрегации должно быть положительным")
+        self.buckets: Dict[RollupKey, Dict[int, _Aggregate]] = {}
+        # Номера интервалов каждого ряда по возрастанию (для выборки по времени)
+        self.order: Dict[RollupKey, List[int]] = {}
+        # Интервалы, где удаление затронуло min/max/last: пересчитываются из
+        # сырых данных при следующем запросе
+        self.dirty: Set[int] = set()
+
+    def add(self, key: RollupKey, ts: int, value: float) -> None:
+        bucket = ts // self.span
+        series = self.buckets.get(key)
+        if series is None:
+            series = self.buckets[key] = {}
+            self.order[key] = []
+        aggregate = series.get(bucket)
+        if aggregate is None:
+            series[bucket] = _Aggregate(ts, value)
+            order = self.order[key]
+            if not order or order[-1] < bucket:
+                order.append(bucket)
+            else:
+                insort(order, bucket)
+        else:
+            aggregate.add(ts, value)
+
+    def merge_many(self, partial: Dict[Tuple[RollupKey, int], _Aggregate], span: int) -> None:
+        """Вливает агрегаты пакета, посчитанные по более мелким интервалам span."""
+        for (key, small), aggregate in partial.items():
+            bucket = small * span // self.span
+            series = self.buckets.get(key)
+            current = None if series is None else series.get(bucket)
+            if current is None:
+                self.add(key, aggregate.last_ts, aggregate.last)
+                current = series[bucket] if series is not None else self.buckets[key][bucket]
+                current.count, current.total = aggregate.count, aggregate.total
+                current.minimum, current.maximum = aggregate.minimum, aggregate.maximum
+            else:
+                current.merge(aggregate)
+
+    def remove(self, key: RollupKey, ts: int, value: float, emptied: Set[RollupKey]) -> None:
+        bucket = ts // self.span
+        aggregate = self.buckets.get(key, {}).get(bucket)
+        if aggregate is None:
+            return
+        aggregate.count -= 1
+        aggregate.total -= value
+        if not aggregate.count:
+            del self.buckets[key][bucket]
+            emptied.add(key)
+        elif value <= aggregate.minimum or value >= aggregate.maximum or ts >= aggregate.last_ts:
+            self.dirty.add(bucket)
+
+    def drop_emptied(self, keys: Iterable[RollupKey]) -> None:
+        for key in keys:
+            series = self.buckets[key]
+            if series:
+                self.order[key] = [b for b in self.order[key] if b in series]
+            else:
+                del self.buckets[key]
+                del self.order[key]
+
+    def select(
+        self,
+        key: RollupKey,
+        first: Optional[int],
+        last: Optional[int],
+    ) -> Iterator[Tuple[int, _Aggregate]]:
+        """Интервалы ряда с first <= номер < last по возрастанию."""
+        order = self.order.get(key)
+        if not order:
+            return
+        series = self.buckets[key]
+        lo = 0 if first is None else bisect_left(order, first)
+        hi = len(order) if last is None else bisect_left(order, last)
+        for bucket in order[lo:hi]:
+            yield bucket, series[bucket]
+
+
+class RollupStore(StorageListener):
+    """
+    Агрегаты показаний (count/sum/min/max/last) по сенсорам и уровням
+    в нескольких разрешениях, которые обновляются при каждой записи.
+
+    Запрос выбирает самый грубый уровень, который точно покрывает
+    интервал и разрешение, поэтому длинные выборки не читают сырые
+    показания. Если ни один уровень не подходит (например, граница
+    интервала не кратна секунде), агрегаты считаются по сырым данным.
+    """
+
+    def __init__(
+        self,
+        storage: StorageRepository,
+        resolutions: Sequence[timedelta] = DEFAULT_RESOLUTIONS,
+    ) -> None:
+        self._storage = storage
+        self._tiers = [_Tier(r) for r in sorted(resolutions)]
+        if not self._tiers:
+            raise ValueError("Нужен хотя бы один уровень агрегации")
+        if any(tier.span % self._tiers[0].span for tier in self._tiers):
+            raise ValueError("Разрешения агрегации должны быть кратны самому мелкому")
+        self._levels: Dict[str, Optional[int]] = {}
+        for chunk in storage.iter_chunks():
+            self.records_added(chunk)
+        storage.subscribe(self)
+
+    @property
+    def resolutions(self) -> List[timedelta]:
+        return [tier.resolution for tier in self._tiers]
+
+    def _keys(self, record: StorageRecord) -> Tuple[RollupKey, ...]:
+        event_type = record.event_type
+        if event_type not in self._levels:
+            self._levels[event_type] = level_from_event(event_type)
+        level_id = self._levels[event_type]
+        if level_id is None:
+            return (("sensor", record.sensor_id),)
+        return ("sensor", record.sensor_id), ("level", level_id)
+
+    # ------------------------------------------------------------------
+    # Подписка на хранилище
+    # ------------------------------------------------------------------
+
+    def records_added(self, records: Sequence[StorageRecord]) -> None:
+        # Пакет сначала сворачивается по самым мелким интервалам, а более
+        # грубые уровни получают уже по одному агрегату на интервал
+        span = self._tiers[0].span
+        partial: Dict[Tuple[RollupKey, int], _Aggregate] = {}
+        for record in records:
+            ts = datetime_to_micros(record.timestamp)
+            value = record.value
+            small = ts // span
+            for key in self._keys(record):
+                aggregate = partial.get((key, small))
+                if aggregate is None:
+                    partial[key, small] = _Aggregate(ts, value)
+                else:
+                    aggregate.add(ts, value)
+        for tier in self._tiers:
+            tier.merge_many(partial, span)
+
+    def records_removed(self, records: Sequence[StorageRecord]) -> None:
+        for tier in self._tiers:
+            emptied: Set[RollupKey] = set()
+            for record in records:
+                ts = datetime_to_micros(record.timestamp)
+                for key in self._keys(record):
+                    tier.remove(key, ts, record.value, emptied)
+            tier.drop_emptied(emptied)
+
+    # ------------------------------------------------------------------
+    # Запросы
+    # ------------------------------------------------------------------
+
+    def _tier_for(
+        self,
+        start: Optional[int],
+        end: Optional[int],
+        resolution: int,
+    ) -> Optional[_Tier]:
+        for tier in reversed(self._tiers):
+            span = tier.span
+            if (
+                resolution % span == 0
+                and (start is None or start % span == 0)
+                and (end is None or end % span == 0)
+            ):
+                return tier
+        return None
+
+    def _refresh(self, tier: _Tier, first: Optional[int], last: Optional[int]) -> None:
+        stale = [
+            b for b in tier.dirty
+            if (first is None or b >= first) and (last is None or b < last)
+        ]
+        for bucket in sorted(stale):
+            tier.dirty.discard(bucket)
+            for key, series in list(tier.buckets.items()):
+                if series.pop(bucket, None) is not None:
+                    tier.order[key].remove(bucket)
+            records = self._storage.iter_range(
+                micros_to_datetime(bucket * tier.span),
+                micros_to_datetime((bucket + 1) * tier.span),
+            )
+            for record in records:
+                ts = datetime_to_micros(record.timestamp)
+                for key in self._keys(record):
+                    tier.add(key, ts, record.value)
+            tier.drop_emptied([k for k, series in tier.buckets.items() if not series])
+
+    def _raw(
+        self,
+        key: RollupKey,
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ) -> Iterator[Tuple[int, _Aggregate]]:
+        for record in self._storage.iter_range(start, end):
+            if key in self._keys(record):
+                ts = datetime_to_micros(record.timestamp)
+                yield ts, _Aggregate(ts, record.value)
+
+    def query(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        resolution: timedelta,
+        sensor_id: Optional[int] = None,
+        level_id: Optional[int] = None,
+    ) -> List[Rollup]:
+        """
+        Агрегаты ряда (сенсора или уровня) на интервале [start, end),
+        разбитом на шаги resolution от EPOCH. Пустые шаги не возвращаются.
+        """
+        if (sensor_id is None) == (level_id is None):
+            raise ValueError("Нужно указать ровно один из sensor_id и level_id")
+        key: RollupKey = ("sensor", sensor_id) if sensor_id is not None else ("level", level_id)
+        step = resolution // _MICROSECOND
+        if step <= 0:
+            raise ValueError("Разрешение запроса должно быть положительным")
+        lo = None if start is None else datetime_to_micros(start)
+        hi = None if end is None else datetime_to_micros(end)
+
+        tier = self._tier_for(lo, hi, step)
+        if tier is None:
+            points: Iterable[Tuple[int, _Aggregate]] = self._raw(key, start, end)
+        else:
+            first = None if lo is None else lo // tier.span
+            last = None if hi is None else hi // tier.span
+            if tier.dirty:
+                self._refresh(tier, first, last)
+            points = (
+                (bucket * tier.span, aggregate)
+                for bucket, aggregate in tier.select(key, first, last)
+            )
+
+        merged: Dict[int, _Aggregate] = {}
+        for ts, aggregate in points:
+            slot = ts // step
+            current = merged.get(slot)
+            if current is None:
+                merged[slot] = aggregate.copy()
+            else:
+                current.merge(aggregate)
+        return [
+            Rollup(
+                start=micros_to_datetime(slot * step),
+                resolution=resolution,
+                count=a.count,
+                total=a.total,
+                minimum=a.minimum,
+                maximum=a.maximum,
+                last=a.last,
+            )
+            for slot, a in sorted(merged.items())
+        ]
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from .entities import StorageRecord, level_from_event
+from .repository_base import StatsState, StorageListener, StorageRepository
+
+
+class RunningStats:
+    """
+    Счётчик, среднее и дисперсия по алгоритму Уэлфорда плюс min/max.
+
+    Поддерживает обратное обновление (remove) и слияние (merge, формула
+    Чана), поэтому не требует хранить сами значения.
+    """
+
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        # Сумма квадратов отклонений от среднего
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    @classmethod
+    def of(cls, values: Iterable[float]) -> "RunningStats":
+        stats = cls()
+        for value in values:
+            stats.add(value)
+        return stats
+
+    @classmethod
+    def from_state(cls, state: Tuple[int, float, float, float, float]) -> "RunningStats":
+        """Обратное к state: восстанавливает счётчик из кортежа."""
+        stats = cls()
+        stats.count, stats.mean, stats.m2, stats.minimum, stats.maximum = state
+        return stats
+
+    @property
+    def state(self) -> Tuple[int, float, float, float, float]:
+        """Компактное представление для передачи между процессами."""
+        return self.count, self.mean, self.m2, self.minimum, self.maximum
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    def remove(self, value: float) -> bool:
+        """
+        Исключает значение. Возвращает False, если оно было минимумом или
+        максимумом: тогда min/max нужно пересчитать по исходным данным.
+        """
+        if self.count <= 1:
+            self.__init__()
+            return True
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = (old_mean * (self.count + 1) - value) / self.count
+        self.m2 = max(0.0, self.m2 - (value - self.mean) * (value - old_mean))
+        return self.minimum < value < self.maximum
+
+    def merge(self, other: "RunningStats") -> None:
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self) -> float:
+        """Выборочная дисперсия (как statistics.variance); 0 при count < 2."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def as_dict(self) -> Dict[str, float]:
+        empty = not self.count
+        return {
+            "count": float(self.count),
+            "mean": self.mean,
+            "stddev": self.stddev,
+            "min": 0.0 if empty else self.minimum,
+            "max": 0.0 if empty else self.maximum,
+        }
+
+
+class RunningStatsIndex(StorageListener):
+    """
+    RunningStats по каждому сенсору и уровню, обновляемые при записи в хранилище.
+
+    При создании один раз просматривает уже сохранённые показания (порциями
+    или готовыми агрегатами бэкенда), дальше
+    получает только новые и удалённые. Если удаление затронуло min/max,
+    ряд пересчитывается по истории при следующем обращении.
+    """
+
+    def __init__(self, storage: StorageRepository) -> None:
+        self._storage = storage
+        self._sensors: Dict[int, RunningStats] = {}
+        self._levels: Dict[int, RunningStats] = {}
+        # Уровень -> сенсор -> статистика; из них собирается статистика по типам сенсоров
+        self._level_sensors: Dict[int, Dict[int, RunningStats]] = {}
+        self._event_levels: Dict[str, Optional[int]] = {}
+        self._stale: Set[Tuple[str, int]] = set()
+        self._stale_pairs: Set[Tuple[int, int]] = set()
+        aggregates = storage.level_sensor_aggregates()
+        if aggregates is None:
+            for chunk in storage.iter_chunks():
+                self.records_added(chunk)
+        else:
+            self._load(aggregates)
+        storage.subscribe(self)
+
+    def _load(self, aggregates: Dict[Tuple[Optional[int], int], StatsState]) -> None:
+        for (level_id, sensor_id), state in aggregates.items():
+            self._sensors.setdefault(sensor_id, RunningStats()).merge(RunningStats.from_state(state))
+            if level_id is None:
+                continue
+            self._levels.setdefault(level_id, RunningStats()).merge(RunningStats.from_state(state))
+            self._level_sensors.setdefault(level_id, {})[sensor_id] = RunningStats.from_state(state)
+
+    def _level_of(self, record: StorageRecord) -> Optional[int]:
+        event_type = record.event_type
+        if event_type not in self._event_levels:
+            self._event_levels[event_type] = level_from_event(event_type)
+        return self._event_levels[event_type]
+
+    def records_added(self, records: Sequence[StorageRecord]) -> None:
+        sensors, levels = self._sensors, self._levels
+        for record in records:
+            stats = sensors.get(record.sensor_id)
+            if stats is None:
+                stats = sensors[record.sensor_id] = RunningStats()
+            stats.add(record.value)
+            level_id = self._level_of(record)
+            if level_id is not None:
+                stats = levels.get(level_id)
+                if stats is None:
+                    stats = levels[level_id] = RunningStats()
+                stats.add(record.value)
+                by_sensor = self._level_sensors.setdefault(level_id, {})
+                stats = by_sensor.get(record.sensor_id)
+                if stats is None:
+                    stats = by_sensor[record.sensor_id] = RunningStats()
+                stats.add(record.value)
+
+    def records_removed(self, records: Sequence[StorageRecord]) -> None:
+        for record in records:
+            stats = self._sensors.get(record.sensor_id)
+            if stats is not None and not stats.remove(record.value):
+                self._stale.add(("sensor", record.sensor_id))
+            level_id = self._level_of(record)
+            if level_id is None:
+                continue
+            stats = self._levels.get(level_id)
+            if stats is not None and not stats.remove(record.value):
+                self._stale.add(("level", level_id))
+            stats = self._level_sensors.get(level_id, {}).get(record.sensor_id)
+            if stats is not None and not stats.remove(record.value):
+                self._stale_pairs.add((level_id, record.sensor_id))
+
+    def sensor(self, sensor_id: int) -> RunningStats:
+        if ("sensor", sensor_id) in self._stale:
+            self._stale.discard(("sensor", sensor_id))
+            history = self._storage.get_history(sensor_id)
+            self._sensors[sensor_id] = RunningStats.of(r.value for r in history)
+        return self._sensors.get(sensor_id) or RunningStats()
+
+    def level(self, level_id: int) -> RunningStats:
+        if ("level", level_id) in self._stale:
+            self._stale.discard(("level", level_id))
+            history = self._storage.iter_level_history(level_id)
+            self._levels[level_id] = RunningStats.of(r.value for r in history)
+        return self._levels.get(level_id) or RunningStats()
+
+    def level_sensors(self, level_id: int) -> Dict[int, RunningStats]:
+        """Статистика уровня по каждому сенсору, снимавшему его показания."""
+        by_sensor = self._level_sensors.get(level_id, {})
+        stale = [sensor_id for sensor_id in by_sensor if (level_id, sensor_id) in self._stale_pairs]
+        if stale:
+            fresh = {sensor_id: RunningStats() for sensor_id in stale}
+            for record in self._storage.iter_level_history(level_id):
+                stats = fresh.get(record.sensor_id)
+                if stats is not None:
+                    stats.add(record.value)
+            by_sensor.update(fresh)
+            self._stale_pairs.difference_update((level_id, sensor_id) for sensor_id in stale)
+        return dict(by_sensor)
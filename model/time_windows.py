@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Set, Tuple
+
+from .encoding import datetime_to_micros, micros_to_datetime
+from .entities import StorageRecord, level_from_event
+from .repository_base import StorageListener, StorageRepository
+from .running_stats import RunningStats
+
+
+# Число значений в блоке, статистика которого кэшируется
+BLOCK_SIZE = 256
+
+
+class _Timeline:
+    """
+    Показания одного сенсора на одном уровне, упорядоченные по времени.
+
+    Границы окна ищутся бинарным поиском; статистика полных блоков по
+    BLOCK_SIZE значений кэшируется, поэтому пересекающиеся окна считают
+    заново только неполные блоки по краям.
+    """
+
+    __slots__ = ("times", "values", "blocks")
+
+    def __init__(self) -> None:
+        self.times = array("q")
+        self.values = array("d")
+        self.blocks: Dict[int, RunningStats] = {}
+
+    def add(self, ts: int, value: float) -> None:
+        times = self.times
+        if not times or times[-1] <= ts:
+            self.blocks.pop(len(times) // BLOCK_SIZE, None)
+            times.append(ts)
+            self.values.append(value)
+            return
+        # Запоздавшее показание сдвигает все блоки после места вставки
+        position = bisect_left(times, ts + 1)
+        times.insert(position, ts)
+        self.values.insert(position, value)
+        first = position // BLOCK_SIZE
+        for block in [b for b in self.blocks if b >= first]:
+            del self.blocks[block]
+
+    def _block(self, block: int) -> RunningStats:
+        stats = self.blocks.get(block)
+        if stats is None:
+            start = block * BLOCK_SIZE
+            stats = self.blocks[block] = RunningStats.of(self.values[start:start + BLOCK_SIZE])
+        return stats
+
+    def window(self, start: Optional[int], end: Optional[int]) -> RunningStats:
+        """Статистика значений с start <= время < end."""
+        lo = 0 if start is None else bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect_left(self.times, end)
+        first = -(-lo // BLOCK_SIZE)
+        last = hi // BLOCK_SIZE
+        if first >= last:
+            return RunningStats.of(self.values[lo:hi])
+        stats = RunningStats.of(self.values[lo:first * BLOCK_SIZE])
+        for block in range(first, last):
+            stats.merge(self._block(block))
+        stats.merge(RunningStats.of(self.values[last * BLOCK_SIZE:hi]))
+        return stats
+
+
+class TimeWindowIndex(StorageListener):
+    """
+    Временные ряды показаний по уровням и сенсорам для анализа окон
+    [since, until): выборка окна — бинарный поиск по времени, а не
+    просмотр всей истории.
+
+    После удаления показаний ряды уровня перестраиваются по истории при
+    следующем обращении.
+    """
+
+    def __init__(self, storage: StorageRepository) -> None:
+        self._storage = storage
+        self._levels: Dict[int, Dict[int, _Timeline]] = {}
+        self._event_levels: Dict[str, Optional[int]] = {}
+        self._stale: Set[int] = set()
+        for chunk in storage.iter_chunks():
+            self.records_added(chunk)
+        storage.subscribe(self)
+
+    def _level_of(self, record: StorageRecord) -> Optional[int]:
+        event_type = record.event_type
+        if event_type not in self._event_levels:
+            self._event_levels[event_type] = level_from_event(event_type)
+        return self._event_levels[event_type]
+
+    def _add(self, level_id: int, record: StorageRecord) -> None:
+        by_sensor = self._levels.get(level_id)
+        if by_sensor is None:
+            by_sensor = self._levels[level_id] = {}
+        timeline = by_sensor.get(record.sensor_id)
+        if timeline is None:
+            timeline = by_sensor[record.sensor_id] = _Timeline()
+        timeline.add(datetime_to_micros(record.timestamp), record.value)
+
+    def records_added(self, records: Sequence[StorageRecord]) -> None:
+        for record in records:
+            level_id = self._level_of(record)
+            if level_id is not None and level_id not in self._stale:
+                self._add(level_id, record)
+
+    def records_removed(self, records: Sequence[StorageRecord]) -> None:
+        for record in records:
+            level_id = self._level_of(record)
+            if level_id is not None:
+                self._stale.add(level_id)
+
+    def _timelines(self, level_id: int) -> Dict[int, _Timeline]:
+        if level_id in self._stale:
+            self._stale.discard(level_id)
+            self._levels.pop(level_id, None)
+            for record in self._storage.iter_level_history(level_id):
+                self._add(level_id, record)
+        return self._levels.get(level_id, {})
+
+    def window(
+        self,
+        level_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Dict[int, RunningStats]:
+        """Статистика окна [since, until) уровня по каждому сенсору."""
+        start = None if since is None else datetime_to_micros(since)
+        end = None if until is None else datetime_to_micros(until)
+        result = {}
+        for sensor_id, timeline in self._timelines(level_id).items():
+            stats = timeline.window(start, end)
+            if stats.count:
+                result[sensor_id] = stats
+        return result
+
+    def bounds(self, level_id: int) -> Optional[Tuple[datetime, datetime]]:
+        """Время первого и последнего показания уровня или None."""
+        timelines = [t for t in self._timelines(level_id).values() if t.times]
+        if not timelines:
+            return None
+        first = min(t.times[0] for t in timelines)
+        last = max(t.times[-1] for t in timelines)
+        return micros_to_datetime(first), micros_to_datetime(last)
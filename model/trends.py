@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Dict, Optional, Sequence
+
+from .encoding import datetime_to_micros
+from .entities import StorageRecord, level_from_event
+from .repository_base import StorageListener, StorageRepository
+
+
+_HOUR = timedelta(hours=1) // timedelta(microseconds=1)
+
+
+class LinearTrend:
+    """
+    Суммы для линейной регрессии значения по времени (МНК): наклон и
+    среднее считаются за O(1), добавление и удаление точки — тоже.
+    """
+
+    __slots__ = ("count", "sum_t", "sum_v", "sum_tt", "sum_tv")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum_t = 0.0
+        self.sum_v = 0.0
+        self.sum_tt = 0.0
+        self.sum_tv = 0.0
+
+    def add(self, t: float, value: float) -> None:
+        self.count += 1
+        self.sum_t += t
+        self.sum_v += value
+        self.sum_tt += t * t
+        self.sum_tv += t * value
+
+    def remove(self, t: float, value: float) -> None:
+        if self.count <= 1:
+            self.__init__()
+            return
+        self.count -= 1
+        self.sum_t -= t
+        self.sum_v -= value
+        self.sum_tt -= t * t
+        self.sum_tv -= t * value
+
+    @property
+    def mean(self) -> float:
+        return self.sum_v / self.count if self.count else 0.0
+
+    @property
+    def slope(self) -> float:
+        """Изменение значения за единицу t; 0, если все точки в один момент."""
+        spread = self.count * self.sum_tt - self.sum_t * self.sum_t
+        if self.count < 2 or spread <= 1e-12 * self.count * self.sum_tt:
+            return 0.0
+        return (self.count * self.sum_tv - self.sum_t * self.sum_v) / spread
+
+
+class TrendIndex(StorageListener):
+    """
+    LinearTrend показаний по каждой паре (уровень, сенсор); время — в часах
+    от первого показания, которое увидел индекс. Обновляется при записи,
+    поэтому запрос тренда не читает историю.
+    """
+
+    def __init__(self, storage: StorageRepository) -> None:
+        self._levels: Dict[int, Dict[int, LinearTrend]] = {}
+        self._event_levels: Dict[str, Optional[int]] = {}
+        self._origin: Optional[int] = None
+        for chunk in storage.iter_chunks():
+            self.records_added(chunk)
+        storage.subscribe(self)
+
+    def _level_of(self, record: StorageRecord) -> Optional[int]:
+        event_type = record.event_type
+        if event_type not in self._event_levels:
+            self._event_levels[event_type] = level_from_event(event_type)
+        return self._event_levels[event_type]
+
+    def _hours(self, record: StorageRecord) -> float:
+        ts = datetime_to_micros(record.timestamp)
+        if self._origin is None:
+            self._origin = ts
+        return (ts - self._origin) / _HOUR
+
+    def records_added(self, records: Sequence[StorageRecord]) -> None:
+        for record in records:
+            level_id = self._level_of(record)
+            if level_id is None:
+                continue
+            by_sensor = self._levels.get(level_id)
+            if by_sensor is None:
+                by_sensor = self._levels[level_id] = {}
+            trend = by_sensor.get(record.sensor_id)
+            if trend is None:
+                trend = by_sensor[record.sensor_id] = LinearTrend()
+            trend.add(self._hours(record), record.value)
+
+    def records_removed(self, records: Sequence[StorageRecord]) -> None:
+        for record in records:
+            level_id = self._level_of(record)
+            trend = self._levels.get(level_id, {}).get(record.sensor_id)
+            if trend is not None:
+                trend.remove(self._hours(record), record.value)
+
+    def level(self, level_id: int) -> Dict[int, LinearTrend]:
+        """Тренды уровня по сенсорам (только непустые)."""
+        return {
+            sensor_id: trend
+            for sensor_id, trend in self._levels.get(level_id, {}).items()
+            if trend.count
+        }
+
+    def levels(self) -> Dict[int, Dict[int, LinearTrend]]:
+        return {level_id: self.level(level_id) for level_id in self._levels}
@@ -1,12 +1,29 @@
-from datetime import datetime
+import asyncio
+import math
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
 
 from model import (
     Sensor,
+    Level,
+    Forecast,
+    TrendIndex,
+    StorageRecord,
     InMemorySensorRepository,
     InMemoryLevelRepository,
     InMemoryStorageRepository,
     InMemoryForecastRepository,
     InMemoryReportRepository,
+    ColumnarStorageRepository,
+    MappedLogStorageRepository,
+    StorageListener,
 )
 from controllers import (
     JournalManager,
@@ -15,7 +32,29 @@ from controllers import (
     AnalysisController,
     DecisionSupportController,
     InterfaceController,
+    compute_group_stats,
+    KllSketch,
+    QuantileRegistry,
+    ForecastCache,
+    SweepEngine,
+    compute_preview,
+    AnomalyDetector,
+    PollingScheduler,
+    NdjsonIngestor,
+    ingest_ndjson,
+    WriteQueue,
+    ReplaySource,
+    SourcedSensor,
+    SyntheticSource,
+    synthetic_sensors,
+    write_ndjson,
 )
+from controllers.analysis import passability
+from controllers.ingest import MAX_ERRORS, MAX_LINE
+from controllers.parallel import parallel_level_stats
+from controllers.sweep import SERVER_LOADS
+from infrastructure import DependencyContainer, SnapshotManager, SystemConfigurator
+from application import Application
 
 
 def run_controller_tests():
@@ -88,5 +127,1260 @@ def run_controller_tests():
     print("\n===== ВСЕ ТЕСТЫ КОНТРОЛЛЕРОВ ПРОЙДЕНЫ УСПЕШНО =====")
 
 
+def run_level_analysis_tests():
+    print("===== ТЕСТ АНАЛИЗА ПО УРОВНЮ =====")
+
+    sensor_repo = InMemorySensorRepository()
+    storage_repo = InMemoryStorageRepository()
+    journal = JournalManager()
+    sensor = Sensor(sensor_id=1, type="load", unit="%", poll_frequency=5, value=10.0)
+    sensor_repo.add_sensor(sensor)
+
+    data_controller = DataCollectionController(sensor_repo, storage_repo, journal)
+    analysis_controller = AnalysisController(storage_repo, InMemoryForecastRepository(), journal)
+    level_manager = LevelManager(InMemoryLevelRepository())
+    first = level_manager.create_level({"id": 1, "name": "Первый"})
+    second = level_manager.create_level({"id": 2, "name": "Второй"})
+
+    data_controller.initialize_sensors()
+    data_controller.collect_data(level_id=first.level_id)
+    sensor.value = 30.0
+    data_controller.collect_data(level_id=second.level_id)
+    data_controller.collect_data(level_id=second.level_id)
+
+    # Анализ учитывает только показания своего уровня
+    stats = analysis_controller.analyze_data(first)
+    assert stats["records_count"] == 1.0 and stats["average_value"] == 10.0
+    stats = analysis_controller.analyze_data(second)
+    assert stats["records_count"] == 2.0 and stats["average_value"] == 30.0
+    print("[OK] analyze_data reads only the level's records")
+
+    # Статистика обновляется по мере записи и совпадает с полным пересчётом
+    sensor.value = 50.0
+    data_controller.collect_data(level_id=second.level_id)
+    stats = analysis_controller.analyze_data(second)
+    assert stats["records_count"] == 3.0
+    assert abs(stats["average_value"] - 110.0 / 3) < 1e-9
+    assert abs(stats["value_stddev"] - statistics.stdev([30.0, 30.0, 50.0])) < 1e-9
+    assert (stats["min_value"], stats["max_value"]) == (30.0, 50.0)
+
+    # Прогноз считается по своему уровню, а не по последнему анализу
+    forecast = analysis_controller.create_forecast(first)
+    assert abs(forecast.passability_score - (1.0 - 0.5 * (10.0 / 120.0))) < 1e-9
+    print("[OK] running statistics match a full recompute")
+
+    print("\n===== ТЕСТЫ АНАЛИЗА ПО УРОВНЮ ПРОЙДЕНЫ =====")
+
+
+class CountingStorageRepository(InMemoryStorageRepository):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches = []
+
+    def save_records(self, records) -> None:
+        records = list(records)
+        self.batches.append(len(records))
+        super().save_records(records)
+
+
+def run_batched_collection_tests():
+    print("===== ТЕСТ ПАКЕТНОГО СБОРА ДАННЫХ =====")
+
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.save_many(
+        Sensor(sensor_id=i, type="load", unit="%", poll_frequency=5, value=float(i))
+        for i in range(1, 6)
+    )
+    storage_repo = CountingStorageRepository()
+    data_controller = DataCollectionController(sensor_repo, storage_repo, JournalManager())
+
+    data_controller.initialize_sensors()
+    data_controller.collect_data(level_id=3)
+    data_controller.collect_data(level_id=3)
+
+    # Каждый опрос — одна пакетная запись со всеми сенсорами
+    assert storage_repo.batches == [5, 5]
+    assert len(storage_repo.get_level_history(3)) == 10
+    print("[OK] collect_data writes one batch per sweep")
+
+    print("\n===== ТЕСТЫ ПАКЕТНОГО СБОРА ПРОЙДЕНЫ =====")
+
+def run_snapshot_tests():
+    print("===== ТЕСТ СНИМКА СОСТОЯНИЯ =====")
+
+    tmp = tempfile.mkdtemp()
+    for backend in ("memory", "columnar"):
+        path = os.path.join(tmp, f"{backend}.snapshot")
+
+        first = Application(SystemConfigurator(backend), SnapshotManager(path))
+        first.start()
+        first.start()
+        storage = first._container.resolve("repo:storage")
+        storage.delete(storage.latest().record_id)
+        first.stop()
+        saved_records = storage.get_all()
+        saved_forecasts = first._container.resolve("repo:forecast").get_all()
+        saved_journal = len(first._container.resolve(JournalManager).view_history())
+
+        second = Application(SystemConfigurator(backend), SnapshotManager(path))
+        second.initialize()
+        restored = second._container.resolve("repo:storage")
+        assert restored.get_all() == saved_records, backend
+        assert [r.record_id for r in restored.get_all()] == [r.record_id for r in saved_records]
+        assert second._container.resolve("repo:forecast").get_all() == saved_forecasts
+        assert second._container.resolve("repo:level").load(1).name == "Проблемный уровень"
+        # Скетчи квантилей строятся по восстановленным показаниям
+        quantiles = second._container.resolve(QuantileRegistry)
+        for sensor_id in (1, 2):
+            values = [r.value for r in saved_records if r.sensor_id == sensor_id]
+            assert quantiles.sensor(sensor_id).count == len(values) > 0, backend
+            assert min(values) <= quantiles.sensor(sensor_id).quantile(0.5) <= max(values)
+        journal = second._container.resolve(JournalManager).view_history()
+        assert len(journal) > saved_journal
+        assert "Состояние восстановлено" in journal[-2].message
+        # Тренды и сводка прогнозов построены при запуске и видят восстановленное
+        interface = second._configurator.controller_factory.create("interface")
+        assert interface._analysis._trend_index is second._container.resolve(TrendIndex)
+        trend = interface.handle_user_choice("historical_analysis", level_id=1)[1]
+        assert trend.forecasts == sum(f.level_name == trend.level_name for f in saved_forecasts) > 0
+        assert sum(s.count for s in trend.sensors) == len(restored.get_level_history(1)) > 0
+
+        # Новые данные продолжают нумерацию, а не перезаписывают старые
+        second.start()
+        assert second._container.resolve("repo:forecast").latest().forecast_id == 6
+        assert len(restored) == len(saved_records) + 4
+        print(f"[OK] snapshot round trip ({backend})")
+
+    print("\n===== ТЕСТЫ СНИМКА СОСТОЯНИЯ ПРОЙДЕНЫ =====")
+
+def run_group_stats_tests():
+    print("===== ТЕСТ ГРУППОВОЙ СТАТИСТИКИ =====")
+
+    rng = random.Random(3)
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.save_many([
+        Sensor(1, "load", "%", 5),
+        Sensor(2, "load", "%", 5),
+        Sensor(3, "completion_time", "sec", 5),
+    ])
+    base = datetime(2024, 1, 1)
+    records = [
+        StorageRecord(
+            base + timedelta(seconds=i),
+            1 + i % 4,
+            rng.uniform(0.0, 1.0) if i % 4 < 2 else rng.uniform(60.0, 180.0),
+            f"MEASURE_LEVEL_{i % 3}" if i % 7 else "MEASURE",
+        )
+        for i in range(3000)
+    ]
+    tmp = tempfile.mkdtemp()
+    for storage in (
+        InMemoryStorageRepository(),
+        ColumnarStorageRepository(),
+        MappedLogStorageRepository(os.path.join(tmp, "groups.log")),
+    ):
+        name = type(storage).__name__
+        storage.save_records(records)
+        groups = compute_group_stats(storage, sensor_repo)
+        # Сенсора 4 нет в репозитории — его показания идут в тип unknown
+        assert groups.levels() == [0, 1, 2], name
+        assert sorted(groups.for_level(1)) == ["completion_time", "load", "unknown"], name
+        for (level_id, sensor_type), got in groups.groups.items():
+            sensor_ids = {"load": {1, 2}, "completion_time": {3}, "unknown": {4}}[sensor_type]
+            values = [
+                r.value for r in records
+                if r.level_id == level_id and r.sensor_id in sensor_ids
+            ]
+            cuts = statistics.quantiles(values, n=100, method="inclusive")
+            assert got.count == len(values), name
+            assert math.isclose(got.mean, statistics.mean(values), rel_tol=1e-12), name
+            assert math.isclose(got.stddev, statistics.stdev(values), rel_tol=1e-9), name
+            assert math.isclose(got.p50, statistics.median(values), rel_tol=1e-12), name
+            assert math.isclose(got.p95, cuts[94], rel_tol=1e-12), name
+            assert math.isclose(got.p99, cuts[98], rel_tol=1e-12), name
+            assert (got.minimum, got.maximum) == (min(values), max(values)), name
+        assert compute_group_stats(storage, sensor_repo, level_ids=[2]).levels() == [2], name
+    print("[OK] group stats match statistics for every storage layout")
+
+    storage = InMemoryStorageRepository()
+    storage.save_records(records)
+    analysis = AnalysisController(
+        storage, InMemoryForecastRepository(), JournalManager(), sensor_repository=sensor_repo
+    )
+    level = Level(1, "L", 0.2, {}, "")
+    stats = analysis.analyze_data(level)
+    completion = analysis.analyze_groups([1]).get(1, "completion_time")
+    assert math.isclose(stats["completion_time_mean"], completion.mean, rel_tol=1e-9)
+    assert stats["load_mean"] < 1.0
+    # Проходимость считается по времени прохождения, а не по смеси единиц
+    forecast = analysis.create_forecast(level)
+    expected = 1.0 - (0.5 * 0.2 + 0.5 * min(1.0, completion.mean / 120.0))
+    assert math.isclose(forecast.passability_score, max(0.0, expected), rel_tol=1e-9)
+    print("[OK] create_forecast uses the completion-time group")
+
+    print("\n===== ТЕСТЫ ГРУППОВОЙ СТАТИСТИКИ ПРОЙДЕНЫ =====")
+
+
+def run_quantile_sketch_tests():
+    print("===== ТЕСТ СКЕТЧЕЙ КВАНТИЛЕЙ =====")
+
+    rng = random.Random(11)
+    qs = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+    # Ошибка ранга KLL при k = 200 — около 1 %; проверяем с запасом
+    bound = 0.02
+    streams = {
+        "uniform": [rng.uniform(0.0, 1.0) for _ in range(100_000)],
+        "lognormal": [rng.lognormvariate(0.0, 1.5) for _ in range(100_000)],
+        "ties": [float(rng.randrange(50)) for _ in range(100_000)],
+    }
+
+    def rank_error(ordered, q, estimate):
+        lo = bisect_left(ordered, estimate) / len(ordered)
+        hi = bisect_right(ordered, estimate) / len(ordered)
+        return 0.0 if lo <= q <= hi else min(abs(lo - q), abs(hi - q))
+
+    for name, values in streams.items():
+        ordered = sorted(values)
+        sketch = KllSketch(seed=1)
+        sketch.update_many(values)
+        assert sketch.count == len(values), name
+        assert (sketch.minimum, sketch.maximum) == (ordered[0], ordered[-1]), name
+        # Память ограничена: сотни значений вместо 100 тысяч
+        assert sketch.stored < 1000, (name, sketch.stored)
+        for q, estimate in zip(qs, sketch.quantiles(qs)):
+            assert rank_error(ordered, q, estimate) <= bound, (name, q)
+        assert abs(sketch.rank(sketch.quantile(0.5)) - 0.5) <= bound, name
+
+        # Скетчи шардов сливаются с той же точностью
+        shards = [KllSketch(seed=i) for i in range(8)]
+        for i, value in enumerate(values):
+            shards[i % 8].update(value)
+        merged = KllSketch(seed=99)
+        for shard in shards:
+            merged.merge(shard)
+        assert merged.count == len(values), name
+        assert (merged.minimum, merged.maximum) == (ordered[0], ordered[-1]), name
+        assert merged.stored < 1000, name
+        for q, estimate in zip(qs, merged.quantiles(qs)):
+            assert rank_error(ordered, q, estimate) <= bound, (name, q)
+    print("[OK] KLL quantiles stay within the rank error bound, also after merge")
+
+    # Малые потоки хранятся целиком и дают точные квантили
+    small = KllSketch()
+    small.update_many([5.0, 1.0, 3.0, 2.0, 4.0])
+    assert small.quantiles((0.0, 0.2, 0.5, 1.0)) == [1.0, 1.0, 3.0, 5.0]
+    assert KllSketch().quantile(0.5) == 0.0
+    try:
+        small.quantile(1.5)
+        raise AssertionError("доля вне [0, 1] должна отклоняться")
+    except ValueError:
+        pass
+    print("[OK] small streams are exact")
+
+    # Сбор данных обновляет скетчи, анализ их отдаёт
+    sensor = Sensor(1, "completion_time", "sec", 5)
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.add_sensor(sensor)
+    # Нагрузка на том же уровне не смешивается с временем прохождения
+    sensor_repo.add_sensor(Sensor(2, "load", "%", 5, 0.5))
+    storage = InMemoryStorageRepository()
+    registry = QuantileRegistry(seed=2, storage=storage)
+    data_controller = DataCollectionController(sensor_repo, storage, JournalManager())
+    analysis = AnalysisController(
+        storage, InMemoryForecastRepository(), JournalManager(), quantiles=registry
+    )
+    data_controller.initialize_sensors()
+    times = [float(rng.randrange(30, 300)) for _ in range(2000)]
+    for value in times:
+        sensor.value = value
+        data_controller.collect_data(level_id=4)
+    assert registry.sensor(1).count == len(times)
+    assert registry.level(4, 1).count == registry.level(4, 2).count == len(times)
+    ordered = sorted(times)
+    by_sensor = analysis.level_quantiles(4)
+    assert sorted(by_sensor) == [1, 2]
+    for key, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+        assert rank_error(ordered, q, analysis.sensor_quantiles(1)[key]) <= bound, key
+        assert rank_error(ordered, q, by_sensor[1][key]) <= bound, key
+        assert by_sensor[2][key] == 0.5, key
+    assert analysis.level_quantiles(5) == {}
+
+    other = QuantileRegistry()
+    other.update(1, None, 1000.0)
+    other.update(2, 4, 0.9)
+    registry.merge(other)
+    assert registry.sensor(1).maximum == 1000.0
+    assert registry.level(4, 1).count == len(times)
+    assert registry.level(4, 2).maximum == 0.9
+    print("[OK] collect_data feeds the sketches exposed by AnalysisController")
+
+    print("\n===== ТЕСТЫ СКЕТЧЕЙ КВАНТИЛЕЙ ПРОЙДЕНЫ =====")
+
+
+def run_batch_forecast_tests():
+    print("===== ТЕСТ ПАКЕТНЫХ ПРОГНОЗОВ =====")
+
+    rng = random.Random(5)
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.save_many([
+        Sensor(1, "load", "%", 5),
+        Sensor(2, "completion_time", "sec", 5),
+    ])
+    storage = InMemoryStorageRepository()
+    base = datetime(2024, 1, 1)
+    storage.save_records([
+        StorageRecord(
+            base + timedelta(seconds=i),
+            1 + i % 2,
+            rng.uniform(0.0, 1.0) if i % 2 == 0 else rng.uniform(30.0, 200.0),
+            f"MEASURE_LEVEL_{i % 50}",
+        )
+        for i in range(5000)
+    ])
+    # Уровень 60 без показаний, у уровня 61 нет сенсора времени прохождения
+    storage.save_records([StorageRecord(base, 1, 0.4, "MEASURE_LEVEL_61")])
+    levels = [
+        Level(level_id, f"L{level_id}", rng.uniform(0.0, 1.0), {}, "")
+        for level_id in [*range(50), 60, 61]
+    ]
+
+    single = AnalysisController(
+        storage, InMemoryForecastRepository(), JournalManager(), sensor_repository=sensor_repo
+    )
+    expected = [single.create_forecast(level) for level in levels]
+
+    forecast_repo = InMemoryForecastRepository()
+    journal = JournalManager()
+    batch = AnalysisController(storage, forecast_repo, journal, sensor_repository=sensor_repo)
+    forecasts = batch.create_forecasts(levels)
+    assert [f.forecast_id for f in forecasts] == list(range(1, len(levels) + 1))
+    for got, want in zip(forecasts, expected):
+        assert got.level_name == want.level_name
+        assert math.isclose(got.passability_score, want.passability_score, rel_tol=1e-12)
+        assert got.recommendations == want.recommendations
+    assert len(forecast_repo.get_all()) == len(levels)
+    assert len(journal.view_history()) == 1
+    print("[OK] create_forecasts matches create_forecast level by level")
+
+    # Id продолжаются после уже сохранённых прогнозов, пустой пакет ничего не пишет
+    more = batch.create_forecasts(levels[:3])
+    assert [f.forecast_id for f in more] == [len(levels) + 1, len(levels) + 2, len(levels) + 3]
+    assert batch.create_forecasts([]) == []
+    assert len(journal.view_history()) == 2
+    # Без репозитория сенсоров оценка строится по среднему всех показаний уровня
+    plain = AnalysisController(storage, InMemoryForecastRepository(), JournalManager())
+    for got, level in zip(plain.create_forecasts(levels[:5]), levels[:5]):
+        assert math.isclose(
+            got.passability_score, plain.create_forecast(level).passability_score, rel_tol=1e-12
+        )
+    print("[OK] bulk ids continue the sequence")
+
+    print("\n===== ТЕСТЫ ПАКЕТНЫХ ПРОГНОЗОВ ПРОЙДЕНЫ =====")
+
+
+def run_forecast_cache_tests():
+    print("===== ТЕСТ КЭША ПРОГНОЗОВ =====")
+
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.add_sensor(Sensor(1, "completion_time", "sec", 5, 90.0))
+    storage = InMemoryStorageRepository()
+    forecast_repo = InMemoryForecastRepository()
+    level_manager = LevelManager(InMemoryLevelRepository())
+    cache = ForecastCache(storage)
+    level_manager.subscribe(cache.invalidate)
+    journal = JournalManager()
+    data_controller = DataCollectionController(sensor_repo, storage, journal)
+    analysis = AnalysisController(
+        storage, forecast_repo, journal, sensor_repository=sensor_repo, forecast_cache=cache
+    )
+    level = level_manager.create_level(
+        {"id": 1, "name": "L", "difficulty": 0.5, "parameters": {"enemies": 10}}
+    )
+    data_controller.initialize_sensors()
+    data_controller.collect_data(level_id=1)
+
+    first = analysis.create_forecast(level)
+    again = analysis.create_forecast(level)
+    assert again is first
+    assert len(forecast_repo.get_all()) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    print("[OK] unchanged level and data hit the cache")
+
+    # Новые показания сбрасывают кэш
+    data_controller.collect_data(level_id=1)
+    assert len(cache) == 0
+    second = analysis.create_forecast(level)
+    assert second.forecast_id == first.forecast_id + 1
+    assert cache.misses == 2
+
+    # Правка уровня меняет ключ и сразу освобождает записи уровня
+    level_manager.edit_level(1, {"parameters": {"enemies": 5}})
+    assert len(cache) == 0
+    third = analysis.create_forecast(level)
+    assert third.forecast_id == second.forecast_id + 1
+    # Изменение объекта уровня в обход менеджера тоже меняет ключ
+    level.difficulty = 0.9
+    fourth = analysis.create_forecast(level)
+    assert fourth.passability_score < third.passability_score
+    assert cache.stats() == {"hits": 1, "misses": 4, "size": 2, "version": 2}
+    print("[OK] new readings and level edits invalidate the cache")
+
+    # TTL и вытеснение по LRU
+    now = [0.0]
+    small = ForecastCache(max_size=2, ttl=10.0, clock=lambda: now[0])
+    levels = [Level(i, f"L{i}", 0.1 * i, {}, "") for i in range(3)]
+    for lvl in levels[:2]:
+        small.put(lvl, Forecast.from_level(lvl.level_id, lvl, ""))
+    assert small.get(levels[0]) is not None
+    small.put(levels[2], Forecast.from_level(2, levels[2], ""))
+    assert small.get(levels[1]) is None
+    assert small.get(levels[0]) is not None
+    now[0] = 11.0
+    assert small.get(levels[0]) is None and len(small) == 1
+    small.invalidate()
+    assert len(small) == 0
+    print("[OK] entries expire after ttl and are evicted in LRU order")
+
+    print("\n===== ТЕСТЫ КЭША ПРОГНОЗОВ ПРОЙДЕНЫ =====")
+
+
+def run_sweep_tests():
+    print("===== ТЕСТ ПЕРЕБОРА ПАРАМЕТРОВ =====")
+
+    # Сетка заходит за границы слайдеров, чтобы проверить ограничение значений
+    difficulties = list(range(-10, 111, 7))
+    enemies = list(range(0, 220, 13))
+    rewards = list(range(30, 230, 11))
+    result = SweepEngine(workers=1).run(difficulties, enemies, rewards, completion_mean=90.0)
+    assert result.shape == (len(difficulties), len(enemies), len(rewards))
+    for i, d in enumerate(difficulties):
+        for j, e in enumerate(enemies):
+            for k, r in enumerate(rewards):
+                preview = compute_preview(d, e, r)
+                for metric in ("expected_players", "completion", "avg_time"):
+                    assert result.value(metric, i, j, k) == preview[metric], (metric, d, e, r)
+                load = SERVER_LOADS[int(result.value("server_load", i, j, k))]
+                assert load == preview["server_load"]
+                expected = passability(max(0, min(100, d)) / 100, 90.0)
+                assert result.value("passability", i, j, k) == expected
+    print("[OK] every grid point matches compute_preview and the forecast model")
+
+    heatmap = result.heatmap("completion", rows="enemies", cols="reward", difficulty=3)
+    assert len(heatmap) == len(enemies) and len(heatmap[0]) == len(rewards)
+    assert heatmap[2][5] == compute_preview(difficulties[3], enemies[2], rewards[5])["completion"]
+    try:
+        result.heatmap("completion", rows="reward", cols="reward")
+        raise AssertionError("одинаковые оси должны отклоняться")
+    except ValueError:
+        pass
+    print("[OK] heatmap slices the dense grid")
+
+    # Пул процессов даёт тот же плотный результат
+    parallel = SweepEngine(workers=2, parallel_threshold=1).run(
+        difficulties, enemies, rewards, completion_mean=90.0
+    )
+    assert parallel.values == result.values
+    print("[OK] process pool fan-out matches the serial sweep")
+
+    print("\n===== ТЕСТЫ ПЕРЕБОРА ПАРАМЕТРОВ ПРОЙДЕНЫ =====")
+
+
+def run_time_window_tests():
+    print("===== ТЕСТ АНАЛИЗА ПО ОКНАМ ВРЕМЕНИ =====")
+
+    rng = random.Random(17)
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.save_many([
+        Sensor(1, "load", "%", 5),
+        Sensor(2, "completion_time", "sec", 5),
+    ])
+    base = datetime(2024, 1, 1)
+    records = [
+        StorageRecord(
+            base + timedelta(seconds=i + rng.random()),
+            1 + i % 2,
+            rng.uniform(0.0, 1.0) if i % 2 == 0 else rng.uniform(30.0, 200.0),
+            f"MEASURE_LEVEL_{i % 3}",
+        )
+        for i in range(6000)
+    ]
+    # Часть показаний приходит с опозданием — не по порядку времени
+    late = records[4000:4100]
+    level = Level(1, "L", 0.4, {}, "")
+
+    def expected(since, until):
+        values = [
+            r for r in records[:4000] + records[4100:] + late
+            if r.level_id == 1 and since <= r.timestamp < until
+        ]
+        return values
+
+    for storage in (InMemoryStorageRepository(), ColumnarStorageRepository()):
+        name = type(storage).__name__
+        storage.save_records(records[:4000])
+        analysis = AnalysisController(
+            storage, InMemoryForecastRepository(), JournalManager(), sensor_repository=sensor_repo
+        )
+        analysis.analyze_data(level, since=base)
+        storage.save_records(records[4100:])
+        storage.save_records(late)
+
+        for since, until in (
+            (base, base + timedelta(minutes=15)),
+            (base + timedelta(seconds=1234.5), base + timedelta(seconds=5000)),
+            (base + timedelta(seconds=3990), base + timedelta(seconds=4200)),
+            (base + timedelta(seconds=10), base + timedelta(seconds=25)),
+        ):
+            window = expected(since, until)
+            stats = analysis.analyze_data(level, since=since, until=until)
+            values = [r.value for r in window]
+            times = [r.value for r in window if r.sensor_id == 2]
+            assert stats["records_count"] == len(values), name
+            assert math.isclose(stats["average_value"], statistics.mean(values), rel_tol=1e-9), name
+            assert math.isclose(stats["value_stddev"], statistics.stdev(values), rel_tol=1e-6), name
+            assert (stats["min_value"], stats["max_value"]) == (min(values), max(values)), name
+            assert math.isclose(
+                stats["completion_time_mean"], statistics.mean(times), rel_tol=1e-9
+            ), name
+        # Без границ окно совпадает с анализом всей истории
+        whole = analysis.analyze_data(level, since=base - timedelta(days=1))
+        assert whole["records_count"] == analysis.analyze_data(level)["records_count"], name
+        empty = analysis.analyze_data(level, since=base + timedelta(days=1))
+        assert empty["records_count"] == 0, name
+    print("[OK] windowed analysis matches brute-force filtering")
+
+    # Скользящие окна и их согласованность с analyze_data
+    windows = analysis.analyze_windows(
+        level, timedelta(minutes=15), step=timedelta(minutes=5),
+        since=base, until=base + timedelta(hours=1),
+    )
+    assert [start for start, _stats in windows] == [
+        base + timedelta(minutes=5 * i) for i in range(12)
+    ]
+    for start, stats in windows:
+        end = min(start + timedelta(minutes=15), base + timedelta(hours=1))
+        assert stats["records_count"] == len(expected(start, end))
+    tumbling = analysis.analyze_windows(level, timedelta(minutes=10))
+    assert sum(stats["records_count"] for _start, stats in tumbling) == whole["records_count"]
+    try:
+        analysis.analyze_windows(level, timedelta(0))
+        raise AssertionError("окно нулевой ширины должно отклоняться")
+    except ValueError:
+        pass
+    print("[OK] sliding windows cover the history without gaps")
+
+    # Удаление старых показаний перестраивает ряды уровня
+    cutoff = base + timedelta(minutes=30)
+    storage.clear_old(cutoff)
+    stats = analysis.analyze_data(level, since=base, until=base + timedelta(hours=1))
+    assert stats["records_count"] == len(expected(cutoff, base + timedelta(hours=1)))
+    print("[OK] clear_old invalidates windowed statistics")
+
+    print("\n===== ТЕСТЫ АНАЛИЗА ПО ОКНАМ ВРЕМЕНИ ПРОЙДЕНЫ =====")
+
+
+def run_anomaly_detection_tests():
+    print("===== ТЕСТ ОБНАРУЖЕНИЯ АНОМАЛИЙ =====")
+
+    rng = random.Random(23)
+    detector = AnomalyDetector(alpha=0.05, threshold=5.0, warmup=20)
+    hooked = []
+    detector.subscribe(hooked.append)
+    now = datetime(2024, 1, 1)
+    flagged = []
+    spikes = {300, 700, 1500}
+    for i in range(2000):
+        value = rng.gauss(100.0, 2.0)
+        if i in spikes:
+            value += 50.0
+        if detector.observe(1, 3, value, now + timedelta(seconds=i)) is not None:
+            flagged.append(i)
+    assert set(flagged) >= spikes
+    # Шум в пределах нормы почти не даёт ложных срабатываний
+    assert len(flagged) <= len(spikes) + 2, flagged
+    assert [a.timestamp for a in hooked] == [now + timedelta(seconds=i) for i in flagged]
+    assert detector.flagged == len(flagged)
+    spike = next(a for a in hooked if a.timestamp == now + timedelta(seconds=700))
+    assert (spike.sensor_id, spike.level_id) == (1, 3) and spike.zscore > 5.0
+    mean, stddev = detector.expected(1, 3)
+    assert abs(mean - 100.0) < 2.0 and 0.5 < stddev < 5.0
+    # Ряды разных уровней независимы; прогрев не даёт срабатываний
+    assert detector.expected(1, 4) is None
+    assert detector.observe(1, 4, 1000.0, now) is None
+    print("[OK] EWMA z-score flags injected spikes per (level, sensor)")
+
+    # Сбор данных отмечает выброс в журнале
+    sensor = Sensor(1, "load", "%", 5, 0.5)
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.add_sensor(sensor)
+    journal = JournalManager()
+    data_controller = DataCollectionController(
+        sensor_repo, InMemoryStorageRepository(), journal,
+        detector=AnomalyDetector(warmup=5),
+    )
+    data_controller.initialize_sensors()
+    for i in range(30):
+        sensor.value = 0.5 + (i % 3) * 0.01
+        data_controller.collect_data(level_id=2)
+    assert not [e for e in journal.view_history() if e.level == "WARN"]
+    sensor.value = 0.99
+    data_controller.collect_data(level_id=2)
+    warnings = [e.message for e in journal.view_history() if e.level == "WARN"]
+    assert len(warnings) == 1 and "сенсора 1" in warnings[0] and "уровень=2" in warnings[0]
+    print("[OK] collect_data reports anomalies through the journal")
+
+    print("\n===== ТЕСТЫ ОБНАРУЖЕНИЯ АНОМАЛИЙ ПРОЙДЕНЫ =====")
+
+
+def run_parallel_analysis_tests():
+    print("===== ТЕСТ ПАРАЛЛЕЛЬНОГО АНАЛИЗА =====")
+
+    rng = random.Random(29)
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.save_many([
+        Sensor(1, "load", "%", 5),
+        Sensor(2, "completion_time", "sec", 5),
+        Sensor(3, "completion_time", "sec", 5),
+    ])
+    base = datetime(2024, 1, 1)
+    records = [
+        StorageRecord(
+            base + timedelta(seconds=i),
+            1 + i % 3,
+            rng.uniform(0.0, 1.0) if i % 3 == 0 else rng.uniform(30.0, 200.0),
+            f"MEASURE_LEVEL_{i % 5}" if i % 11 else "MEASURE",
+        )
+        for i in range(20000)
+    ]
+    levels = [Level(level_id, f"L{level_id}", 0.1 * level_id, {}, "") for level_id in range(7)]
+    tmp = tempfile.mkdtemp()
+    for storage in (
+        InMemoryStorageRepository(),
+        ColumnarStorageRepository(),
+        MappedLogStorageRepository(os.path.join(tmp, "parallel.log")),
+    ):
+        name = type(storage).__name__
+        storage.save_records(records)
+        analysis = AnalysisController(
+            storage, InMemoryForecastRepository(), JournalManager(), sensor_repository=sensor_repo
+        )
+        expected = {level.level_id: analysis.analyze_data(level) for level in levels}
+        for workers in (1, 3):
+            got = analysis.analyze_parallel(levels, workers=workers)
+            assert sorted(got) == sorted(expected), name
+            for level_id, stats in got.items():
+                want = expected[level_id]
+                assert sorted(stats) == sorted(want), (name, level_id)
+                for key, value in stats.items():
+                    assert math.isclose(value, want[key], rel_tol=1e-9, abs_tol=1e-12), (name, key)
+    print("[OK] analyze_parallel matches analyze_data for every storage layout")
+
+    # Пул процессов запускается, когда строк достаточно на каждый процесс
+    pooled = parallel_level_stats(storage, workers=4, min_rows_per_worker=1000)
+    inline = parallel_level_stats(storage, workers=1)
+    assert sorted(pooled) == sorted(inline) == [0, 1, 2, 3, 4]
+    for level_id, by_sensor in pooled.items():
+        for sensor_id, stats in by_sensor.items():
+            other = inline[level_id][sensor_id]
+            assert stats.count == other.count
+            assert math.isclose(stats.mean, other.mean, rel_tol=1e-12)
+            assert math.isclose(stats.variance, other.variance, rel_tol=1e-9)
+            assert (stats.minimum, stats.maximum) == (other.minimum, other.maximum)
+    print("[OK] shared-memory shards merge to the single-process result")
+
+    print("\n===== ТЕСТЫ ПАРАЛЛЕЛЬНОГО АНАЛИЗА ПРОЙДЕНЫ =====")
+
+
+def run_historical_analysis_tests():
+    print("===== ТЕСТ ИСТОРИЧЕСКОГО АНАЛИЗА =====")
+
+    rng = random.Random(31)
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.save_many([
+        Sensor(1, "load", "%", 5),
+        Sensor(2, "completion_time", "sec", 5),
+    ])
+    storage = InMemoryStorageRepository()
+    forecast_repo = InMemoryForecastRepository()
+    journal = JournalManager()
+    level_manager = LevelManager(InMemoryLevelRepository())
+    analysis = AnalysisController(storage, forecast_repo, journal, sensor_repository=sensor_repo)
+    interface = InterfaceController(
+        level_manager, analysis, DecisionSupportController(
+            forecast_repo, InMemoryReportRepository(), journal
+        ), journal,
+    )
+    first = level_manager.create_level({"id": 1, "name": "Первый", "difficulty": 0.9})
+    second = level_manager.create_level({"id": 2, "name": "Второй", "difficulty": 0.2})
+
+    # Время прохождения первого уровня растёт на 3 с в час, нагрузка постоянна
+    base = datetime(2024, 1, 1)
+    storage.save_records([
+        StorageRecord(
+            base + timedelta(minutes=10 * i),
+            1 + i % 2,
+            0.5 if i % 2 == 0 else 60.0 + 3.0 * (10 * i / 60) + rng.uniform(-0.5, 0.5),
+            "MEASURE_LEVEL_1",
+        )
+        for i in range(2000)
+    ])
+    early = analysis.create_forecast(first)
+    level_manager.edit_level(1, {"difficulty": 0.5})
+    analysis.create_forecasts([first, second])
+
+    trends = interface.handle_user_choice("historical_analysis")
+    assert sorted(trends) == [1, 2]
+    trend = trends[1]
+    assert (trend.level_name, trend.forecasts) == ("Первый", 2)
+    assert trend.passability_first == early.passability_score
+    assert trend.passability_last > trend.passability_first
+    assert math.isclose(
+        trend.passability_mean,
+        statistics.mean(f.passability_score for f in forecast_repo.get_all() if f.level_name == "Первый"),
+    )
+    load, completion = trend.sensors
+    assert (load.sensor_type, completion.sensor_type) == ("load", "completion_time")
+    assert load.count == completion.count == 1000
+    assert load.slope_per_hour == 0.0 and load.mean == 0.5
+    assert abs(completion.slope_per_hour - 3.0) < 0.01
+    assert trends[2].forecasts == 1 and trends[2].sensors == []
+    assert "Исторический анализ: 2 уровней" in journal.view_history()[-1].message
+    print("[OK] historical_analysis returns passability and sensor trends")
+
+    # Агрегаты пополняются новыми прогнозами и удалением старых показаний
+    assert list(interface.handle_user_choice("historical_analysis", level_id=2)) == [2]
+    later = analysis.create_forecast(second)
+    storage.clear_old(base + timedelta(hours=100))
+    trends = interface.handle_user_choice("historical_analysis", level_id=1)
+    assert trends[1].sensors[1].count == len([
+        r for r in storage.get_level_history(1) if r.sensor_id == 2
+    ])
+    assert abs(trends[1].sensors[1].slope_per_hour - 3.0) < 0.01
+    trends = interface.handle_user_choice("historical_analysis", level_id=2)
+    assert trends[2].forecasts == 2 and trends[2].passability_last == later.passability_score
+    assert interface.handle_user_choice("monitoring") is None
+    print("[OK] trend aggregates follow new forecasts and removed readings")
+
+    print("\n===== ТЕСТЫ ИСТОРИЧЕСКОГО АНАЛИЗА ПРОЙДЕНЫ =====")
+
+
+class _AsyncSensor(Sensor):
+    """Сенсор с асинхронным чтением (например, сетевой опрос)."""
+
+    async def read_value(self) -> float:
+        await asyncio.sleep(0.005)
+        return self.value
+
+
+class _FlakySensor(Sensor):
+    """Сенсор, у которого сбоит каждое второе чтение."""
+
+    def read_value(self) -> float:
+        self.reads = getattr(self, "reads", 0) + 1
+        if self.reads % 2:
+            raise OSError("сенсор не ответил")
+        return self.value
+
+
+def run_polling_scheduler_tests():
+    print("\n===== ТЕСТЫ ФОНОВОГО ОПРОСА СЕНСОРОВ =====")
+
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.add_sensor(Sensor(1, "load", "%", 20, 0.5))
+    sensor_repo.add_sensor(Sensor(2, "completion_time", "sec", 80, 100.0))
+    sensor_repo.add_sensor(_AsyncSensor(3, "latency", "ms", 40, 12.0))
+    sensor_repo.add_sensor(Sensor(4, "disabled", "-", 0, 1.0))
+    storage = InMemoryStorageRepository()
+    journal = JournalManager()
+    scheduler = PollingScheduler(sensor_repo, batch_interval=0.05)
+    quantiles = QuantileRegistry(storage=storage)
+    data_controller = DataCollectionController(sensor_repo, storage, journal, scheduler=scheduler)
+
+    data_controller.initialize_sensors(level_id=7)
+    assert scheduler.running
+    time.sleep(0.5)
+    # Ручной сбор не мешает фоновому
+    data_controller.collect_data(level_id=7)
+    data_controller.finish_collection()
+    assert not scheduler.running
+
+    metrics = scheduler.metrics()
+    polls = {sensor_id: scheduler.polls(sensor_id) for sensor_id in (1, 2, 3, 4)}
+    assert polls[4] == 0
+    assert 5 <= polls[1] <= 15, polls
+    assert polls[2] > 2 * polls[1] and polls[3] > polls[1], polls
+    print(f"[OK] poll counts follow poll_frequency: {polls}")
+
+    history = storage.get_level_history(7)
+    assert len(history) == metrics["polls"] + 4
+    assert metrics["batches"] < metrics["polls"] / 3
+    assert metrics["failed_readings"] == 0
+    assert {r.sensor_id for r in history} == {1, 2, 3, 4}
+    assert quantiles.sensor(3).count == polls[3] + 1
+    print("[OK] readings are written in batches and flushed on stop")
+
+    assert 0.0 <= metrics["mean_lag"] <= metrics["max_lag"] < 0.5
+    assert metrics["missed_ticks"] >= 0
+    assert any("Фоновый опрос остановлен" in e.message for e in journal.view_history())
+    print(f"[OK] lag metrics: mean={metrics['mean_lag'] * 1000:.2f} ms, "
+          f"max={metrics['max_lag'] * 1000:.2f} ms")
+
+    # Ошибка записи пакета не останавливает опрос
+    failing = PollingScheduler(sensor_repo, batch_interval=0.02)
+    failing.start(lambda batch: 1 / 0)
+    time.sleep(0.1)
+    failing.stop()
+    assert failing.metrics()["failed_readings"] == failing.metrics()["polls"] > 0
+    try:
+        PollingScheduler(sensor_repo, batch_interval=0)
+        raise AssertionError("ожидалась ошибка периода")
+    except ValueError:
+        pass
+    print("[OK] failing sink is counted, invalid interval rejected")
+
+    # Сбой чтения не останавливает опрос сенсора, медленная запись — расписание
+    flaky_repo = InMemorySensorRepository()
+    flaky = _FlakySensor(1, "load", "%", 50, 0.5)
+    flaky_repo.add_sensor(flaky)
+    scheduler = PollingScheduler(flaky_repo, batch_interval=0.02)
+    written = []
+    scheduler.start(lambda batch: (time.sleep(0.1), written.extend(batch)))
+    time.sleep(0.4)
+    scheduler.stop()
+    metrics = scheduler.metrics()
+    assert metrics["read_errors"] >= 8 and abs(metrics["read_errors"] - metrics["polls"]) <= 1, metrics
+    assert len(written) == metrics["polls"] and metrics["failed_readings"] == 0
+    assert metrics["max_lag"] < 0.05 and metrics["missed_ticks"] == 0, metrics
+    print(f"[OK] read errors counted ({metrics['read_errors']:.0f}), "
+          f"slow sink keeps the schedule (max lag {metrics['max_lag'] * 1000:.1f} ms)")
+
+    print("\n===== ТЕСТЫ ФОНОВОГО ОПРОСА ПРОЙДЕНЫ =====")
+
+
+def run_ndjson_ingest_tests():
+    print("\n===== ТЕСТЫ ПРИЁМА NDJSON =====")
+
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.add_sensor(Sensor(1, "load", "%", 5, 0.5))
+    sensor_repo.add_sensor(Sensor(2, "completion_time", "sec", 5, 100.0))
+    storage = InMemoryStorageRepository()
+    quantiles = QuantileRegistry(storage=storage)
+    data_controller = DataCollectionController(sensor_repo, storage, JournalManager())
+    sensor_ids = [1, 2]
+
+    base = datetime(2024, 5, 1, 12, 0)
+    lines = [
+        '{"sensor_id": 1, "value": 0.5, "timestamp": "2024-05-01T12:00:00"}',
+        '{"sensor_id": 2, "value": 90, "timestamp": %r, "level_id": 4}' % base.timestamp(),
+        "",
+        '{"sensor_id": 3, "value": 1.0}',
+        '{"sensor_id": 1, "value": true}',
+        '{"sensor_id": 1, "value": NaN}',
+        "[1, 2]",
+        '{"sensor_id": 1, "value": 1.0, "level_id": "x"}',
+        '{"sensor_id": 1, "value": 1.0, "timestamp": "вчера"}',
+        "{broken",
+        '{"sensor_id": 2, "value": 110.5}',
+    ]
+    body = "\n".join(lines).encode()
+    # Куски по одному байту: строки собираются через границы кусков
+    result = ingest_ndjson(
+        (body[i:i + 1] for i in range(len(body))), data_controller, sensor_ids, level_id=3
+    )
+    assert (result.accepted, result.rejected) == (3, 7), result
+    assert [line for line, _error in result.errors] == [4, 5, 6, 7, 8, 9, 10]
+    assert "неизвестный сенсор 3" in result.errors[0][1]
+    level3 = storage.get_level_history(3)
+    assert sorted(r.value for r in level3) == [0.5, 110.5]
+    assert [r.timestamp for r in storage.get_level_history(4)] == [base]
+    assert base in [r.timestamp for r in level3]
+    assert quantiles.sensor(2).count == 2
+    print("[OK] stream split into single bytes parsed, bad lines rejected with line numbers")
+
+    storage = InMemoryStorageRepository()
+    data_controller = DataCollectionController(sensor_repo, storage, JournalManager())
+    ingestor = NdjsonIngestor(data_controller, sensor_ids, level_id=1, batch_size=4)
+    good = b'{"sensor_id": 1, "value": 1.0}\n'
+    for _ in range(10):
+        ingestor.feed(good)
+        assert len(storage.get_all()) == (ingestor.result.accepted)
+    ingestor.feed(b"not json\n" + good * 2)
+    result = ingestor.close()
+    assert [(b.accepted, b.rejected) for b in result.batches] == [(4, 0), (4, 0), (4, 1)]
+    assert len(storage.get_level_history(1)) == result.accepted == 12
+    print("[OK] readings written in batches of batch_size with per-batch counts")
+
+    storage = InMemoryStorageRepository()
+    data_controller = DataCollectionController(sensor_repo, storage, JournalManager())
+    long_line = b'{"sensor_id": 1, "value": 1.0, "pad": "' + b"x" * (2 * MAX_LINE) + b'"}\n'
+    chunks = [good, long_line[:MAX_LINE], long_line[MAX_LINE:], good]
+    result = ingest_ndjson(chunks, data_controller, sensor_ids, level_id=1)
+    assert (result.accepted, result.rejected) == (2, 1)
+    assert result.errors == [(2, "строка длиннее допустимого")]
+    small = [long_line[i:i + 4096] for i in range(0, len(long_line), 4096)]
+    result = ingest_ndjson([good, *small, good, long_line[:-1]], data_controller, sensor_ids)
+    assert (result.accepted, result.rejected) == (2, 2)
+    noisy = b"x\n" * (MAX_ERRORS * 2)
+    result = ingest_ndjson([noisy], data_controller, sensor_ids)
+    assert result.rejected == MAX_ERRORS * 2 and len(result.errors) == MAX_ERRORS
+    assert result.as_dict()["batches"] == [{"accepted": 0, "rejected": MAX_ERRORS * 2}]
+    try:
+        NdjsonIngestor(data_controller, sensor_ids, batch_size=0)
+        raise AssertionError("ожидалась ошибка размера пакета")
+    except ValueError:
+        pass
+    print("[OK] oversized lines dropped without buffering, error list capped")
+
+    # Пакеты, которым отказала очередь записи, не считаются принятыми;
+    # выброшенные DROP_OLDEST — принятыми, но не записанными
+    lines = [b'{"sensor_id": 1, "value": %d}\n' % i for i in range(50)]
+    for policy, accepted, batches in (
+        ("reject", 20, [(10, 0), (10, 0), (0, 10), (0, 10), (0, 10)]),
+        ("drop_oldest", 50, [(10, 0)] * 5),
+    ):
+        storage = _GatedStorage()
+        storage.gate.clear()
+        writer = WriteQueue(storage, capacity=10, policy=policy)
+        journal = JournalManager()
+        data_controller = DataCollectionController(sensor_repo, storage, journal, writer=writer)
+        ingestor = NdjsonIngestor(data_controller, sensor_ids, batch_size=10)
+        ingestor.feed(b"".join(lines[:10]))
+        time.sleep(0.05)  # писатель забрал первый пакет и ждёт шлюз
+        ingestor.feed(b"".join(lines[10:]))
+        storage.gate.set()
+        result = ingestor.close()
+        assert (result.accepted, result.rejected) == (accepted, 50 - accepted), policy
+        assert [(b.accepted, b.rejected) for b in result.batches] == batches, policy
+        assert result.written == len(storage.get_all()) == 20, policy
+        assert writer.metrics()["rejected"] == 50 - accepted, policy
+        writer.close()
+        data_controller.store_readings([(1, 1.0, datetime.now())])
+        assert "Очередь записи закрыта" in journal.view_history()[-1].message, policy
+    print("[OK] queue refusals and drops are reported by ingest")
+
+    print("\n===== ТЕСТЫ ПРИЁМА NDJSON ПРОЙДЕНЫ =====")
+
+
+class _GatedStorage(InMemoryStorageRepository):
+    """Медленное хранилище: запись ждёт открытия шлюза и задержки."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.delay = delay
+        self.calls = 0
+
+    def save_many(self, objs):
+        self.gate.wait()
+        time.sleep(self.delay)
+        self.calls += 1
+        super().save_many(objs)
+
+
+class _SlowListener(StorageListener):
+    """Подписчик, который долго обрабатывает запись; busy — идёт обработка."""
+
+    def __init__(self) -> None:
+        self.busy = False
+
+    def records_added(self, records):
+        self.busy = True
+        time.sleep(0.001)
+        self.busy = False
+
+    def records_removed(self, records):
+        pass
+
+
+class _CheckedCache(ForecastCache):
+    """Кэш, считающий обращения анализа во время обработки записи."""
+
+    def __init__(self, storage, listener) -> None:
+        super().__init__(storage)
+        self.listener = listener
+        self.overlaps = 0
+
+    def get(self, level):
+        self.overlaps += self.listener.busy
+        return super().get(level)
+
+
+def _records(count, sensor_id=1):
+    base = datetime(2024, 1, 1)
+    return [StorageRecord(base + timedelta(seconds=i), sensor_id, float(i), "MEASURE_LEVEL_1")
+            for i in range(count)]
+
+
+def run_write_queue_tests():
+    print("\n===== ТЕСТЫ ОЧЕРЕДИ ЗАПИСИ =====")
+
+    sensor_repo = InMemorySensorRepository()
+    sensor_repo.add_sensor(Sensor(1, "load", "%", 5, 0.5))
+    sensor_repo.add_sensor(Sensor(2, "completion_time", "sec", 5, 100.0))
+    storage = _GatedStorage(delay=0.05)
+    writer = WriteQueue(storage, capacity=1000)
+    journal = JournalManager()
+    data_controller = DataCollectionController(sensor_repo, storage, journal, writer=writer)
+    data_controller.initialize_sensors()
+    started = time.perf_counter()
+    for _ in range(10):
+        data_controller.collect_data(level_id=1)
+    elapsed = time.perf_counter() - started
+    assert elapsed < 0.05, elapsed
+    data_controller.finish_collection()
+    assert len(storage.get_level_history(1)) == 20
+    metrics = writer.metrics()
+    assert metrics["written"] == metrics["enqueued"] == 20 and metrics["depth"] == 0
+    # Пока шла первая запись, остальные пакеты копились и ушли одной записью
+    assert storage.calls == metrics["writes"] < 10
+    assert metrics["max_write_latency"] >= 0.05
+    assert metrics["max_queue_latency"] >= metrics["max_write_latency"]
+    print(f"[OK] collection does not wait for slow storage ({elapsed * 1000:.1f} ms for 10 sweeps, "
+          f"{metrics['writes']:.0f} writes)")
+
+    storage = _GatedStorage()
+    storage.gate.clear()
+    writer = WriteQueue(storage, capacity=10, policy="drop_oldest")
+    assert writer.put(_records(4))
+    time.sleep(0.05)  # писатель забрал первый пакет и ждёт шлюз
+    for _ in range(4):
+        assert writer.put(_records(4))
+    metrics = writer.metrics()
+    assert metrics["dropped"] == 8 and metrics["max_depth"] <= 10 + 4
+    storage.gate.set()
+    writer.close()
+    metrics = writer.metrics()
+    assert metrics["written"] + metrics["dropped"] == metrics["enqueued"] == 20
+    assert not writer.put(_records(1)) and writer.metrics()["rejected"] == 1
+    print("[OK] drop_oldest keeps the newest batches, close() drains the queue")
+
+    storage = _GatedStorage()
+    storage.gate.clear()
+    writer = WriteQueue(storage, capacity=5, policy="reject")
+    journal = JournalManager()
+    data_controller = DataCollectionController(sensor_repo, storage, journal, writer=writer)
+    data_controller.initialize_sensors()
+    writer.put(_records(1))
+    time.sleep(0.05)
+    for _ in range(4):
+        data_controller.collect_data(level_id=1)
+    assert writer.metrics()["rejected"] == 4
+    assert any("Очередь записи переполнена" in e.message for e in journal.view_history())
+    storage.gate.set()
+    assert data_controller.flush(timeout=1.0)
+    assert len(storage.get_all()) == 1 + 4
+    writer.close()
+    print("[OK] reject policy refuses overflow and reports it in the journal")
+
+    storage = _GatedStorage()
+    storage.gate.clear()
+    writer = WriteQueue(storage, capacity=4, policy="block")
+    writer.put(_records(4))
+    time.sleep(0.05)
+    writer.put(_records(4))
+    done = threading.Event()
+    threading.Thread(target=lambda: (writer.put(_records(4)), done.set()), daemon=True).start()
+    assert not done.wait(0.1)
+    assert not writer.flush(timeout=0.01)
+    storage.gate.set()
+    assert done.wait(1.0)
+    writer.close()
+    assert len(storage.get_all()) == 12
+    try:
+        WriteQueue(storage, policy="ignore")
+        raise AssertionError("ожидалась ошибка политики")
+    except ValueError:
+        pass
+    print("[OK] block policy applies backpressure until the writer frees space")
+
+    # Ошибки записи и обработчика записанного пакета попадают в журнал
+    storage = _GatedStorage()
+    journal = JournalManager()
+    writer = WriteQueue(storage, journal=journal)
+    storage.save_many = lambda objs: 1 / 0
+    writer.put(_records(3))
+    assert writer.flush(timeout=1.0) and writer.metrics()["failed"] == 3
+    del storage.save_many
+    writer.put(_records(2), lambda batch: {}["нет"])
+    writer.close()
+    assert len(storage.get_all()) == 2 and writer.metrics()["written"] == 2
+    warnings = [e.message for e in journal.view_history() if e.level == "WARN"]
+    assert len(warnings) == 2 and "Не удалось записать 3 показаний" in warnings[0], warnings
+    assert "Ошибка обработки записанного пакета" in warnings[1], warnings
+    print("[OK] write and hook failures are journalled, the writer keeps running")
+
+    # Детектор выбросов видит только записанные пакеты
+    for policy, written, mean in (("reject", [1.0, 2.0, 3.0], 1.29), ("drop_oldest", [1.0, 50.0], 5.9)):
+        storage = _GatedStorage()
+        storage.gate.clear()
+        writer = WriteQueue(storage, capacity=2, policy=policy)
+        detector = AnomalyDetector()
+        data_controller = DataCollectionController(
+            sensor_repo, storage, JournalManager(), detector=detector, writer=writer
+        )
+        now = datetime(2024, 1, 1)
+        data_controller.store_readings([(1, 1.0, now)], level_id=1)
+        time.sleep(0.05)  # писатель забрал первый пакет и ждёт шлюз
+        data_controller.store_readings([(1, 2.0, now), (1, 3.0, now)], level_id=1)
+        data_controller.store_readings([(1, 50.0, now)], level_id=1)
+        assert detector.expected(1, 1) is None, policy
+        storage.gate.set()
+        writer.close()
+        assert [r.value for r in storage.get_all()] == written, policy
+        assert math.isclose(detector.expected(1, 1)[0], mean), policy
+    print("[OK] anomaly detector observes only records the writer stored")
+
+    # Запись из потока писателя и анализ не пересекаются
+    storage = InMemoryStorageRepository()
+    listener = _SlowListener()
+    storage.subscribe(listener)
+    cache = _CheckedCache(storage, listener)
+    analysis = AnalysisController(
+        storage, InMemoryForecastRepository(), JournalManager(), forecast_cache=cache
+    )
+    writer = WriteQueue(storage)
+    level = Level(1, "L", 0.5, {}, "")
+    deadline = time.perf_counter() + 0.3
+    while time.perf_counter() < deadline:
+        writer.put(_records(10))
+        analysis.create_forecast(level)
+        assert analysis.analyze_data(level)["records_count"] >= 0
+    writer.close()
+    assert cache.overlaps == 0, cache.overlaps
+    assert analysis.analyze_data(level)["records_count"] == len(storage)
+    print("[OK] background writes and analysis reads share the storage lock")
+
+    container = DependencyContainer()
+    configurator = SystemConfigurator(write_queue="block")
+    configurator.configure(container)
+    data_controller = configurator.controller_factory.create("data")
+    data_controller.initialize_sensors()
+    data_controller.collect_data(level_id=3)
+    data_controller.finish_collection()
+    assert len(container.resolve("repo:storage").get_level_history(3)) == 2
+    container.resolve(WriteQueue).close()
+    print("[OK] configurator wires the queue into data collection")
+
+    print("\n===== ТЕСТЫ ОЧЕРЕДИ ЗАПИСИ ПРОЙДЕНЫ =====")
+
+
+def run_sensor_source_tests():
+    print("\n===== ТЕСТЫ ИСТОЧНИКОВ ПОКАЗАНИЙ =====")
+
+    sensors = synthetic_sensors(1000, SyntheticSource(seed=7), poll_frequency=20)
+    assert len({s.sensor_id for s in sensors}) == 1000
+    assert {s.type for s in sensors} == {"load", "completion_time"}
+    assert all(s.poll_frequency == 20 for s in sensors)
+    first = [s.read_value() for s in sensors[:10] for _ in range(5)]
+    # Тот же seed — те же ряды, даже при другом порядке чтения сенсоров
+    again = synthetic_sensors(10, SyntheticSource(seed=7), poll_frequency=20)
+    values = {s.sensor_id: [] for s in again}
+    for _ in range(5):
+        for s in reversed(again):
+            values[s.sensor_id].append(s.read_value())
+    assert first == [v for s in again for v in values[s.sensor_id]]
+    other = synthetic_sensors(10, SyntheticSource(seed=8))
+    assert [s.read_value() for s in other] != first[::5]
+    loads = [sensors[0].read_value() for _ in range(600)]
+    assert abs(statistics.fmean(loads) - 0.7) < 0.02
+    spiky = synthetic_sensors(1, SyntheticSource(seed=1, noise=0.0, amplitude=0.0, spike_rate=0.5))[0]
+    assert {round(spiky.read_value(), 6) for _ in range(50)} == {0.7, 2.1}
+    row = asdict(sensors[0])
+    assert "source" not in row and row["value"] == sensors[0].value
+    print("[OK] synthetic source is seeded per sensor and keeps the Sensor shape")
+
+    base = datetime(2024, 3, 1, 9, 0)
+    recorded = [
+        StorageRecord(base + timedelta(seconds=t), sensor_id, float(t * 10 + sensor_id), "MEASURE")
+        for t in range(4) for sensor_id in (1, 2)
+    ]
+    path = os.path.join(tempfile.mkdtemp(), "feed.ndjson")
+    assert write_ndjson(recorded, path) == 8
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("oops\n")
+    now = [100.0]
+    replay = ReplaySource(path, speed=1.0, clock=lambda: now[0])
+    one = SourcedSensor(1, "load", "%", 5, replay, value=-1.0)
+    two = SourcedSensor(2, "load", "%", 5, replay, value=-1.0)
+    three = SourcedSensor(3, "load", "%", 5, replay, value=-1.0)
+    assert (one.read_value(), two.read_value(), three.read_value()) == (1.0, 2.0, -1.0)
+    now[0] = 101.5
+    assert (one.read_value(), two.read_value()) == (11.0, 12.0)
+    now[0] = 110.0
+    assert one.read_value() == 31.0 and replay.finished and replay.skipped == 1
+    assert replay.replayed == 8
+
+    now[0] = 0.0
+    fast = ReplaySource(path, speed=10.0, loop=True, clock=lambda: now[0])
+    sensor = SourcedSensor(2, "load", "%", 5, fast)
+    assert sensor.read_value() == 2.0
+    now[0] = 0.25  # 2.5 с записи
+    assert sensor.read_value() == 22.0
+    now[0] = 0.45  # 4.5 с: второй круг, его начало сдвинуто на 3 с
+    assert sensor.read_value() == 12.0 and not fast.finished
+    now[0] = 1000.0  # тысячи кругов за одно чтение пропускаются целиком
+    assert sensor.read_value() in (2.0, 12.0, 22.0, 32.0) and fast.replayed <= 12 + 2 * 8
+    fast.close()
+    try:
+        ReplaySource(path, speed=0)
+        raise AssertionError("ожидалась ошибка скорости")
+    except ValueError:
+        pass
+    print("[OK] replay follows recorded time at real-time and accelerated speed, loops")
+
+    container = DependencyContainer()
+    configurator = SystemConfigurator(sensors=synthetic_sensors(500, SyntheticSource(seed=3)))
+    configurator.configure(container)
+    data_controller = configurator.controller_factory.create("data")
+    data_controller.initialize_sensors()
+    for _ in range(4):
+        data_controller.collect_data(level_id=1)
+    data_controller.finish_collection()
+    history = container.resolve("repo:storage").get_level_history(1)
+    assert len(history) == 2000 and len({r.value for r in history}) > 1900
+    print("[OK] sourced sensors feed the regular collection path")
+
+    # Снимок не заменяет настроенные сенсоры с источником обычными Sensor
+    path = os.path.join(tempfile.mkdtemp(), "sources.snapshot")
+    first = Application(
+        SystemConfigurator(sensors=synthetic_sensors(3, SyntheticSource(seed=4))),
+        SnapshotManager(path),
+    )
+    first.initialize()
+    first.stop()
+    source = SyntheticSource(seed=5)
+    second = Application(
+        SystemConfigurator(sensors=synthetic_sensors(2, source)), SnapshotManager(path)
+    )
+    second.initialize()
+    sensor_repo = second._container.resolve("repo:sensor")
+    for sensor_id in (1, 2):
+        sensor = sensor_repo.load(sensor_id)
+        assert isinstance(sensor, SourcedSensor) and sensor.source is source, sensor_id
+    assert type(sensor_repo.load(3)) is Sensor
+    second.stop()
+    print("[OK] snapshot restore keeps configured sensor sources")
+
+    print("\n===== ТЕСТЫ ИСТОЧНИКОВ ПОКАЗАНИЙ ПРОЙДЕНЫ =====")
+
+
 if __name__ == "__main__":
     run_controller_tests()
+    run_level_analysis_tests()
+    run_batched_collection_tests()
+    run_snapshot_tests()
+    run_group_stats_tests()
+    run_quantile_sketch_tests()
+    run_batch_forecast_tests()
+    run_forecast_cache_tests()
+    run_sweep_tests()
+    run_time_window_tests()
+    run_anomaly_detection_tests()
+    run_parallel_analysis_tests()
+    run_historical_analysis_tests()
+    run_polling_scheduler_tests()
+    run_ndjson_ingest_tests()
+    run_write_queue_tests()
+    run_sensor_source_tests()
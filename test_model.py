@@ -1,4 +1,12 @@
-from datetime import datetime
+import math
+import os
+import random
+import statistics
+import pickle
+import tempfile
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
 from model import (
     Sensor,
     Level,
@@ -10,6 +18,20 @@ from model import (
     InMemoryStorageRepository,
     InMemoryReportRepository,
     InMemoryForecastRepository,
+    ColumnarStorageRepository,
+    MappedLogStorageRepository,
+    SqliteDatabase,
+    SqliteSensorRepository,
+    SqliteLevelRepository,
+    SqliteStorageRepository,
+    SqliteReportRepository,
+    SqliteForecastRepository,
+    RunningStats,
+    RunningStatsIndex,
+    LinearTrend,
+    TrendIndex,
+    level_event,
+    level_from_event,
 )
 
 
@@ -95,5 +117,730 @@ def run_tests():
     print("\n===== ВСЕ ТЕСТЫ ПРОЙДЕНЫ УСПЕШНО =====")
 
 
+def run_columnar_storage_tests():
+    print("===== ТЕСТ КОЛОНОЧНОГО ХРАНИЛИЩА =====")
+
+    base = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    records = [
+        StorageRecord(base + timedelta(seconds=i), i % 3, float(i), f"MEASURE_LEVEL_{i % 2}")
+        for i in range(10)
+    ]
+
+    # Колоночное хранилище должно вести себя так же, как списочное
+    columnar = ColumnarStorageRepository()
+    reference = InMemoryStorageRepository()
+    for rec in records:
+        columnar.save_record(rec)
+        reference.save_record(rec)
+
+    assert columnar.get_all() == reference.get_all()
+    assert columnar.get_history(1) == reference.get_history(1)
+    assert columnar.load(4) == records[4]
+    assert columnar.load(100) is None
+    print("[OK] Columnar save/get_all/get_history")
+
+    columnar.delete(0)
+    reference.delete(0)
+    assert columnar.get_all() == reference.get_all()
+
+    columnar.clear_old(base + timedelta(seconds=5))
+    reference.clear_old(base + timedelta(seconds=5))
+    assert columnar.get_all() == reference.get_all()
+    assert len(columnar) == 5
+    print("[OK] Columnar delete/clear_old")
+
+    print("\n===== ТЕСТЫ КОЛОНОЧНОГО ХРАНИЛИЩА ПРОЙДЕНЫ =====")
+
+
+def run_storage_index_tests():
+    print("===== ТЕСТ ИНДЕКСОВ ХРАНИЛИЩА =====")
+
+    base = datetime(2024, 1, 1)
+    records = [
+        StorageRecord(base + timedelta(seconds=i), i % 3, float(i), f"MEASURE_LEVEL_{i % 2}")
+        for i in range(12)
+    ]
+    records.append(StorageRecord(base + timedelta(seconds=12), 1, 99.0, "MEASURE"))
+
+    assert records[0].level_id == 0 and records[-1].level_id is None
+
+    for repo in (InMemoryStorageRepository(), ColumnarStorageRepository()):
+        for rec in records:
+            repo.save_record(rec)
+        name = type(repo).__name__
+
+        expected_level = [r for r in records if r.event_type == "MEASURE_LEVEL_1"]
+        assert repo.get_level_history(1) == expected_level, name
+        assert repo.get_level_history(7) == []
+        assert repo.get_history(1) == [r for r in records if r.sensor_id == 1], name
+
+        # Индексы остаются согласованными после удаления и очистки
+        repo.delete(1)
+        assert repo.get_level_history(1) == expected_level[1:], name
+        repo.clear_old(base + timedelta(seconds=6))
+        assert repo.get_level_history(0) == [
+            r for r in records if r.level_id == 0 and r.timestamp >= base + timedelta(seconds=6)
+        ], name
+    print("[OK] Sensor and level indexes")
+
+    print("\n===== ТЕСТЫ ИНДЕКСОВ ПРОЙДЕНЫ =====")
+
+
+def run_segmented_storage_tests():
+    print("===== ТЕСТ СЕГМЕНТОВ ХРАНИЛИЩА =====")
+
+    base = datetime(2024, 1, 1)
+    storage = InMemoryStorageRepository(segment_span=timedelta(hours=1))
+    # 6 часов по 4 показания, вставка не по порядку времени
+    records = [
+        StorageRecord(base + timedelta(minutes=15 * i), i % 2, float(i), "MEASURE_LEVEL_1")
+        for i in range(24)
+    ]
+    for rec in reversed(records):
+        storage.save_record(rec)
+
+    assert len(storage) == 24
+    assert storage.get_all() == sorted(records, key=lambda r: r.timestamp)
+    print("[OK] Segmented save/get_all")
+
+    window = storage.get_range(base + timedelta(minutes=50), base + timedelta(hours=2))
+    assert window == [r for r in records if base + timedelta(minutes=50) <= r.timestamp < base + timedelta(hours=2)]
+    assert storage.get_range() == storage.get_all()
+    print("[OK] Time range read")
+
+    # Очистка: три часа отбрасываются сегментами, четвёртый — частично
+    storage.clear_old(base + timedelta(hours=3, minutes=30))
+    assert len(storage._segments) == 3
+    assert storage.get_all() == records[14:]
+    assert storage.get_level_history(1) == records[14:]
+    assert storage.get_history(0) == [r for r in records[14:] if r.sensor_id == 0]
+    storage.clear_old(base + timedelta(days=1))
+    assert len(storage) == 0 and storage.get_all() == []
+    print("[OK] Segment retention")
+
+    print("\n===== ТЕСТЫ СЕГМЕНТОВ ПРОЙДЕНЫ =====")
+
+
+def run_record_id_tests():
+    print("===== ТЕСТ ИДЕНТИФИКАТОРОВ ЗАПИСЕЙ =====")
+
+    base = datetime(2024, 1, 1)
+    for repo in (
+        InMemoryStorageRepository(segment_span=timedelta(minutes=10)),
+        ColumnarStorageRepository(),
+    ):
+        name = type(repo).__name__
+        records = [
+            StorageRecord(base + timedelta(minutes=i), i % 2, float(i), "MEASURE_LEVEL_1")
+            for i in range(40)
+        ]
+        for rec in records:
+            repo.save_record(rec)
+        assert [r.record_id for r in records] == list(range(40)), name
+
+        # Удаление не сдвигает номера остальных записей
+        for identifier in range(0, 40, 3):
+            repo.delete(identifier)
+        assert repo.load(3) is None and repo.load(4) == records[4], name
+        assert repo.load(38) == records[38] and repo.load(38).record_id == 38, name
+        survivors = [r for r in records if r.record_id % 3]
+        assert repo.get_all() == survivors, name
+        assert repo.get_level_history(1) == survivors, name
+        assert len(repo) == len(survivors), name
+
+        # Очистка старых данных тоже сохраняет номера
+        repo.clear_old(base + timedelta(minutes=25))
+        assert repo.load(20) is None and repo.load(26) == records[26], name
+        assert repo.get_all() == [r for r in survivors if r.record_id >= 25], name
+
+        extra = StorageRecord(base + timedelta(hours=1), 0, 1.0, "MEASURE")
+        repo.save_record(extra)
+        assert extra.record_id == 40 and repo.load(40) == extra, name
+
+        if isinstance(repo, InMemoryStorageRepository):
+            repo.compact()
+            assert not repo._purge and not repo._dirty
+            assert all(i >= 25 for i in repo._by_id)
+            assert repo.get_all() == [r for r in survivors if r.record_id >= 25] + [extra]
+    print("[OK] Stable record ids across delete and retention")
+
+    # Запоздавшая запись после очистки не считается удалённой более ранней
+    # границей, а граница позже неё — удаляет её
+    for repo in (
+        InMemoryStorageRepository(segment_span=timedelta(minutes=10)),
+        ColumnarStorageRepository(),
+    ):
+        name = type(repo).__name__
+        t = [base + timedelta(minutes=m) for m in range(6)]
+        repo.save_record(StorageRecord(t[5], 1, 5.0, "MEASURE"))
+        repo.clear_old(t[3])
+        late = StorageRecord(t[2], 1, 2.0, "MEASURE")
+        repo.save_record(late)
+        repo.clear_old(t[1])
+        assert repo.load(late.record_id) == late, name
+        assert len(repo) == len(repo.get_all()) == 2, name
+        early = StorageRecord(t[0], 1, 0.0, "MEASURE")
+        repo.save_record(early)
+        repo.clear_old(t[1])
+        assert repo.load(early.record_id) is None and repo.load(late.record_id) == late, name
+        repo.delete(late.record_id)
+        assert repo.load(late.record_id) is None and len(repo) == len(repo.get_all()) == 1, name
+        late_again = StorageRecord(t[2], 1, 2.0, "MEASURE")
+        repo.save_record(late_again)
+        repo.clear_old(t[4])
+        assert repo.load(late_again.record_id) is None, name
+        assert len(repo) == len(repo.get_all()) == 1, name
+    print("[OK] retention horizon does not hide records saved after an earlier clear")
+
+    # Заданный record_id сохраняется во всех бэкендах, занятый — перезаписывается
+    db = SqliteDatabase(os.path.join(tempfile.mkdtemp(), "ids.db"))
+    for repo in (
+        InMemoryStorageRepository(segment_span=timedelta(minutes=10)),
+        ColumnarStorageRepository(),
+        SqliteStorageRepository(db),
+    ):
+        name = type(repo).__name__
+
+        def record(record_id, value):
+            return StorageRecord(
+                base + timedelta(minutes=value), 1, float(value), "MEASURE_LEVEL_1", record_id
+            )
+
+        repo.save_record(record(5, 5))
+        repo.save_record(record(2, 2))
+        fresh = record(None, 6)
+        repo.save_record(fresh)
+        assert fresh.record_id == 6 and repo.load(5) == record(5, 5), name
+        repo.save_record(record(5, 50))
+        repo.save_many([record(10, 10), record(8, 8)])
+        expected = [record(2, 2), record(6, 6), record(8, 8), record(10, 10), record(5, 50)]
+        assert repo.load(5).value == 50.0 and repo.load(3) is None, name
+        assert len(repo.get_all()) == 5, name
+        assert sorted(repo.get_all(), key=lambda r: r.value) == expected, name
+        assert sorted(repo.get_level_history(1), key=lambda r: r.value) == expected, name
+        later = record(None, 11)
+        repo.save_record(later)
+        assert later.record_id == 11, name
+    db.close()
+    print("[OK] preset record ids are kept by every backend")
+
+    print("\n===== ТЕСТЫ ИДЕНТИФИКАТОРОВ ПРОЙДЕНЫ =====")
+
+
+def run_sqlite_tests():
+    print("===== ТЕСТ SQLITE-РЕПОЗИТОРИЕВ =====")
+
+    path = os.path.join(tempfile.mkdtemp(), "omis.db")
+    db = SqliteDatabase(path)
+    base = datetime(2024, 1, 1, 10, 0, 0, 250000)
+
+    sensors = SqliteSensorRepository(db)
+    sensors.add_sensor(Sensor(1, "load", "%", 5, 0.7))
+    assert sensors.get_sensor(1) == Sensor(1, "load", "%", 5, 0.7)
+
+    levels = SqliteLevelRepository(db)
+    levels.add_level(Level(3, "Пещера", 0.5, {"enemies": 12.0}, "Тёмный уровень"))
+    lvl = levels.get_level(3)
+    lvl.update_parameters({"traps": 4.0})
+    levels.update_level(lvl)
+    assert levels.get_level(3).parameters == {"enemies": 12.0, "traps": 4.0}
+
+    reports = SqliteReportRepository(db)
+    reports.save_report(Report(1, base, "Admin", "Итог", "Текст"))
+    reports.save_report(Report(2, base + timedelta(days=2), "Bob", "Итог", "Текст"))
+    assert [r.report_id for r in reports.find_by_author("Admin")] == [1]
+    reports.clear_old(base + timedelta(days=1))
+    assert [r.report_id for r in reports.get_all()] == [2]
+
+    forecasts = SqliteForecastRepository(db)
+    fr = Forecast(7, "Пещера", 0.4, "Снизить сложность", base)
+    forecasts.save_forecast(fr)
+    assert forecasts.get_forecast(7) == fr
+    print("[OK] Sensor/level/report/forecast round trip")
+
+    storage = SqliteStorageRepository(db)
+    records = [
+        StorageRecord(base + timedelta(seconds=i), i % 2, float(i), f"MEASURE_LEVEL_{i % 3}")
+        for i in range(9)
+    ]
+    storage.save_record(records[0])
+    storage.save_records(records[1:])
+    assert [r.record_id for r in records] == list(range(1, 10))
+    assert storage.get_all() == records
+    assert storage.get_history(1) == [r for r in records if r.sensor_id == 1]
+    assert storage.get_level_history(2) == [r for r in records if r.level_id == 2]
+    assert storage.get_range(base + timedelta(seconds=3), base + timedelta(seconds=5)) == records[3:5]
+    storage.delete(5)
+    storage.clear_old(base + timedelta(seconds=2))
+    assert storage.get_all() == records[2:4] + records[5:]
+    assert storage.load(9) == records[8] and storage.load(5) is None
+    print("[OK] Storage round trip")
+
+    # Данные переживают повторное открытие базы
+    db.close()
+    reopened = SqliteDatabase(path)
+    assert SqliteStorageRepository(reopened).get_all() == records[2:4] + records[5:]
+    assert SqliteForecastRepository(reopened).get_forecast(7) == fr
+    reopened.close()
+    print("[OK] Data survives reopen")
+
+    print("\n===== ТЕСТЫ SQLITE ПРОЙДЕНЫ =====")
+
+
+def run_mapped_log_tests():
+    print("===== ТЕСТ ЖУРНАЛА В ОТОБРАЖАЕМОМ ФАЙЛЕ =====")
+
+    path = os.path.join(tempfile.mkdtemp(), "readings.log")
+    base = datetime(2024, 1, 1)
+    records = [
+        StorageRecord(base + timedelta(seconds=i), i % 2, float(i), f"MEASURE_LEVEL_{i % 3}")
+        for i in range(10)
+    ]
+
+    # Маленькая начальная ёмкость — файл расширяется при записи
+    log = MappedLogStorageRepository(path, initial_capacity=4)
+    for rec in records:
+        log.save_record(rec)
+    assert [r.record_id for r in records] == list(range(10))
+    assert log.get_all() == records
+    assert log.get_history(1) == records[1::2]
+    assert log.get_level_history(0) == records[0::3]
+    assert log.get_range(base + timedelta(seconds=2), base + timedelta(seconds=4)) == records[2:4]
+    print("[OK] Append and read")
+
+    # Колонки читаются прямо из отображения, без объектов StorageRecord
+    with log.columns() as cols:
+        assert sum(cols.values) == sum(r.value for r in records)
+        assert list(cols.sensor_ids) == [r.sensor_id for r in records]
+        assert log.event_level(cols.event_codes[4]) == 1
+    print("[OK] Zero-copy columns")
+
+    log.delete(5)
+    log.clear_old(base + timedelta(seconds=3))
+    expected = records[3:5] + records[6:]
+    assert log.get_all() == expected and len(log) == len(expected)
+    assert log.load(5) is None and log.load(2) is None and log.load(9) == records[9]
+    log.close()
+
+    # После перезапуска журнал открывается с теми же данными
+    reopened = MappedLogStorageRepository(path)
+    assert reopened.get_all() == expected and len(reopened) == len(expected)
+    extra = StorageRecord(base + timedelta(seconds=20), 0, 1.0, "MEASURE")
+    reopened.save_record(extra)
+    assert extra.record_id == 10 and reopened.load(10) == extra
+    reopened.close()
+    print("[OK] Log survives reopen")
+
+    print("\n===== ТЕСТЫ ЖУРНАЛА ПРОЙДЕНЫ =====")
+
+
+def run_bulk_save_tests():
+    print("===== ТЕСТ ПАКЕТНОЙ ЗАПИСИ =====")
+
+    tmp = tempfile.mkdtemp()
+    base = datetime(2024, 1, 1)
+    db = SqliteDatabase(os.path.join(tmp, "bulk.db"))
+
+    storages = [
+        InMemoryStorageRepository(),
+        ColumnarStorageRepository(),
+        MappedLogStorageRepository(os.path.join(tmp, "bulk.log"), initial_capacity=2),
+        SqliteStorageRepository(db),
+    ]
+    for storage in storages:
+        name = type(storage).__name__
+        single = StorageRecord(base, 0, 0.0, "MEASURE")
+        storage.save_record(single)
+        batch = [
+            StorageRecord(base + timedelta(seconds=i), i % 2, float(i), "MEASURE_LEVEL_4")
+            for i in range(1, 8)
+        ]
+        storage.save_records(batch)
+        first = single.record_id + 1
+        assert [r.record_id for r in batch] == list(range(first, first + 7)), name
+        assert storage.get_level_history(4) == batch, name
+        assert storage.load(batch[3].record_id) == batch[3], name
+        storage.save_records([])
+    print("[OK] save_records for every storage backend")
+
+    for sensors in (InMemorySensorRepository(), SqliteSensorRepository(db)):
+        sensors.save_many([Sensor(i, "load", "%", 5, float(i)) for i in range(3)])
+        assert [s.value for s in sensors.get_all()] == [0.0, 1.0, 2.0]
+    for levels in (InMemoryLevelRepository(), SqliteLevelRepository(db)):
+        levels.save_many([Level(i, f"L{i}", 0.5, {}, "") for i in range(2)])
+        assert levels.get_level(1).name == "L1"
+    for forecasts in (InMemoryForecastRepository(), SqliteForecastRepository(db)):
+        forecasts.save_many([Forecast(i, "L", 0.5, "—", base) for i in range(1, 4)])
+        assert len(forecasts.get_all()) == 3
+    for reports in (InMemoryReportRepository(), SqliteReportRepository(db)):
+        reports.save_many([Report(i, base, "A", "S", "C") for i in range(1, 3)])
+        assert len(reports.find_by_author("A")) == 2
+    print("[OK] save_many for every repository")
+
+    storages[2].close()
+    db.close()
+    print("\n===== ТЕСТЫ ПАКЕТНОЙ ЗАПИСИ ПРОЙДЕНЫ =====")
+
+def run_streaming_api_tests():
+    print("===== ТЕСТ ПОТОКОВОГО ЧТЕНИЯ =====")
+
+    tmp = tempfile.mkdtemp()
+    base = datetime(2024, 1, 1)
+    db = SqliteDatabase(os.path.join(tmp, "stream.db"))
+
+    storages = [
+        InMemoryStorageRepository(),
+        ColumnarStorageRepository(),
+        MappedLogStorageRepository(os.path.join(tmp, "stream.log")),
+        SqliteStorageRepository(db),
+    ]
+    for storage in storages:
+        name = type(storage).__name__
+        assert storage.latest() is None and storage.tail(3) == [], name
+        records = [
+            StorageRecord(base + timedelta(minutes=i), i % 3, float(i), f"MEASURE_LEVEL_{i % 2}")
+            for i in range(10)
+        ]
+        storage.save_records(records)
+        storage.delete(records[9].record_id)
+
+        assert list(storage.iter_all()) == records[:9], name
+        window = list(storage.iter_range(base + timedelta(minutes=2), base + timedelta(minutes=5)))
+        assert window == records[2:5], name
+        assert list(storage.iter_range(start=base + timedelta(minutes=7))) == records[7:9], name
+        assert storage.get_range(None, base + timedelta(minutes=1)) == records[:1], name
+        assert list(storage.iter_level_history(1)) == storage.get_level_history(1), name
+        assert storage.tail(2) == records[7:9], name
+        assert storage.latest() == records[8], name
+    print("[OK] iter_all / iter_range / tail / latest for every storage backend")
+
+    for forecasts in (InMemoryForecastRepository(), SqliteForecastRepository(db)):
+        assert forecasts.latest() is None
+        forecasts.save_many([
+            Forecast(i, "L", 0.5, "—", base + timedelta(hours=i)) for i in range(1, 5)
+        ])
+        assert forecasts.latest().forecast_id == 4
+        assert [f.forecast_id for f in forecasts.tail(2)] == [3, 4]
+        assert [f.forecast_id for f in forecasts.iter_range(base + timedelta(hours=2))] == [2, 3, 4]
+    print("[OK] latest / tail / iter_range for forecasts")
+
+    storages[2].close()
+    db.close()
+    print("\n===== ТЕСТЫ ПОТОКОВОГО ЧТЕНИЯ ПРОЙДЕНЫ =====")
+
+def run_record_columns_tests():
+    print("===== ТЕСТ КОЛОНОЧНОГО ЭКСПОРТА ПОКАЗАНИЙ =====")
+
+    base = datetime(2024, 1, 1)
+    source = InMemoryStorageRepository()
+    source.save_records([
+        StorageRecord(base + timedelta(seconds=i), i % 3, float(i), f"MEASURE_LEVEL_{i % 2}")
+        for i in range(12)
+    ])
+    # Запись «из прошлого» делает порядок id отличным от порядка времени
+    source.save_record(StorageRecord(base - timedelta(hours=1), 7, -1.0, "MEASURE"))
+    source.delete(4)
+    source.delete(5)
+    columns = source.export_columns()
+    assert len(columns.record_ids) == 11
+    assert columns.event_names == ["MEASURE", "MEASURE_LEVEL_0", "MEASURE_LEVEL_1"]
+
+    for target in (InMemoryStorageRepository(), ColumnarStorageRepository()):
+        name = type(target).__name__
+        target.import_columns(columns)
+        assert sorted(target.get_all(), key=lambda r: r.record_id) == sorted(
+            source.get_all(), key=lambda r: r.record_id
+        ), name
+        assert target.load(4) is None and target.load(6).value == 6.0, name
+        assert target.load(12).sensor_id == 7, name
+        assert len(target) == 11, name
+        assert target.get_level_history(1) == source.get_level_history(1), name
+        fresh = StorageRecord(base, 0, 0.0, "MEASURE")
+        target.save_record(fresh)
+        assert fresh.record_id == 13, name
+    print("[OK] export_columns / import_columns keep record ids")
+
+    columnar = ColumnarStorageRepository()
+    columnar.save_record(StorageRecord(base, 0, 0.0, "MEASURE"))
+    try:
+        columnar.import_columns(columns)
+    except ValueError:
+        print("[OK] import_columns rejects taken record ids")
+    else:
+        raise AssertionError("ожидалась ошибка пересечения record_id")
+
+    print("\n===== ТЕСТЫ КОЛОНОЧНОГО ЭКСПОРТА ПРОЙДЕНЫ =====")
+
+def _expected_rollups(records, key, start, end, resolution):
+    """Агрегаты, посчитанные напрямую по сырым показаниям."""
+    step = resolution // timedelta(microseconds=1)
+    groups = {}
+    for r in records:
+        if key(r) and (start is None or r.timestamp >= start) and (end is None or r.timestamp < end):
+            micros = (r.timestamp - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+            groups.setdefault(micros // step, []).append(r)
+    result = []
+    for slot, rs in sorted(groups.items()):
+        values = [r.value for r in rs]
+        last = max(rs, key=lambda r: r.timestamp).value
+        result.append((len(values), round(sum(values), 6), min(values), max(values), last))
+    return result
+
+
+def _rollup_tuples(points):
+    return [(p.count, round(p.total, 6), p.minimum, p.maximum, p.last) for p in points]
+
+
+def run_rollup_tests():
+    print("===== ТЕСТ АГРЕГАТОВ ПО РАЗРЕШЕНИЯМ =====")
+
+    tmp = tempfile.mkdtemp()
+    base = datetime(2024, 1, 1)
+    db = SqliteDatabase(os.path.join(tmp, "rollups.db"))
+    storages = [
+        InMemoryStorageRepository(),
+        ColumnarStorageRepository(),
+        MappedLogStorageRepository(os.path.join(tmp, "rollups.log")),
+        SqliteStorageRepository(db),
+    ]
+    records = [
+        StorageRecord(
+            base + timedelta(seconds=7 * i),
+            i % 3,
+            float((i * 37) % 101),
+            f"MEASURE_LEVEL_{i % 2}",
+        )
+        for i in range(1500)
+    ]
+    queries = [
+        (None, None, timedelta(hours=1)),
+        (base, base + timedelta(hours=2), timedelta(minutes=5)),
+        (base + timedelta(minutes=10), base + timedelta(minutes=11), timedelta(seconds=10)),
+        # Граница не кратна секунде — ответ по сырым данным
+        (base + timedelta(milliseconds=1500), base + timedelta(minutes=3), timedelta(minutes=1)),
+    ]
+
+    def check(storage, alive):
+        name = type(storage).__name__
+        for start, end, resolution in queries:
+            got = storage.get_rollups(start, end, resolution, sensor_id=1)
+            want = _expected_rollups(alive, lambda r: r.sensor_id == 1, start, end, resolution)
+            assert _rollup_tuples(got) == want, name
+            got = storage.get_rollups(start, end, resolution, level_id=0)
+            want = _expected_rollups(alive, lambda r: r.level_id == 0, start, end, resolution)
+            assert _rollup_tuples(got) == want, name
+
+    for storage in storages:
+        storage.save_records(records[:700])
+        storage.enable_rollups()
+        storage.save_records(records[700:1400])
+        for record in records[1400:]:
+            storage.save_record(record)
+        check(storage, records)
+
+        # Удаление максимума помечает интервалы к пересчёту
+        peak = max(records[:300], key=lambda r: r.value)
+        storage.delete(peak.record_id)
+        alive = [r for r in records if r is not peak]
+        check(storage, alive)
+
+        storage.clear_old(base + timedelta(minutes=90, seconds=30))
+        alive = [r for r in alive if r.timestamp >= base + timedelta(minutes=90, seconds=30)]
+        check(storage, alive)
+    print("[OK] rollups match raw aggregates for every storage backend")
+
+    storage = InMemoryStorageRepository()
+    storage.save_records(records)
+    hourly = storage.rollups._tier_for(0, None, 2 * 3600 * 10 ** 6)
+    assert hourly.resolution == timedelta(hours=1)
+    minute = storage.rollups._tier_for(0, 60 * 10 ** 6, 5 * 60 * 10 ** 6)
+    assert minute.resolution == timedelta(minutes=1)
+    assert storage.rollups._tier_for(1, None, 10 ** 6) is None
+    try:
+        storage.get_rollups(None, None, timedelta(hours=1))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ожидалась ошибка без sensor_id/level_id")
+    print("[OK] the coarsest matching tier is chosen")
+
+    storages[2].close()
+    db.close()
+    print("\n===== ТЕСТЫ АГРЕГАТОВ ПРОЙДЕНЫ =====")
+
+def run_running_stats_tests():
+    print("===== ТЕСТ НАКОПИТЕЛЬНОЙ СТАТИСТИКИ =====")
+
+    rng = random.Random(7)
+    values = [rng.uniform(-50.0, 150.0) for _ in range(2000)]
+    stats = RunningStats.of(values)
+    assert stats.count == 2000
+    assert math.isclose(stats.mean, statistics.mean(values), rel_tol=1e-12)
+    assert math.isclose(stats.variance, statistics.variance(values), rel_tol=1e-9)
+    assert (stats.minimum, stats.maximum) == (min(values), max(values))
+
+    left, right = RunningStats.of(values[:700]), RunningStats.of(values[700:])
+    left.merge(right)
+    assert math.isclose(left.mean, stats.mean, rel_tol=1e-12)
+    assert math.isclose(left.variance, stats.variance, rel_tol=1e-9)
+
+    for value in values[:500]:
+        stats.remove(value)
+    assert math.isclose(stats.mean, statistics.mean(values[500:]), rel_tol=1e-9)
+    assert math.isclose(stats.variance, statistics.variance(values[500:]), rel_tol=1e-9)
+    print("[OK] Welford add / remove / merge match statistics")
+
+    base = datetime(2024, 1, 1)
+    tmp = tempfile.mkdtemp()
+    db = SqliteDatabase(os.path.join(tmp, "stats.db"))
+    storages = [
+        InMemoryStorageRepository(),
+        ColumnarStorageRepository(),
+        MappedLogStorageRepository(os.path.join(tmp, "stats.log")),
+        SqliteStorageRepository(db),
+    ]
+    records = [
+        StorageRecord(base + timedelta(seconds=i), i % 4, values[i], f"MEASURE_LEVEL_{i % 3}")
+        for i in range(1200)
+    ]
+    for storage in storages:
+        name = type(storage).__name__
+        storage.save_records(records[:400])
+        index = RunningStatsIndex(storage)
+        storage.save_records(records[400:])
+        lowest = min(records, key=lambda r: r.value)
+        storage.delete(lowest.record_id)
+        cutoff = base + timedelta(seconds=300)
+        storage.clear_old(cutoff)
+        alive = [r for r in records if r is not lowest and r.timestamp >= cutoff]
+        for level_id in range(3):
+            expected = [r.value for r in alive if r.level_id == level_id]
+            got = index.level(level_id)
+            assert got.count == len(expected), name
+            assert math.isclose(got.mean, statistics.mean(expected), rel_tol=1e-9), name
+            assert math.isclose(got.variance, statistics.variance(expected), rel_tol=1e-6), name
+            assert (got.minimum, got.maximum) == (min(expected), max(expected)), name
+        expected = [r.value for r in alive if r.sensor_id == 2]
+        assert math.isclose(index.sensor(2).mean, statistics.mean(expected), rel_tol=1e-9), name
+        assert index.level(99).count == 0, name
+    print("[OK] RunningStatsIndex follows every storage backend")
+
+    # Построение по SQL-агрегатам совпадает с просмотром истории порциями
+    memory, sqlite = storages[0], storages[3]
+    assert sqlite.level_sensor_aggregates() is not None
+    assert memory.level_sensor_aggregates() is None
+    assert sum(len(chunk) for chunk in memory.iter_chunks(100)) == len(memory.get_all())
+    from_sql, from_chunks = RunningStatsIndex(sqlite), RunningStatsIndex(memory)
+    for level_id in range(3):
+        for sensor_id, got in from_sql.level_sensors(level_id).items():
+            expected = from_chunks.level_sensors(level_id)[sensor_id]
+            assert got.count == expected.count
+            assert math.isclose(got.variance, expected.variance, rel_tol=1e-9)
+            assert (got.minimum, got.maximum) == (expected.minimum, expected.maximum)
+    print("[OK] RunningStatsIndex backfill from SQL aggregates matches chunked scan")
+
+    storages[2].close()
+    db.close()
+    print("\n===== ТЕСТЫ НАКОПИТЕЛЬНОЙ СТАТИСТИКИ ПРОЙДЕНЫ =====")
+
+
+def run_trend_tests():
+    print("===== ТЕСТ ЛИНЕЙНЫХ ТРЕНДОВ =====")
+
+    rng = random.Random(8)
+    points = [(i / 10, 5.0 - 0.7 * i / 10 + rng.gauss(0.0, 1.0)) for i in range(500)]
+    trend = LinearTrend()
+    for t, v in points:
+        trend.add(t, v)
+    expected = statistics.linear_regression([t for t, _ in points], [v for _, v in points])
+    assert math.isclose(trend.slope, expected.slope, rel_tol=1e-9)
+    assert math.isclose(trend.mean, statistics.mean(v for _, v in points), rel_tol=1e-12)
+    for t, v in points[:100]:
+        trend.remove(t, v)
+    rest = points[100:]
+    expected = statistics.linear_regression([t for t, _ in rest], [v for _, v in rest])
+    assert trend.count == 400
+    assert math.isclose(trend.slope, expected.slope, rel_tol=1e-6)
+    single = LinearTrend()
+    single.add(3.0, 1.0)
+    single.add(3.0, 2.0)
+    assert single.slope == 0.0
+    print("[OK] LinearTrend matches statistics.linear_regression, also after remove")
+
+    storage = InMemoryStorageRepository()
+    base = datetime(2024, 1, 1)
+    storage.save_records([
+        StorageRecord(base + timedelta(hours=i), 1, 2.0 * i, "MEASURE_LEVEL_3")
+        for i in range(10)
+    ])
+    index = TrendIndex(storage)
+    storage.save_records([
+        StorageRecord(base + timedelta(hours=i), 2, 7.0, "MEASURE_LEVEL_3")
+        for i in range(10, 20)
+    ] + [StorageRecord(base, 1, 100.0, "MEASURE")])
+    by_sensor = index.level(3)
+    assert sorted(by_sensor) == [1, 2]
+    assert math.isclose(by_sensor[1].slope, 2.0, rel_tol=1e-12)
+    assert by_sensor[2].slope == 0.0 and by_sensor[2].mean == 7.0
+    storage.clear_old(base + timedelta(hours=10))
+    assert sorted(index.level(3)) == [2] and index.levels() == {3: index.level(3)}
+    print("[OK] TrendIndex follows storage writes and removals")
+
+    print("\n===== ТЕСТЫ ЛИНЕЙНЫХ ТРЕНДОВ ПРОЙДЕНЫ =====")
+
+
+def run_compact_entity_tests():
+    print("===== ТЕСТ КОМПАКТНЫХ СУЩНОСТЕЙ =====")
+
+    base = datetime(2024, 1, 1)
+    record = StorageRecord(base, 1, 0.5, level_event(7))
+    entities = [
+        record,
+        Sensor(1, "load", "%", 5, 0.7),
+        Report(1, base, "Admin", "Итог", "Текст"),
+        Forecast(1, "Уровень", 0.5, "—", base),
+    ]
+    for entity in entities:
+        assert not hasattr(entity, "__dict__"), type(entity)
+        try:
+            entity.unknown_field = 1
+            raise AssertionError("slots должны запрещать новые атрибуты")
+        except AttributeError:
+            pass
+        assert pickle.loads(pickle.dumps(entity)) == entity
+    assert asdict(record)["event_type"] == "MEASURE_LEVEL_7"
+    record.record_id = 42
+    assert record == StorageRecord(base, 1, 0.5, "MEASURE_LEVEL_7")
+    assert record.level_id == 7 and level_from_event("MEASURE") is None
+    print("[OK] slotted entities keep attribute access, equality, asdict and pickle")
+
+    # Одинаковые event_type — один объект строки, в том числе после чтения из SQLite
+    assert level_event(7) is level_event(int("7")) and level_event(None) == "MEASURE"
+    db = SqliteDatabase(os.path.join(tempfile.mkdtemp(), "omis.db"))
+    storage = SqliteStorageRepository(db)
+    storage.save_records(
+        StorageRecord(base + timedelta(seconds=i), i % 3, float(i), "MEASURE_LEVEL_" + str(i % 2))
+        for i in range(100)
+    )
+    loaded = storage.get_all()
+    assert len({id(r.event_type) for r in loaded}) == 2
+    assert loaded[0].event_type is level_event(0)
+    db.close()
+    print("[OK] event types are interned")
+
+
 if __name__ == "__main__":
     run_tests()
+    run_columnar_storage_tests()
+    run_storage_index_tests()
+    run_segmented_storage_tests()
+    run_record_id_tests()
+    run_sqlite_tests()
+    run_mapped_log_tests()
+    run_bulk_save_tests()
+    run_streaming_api_tests()
+    run_record_columns_tests()
+    run_rollup_tests()
+    run_running_stats_tests()
+    run_trend_tests()
+    run_compact_entity_tests()
@@ -1,50 +1,46 @@
-from fastapi import FastAPI, Request, Form
+import os
+
+from fastapi import FastAPI, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
 from application import Application
-from controllers import JournalManager
+from controllers import (
+    AnomalyDetector,
+    JournalManager,
+    NdjsonIngestor,
+    SweepEngine,
+    compute_preview,
+)
+from controllers.sweep import METRICS
+from infrastructure import SnapshotManager
 
 app = FastAPI()
 
 app.mount("/static", StaticFiles(directory="web/static"), name="static")
 templates = Jinja2Templates(directory="web/templates")
 
-core_app = Application()
+# Снимок состояния переживает перезапуск сервера: сохраняется раз в минуту
+# и при остановке, загружается при инициализации
+SNAPSHOT_PATH = os.environ.get("OMIS_SNAPSHOT", "omis.snapshot")
+
+core_app = Application(snapshot=SnapshotManager(SNAPSHOT_PATH, interval=60.0))
 core_app.initialize()
 container = core_app._container
 
-# Последние параметры слайдеров для предпросмотра
-LAST_PARAMS = {"difficulty": 50, "enemies": 10, "reward": 100}
 
+@app.on_event("shutdown")
+def save_state() -> None:
+    core_app.stop()
 
-def compute_preview(difficulty: int, enemies: int, reward: int):
-    """
-    Простейшая псевдо-модель, чтобы значения на экране менялись от слайдеров.
-    Это визуальный расчет, не заменяет внутренний прогноз ядра.
-    """
-    diff = max(0, min(100, difficulty))
-    enem = max(0, min(200, enemies))
-    rew = max(50, min(200, reward))
-
-    expected_players = max(100, int(900 - diff * 3 + rew * 2 - enem * 2))
-    completion = max(5, min(98, int(72 + (rew - 100) * 0.2 - (diff - 50) * 0.35 - (enem - 10) * 0.25)))
-    avg_time = max(5, int(30 + (diff - 50) * 0.25 + (enem - 10) * 0.5 - (rew - 100) * 0.05))
-
-    if expected_players < 700:
-        server_load = "Небольшая"
-    elif expected_players < 1000:
-        server_load = "Умеренная"
-    else:
-        server_load = "Высокая"
 
-    return {
-        "expected_players": expected_players,
-        "completion": completion,
-        "avg_time": avg_time,
-        "server_load": server_load,
-    }
+# Последние параметры слайдеров для предпросмотра
+LAST_PARAMS = {"difficulty": 50, "enemies": 10, "reward": 100}
+
+# Перебор сеток параметров для тепловых карт
+sweep_engine = SweepEngine()
 
 
 def build_recs(base_text: str | None):
@@ -148,6 +144,19 @@ async def monitoring_problems(request: Request):
             "description": "Среднее время: 45 минут (ожидалось 30)",
         },
     ]
+    # Выбросы, найденные детектором при сборе данных, — первыми
+    detector: AnomalyDetector = container.resolve(AnomalyDetector)
+    problems[:0] = [
+        {
+            "title": f"Уровень {a.level_id}" if a.level_id is not None else "Без уровня",
+            "tag": "Аномальное показание",
+            "description": (
+                f"Сенсор {a.sensor_id}: {a.value:g} при ожидаемом {a.expected:g} "
+                f"({a.timestamp:%H:%M:%S})"
+            ),
+        }
+        for a in reversed(detector.anomalies())
+    ]
     return templates.TemplateResponse(
         "monitoring.html",
         {
@@ -176,10 +185,8 @@ async def level_forecast_get(request: Request):
     report_repo = container.resolve("repo:report")
     journal: JournalManager = container.resolve(JournalManager)
 
-    forecasts = forecast_repo.get_all()
-    reports = report_repo.get_all()
-    last_forecast = forecasts[-1] if forecasts else None
-    last_report = reports[-1] if reports else None
+    last_forecast = forecast_repo.latest()
+    last_report = report_repo.latest()
 
     preview = compute_preview(
         LAST_PARAMS["difficulty"], LAST_PARAMS["enemies"], LAST_PARAMS["reward"]
@@ -221,10 +228,8 @@ async def level_forecast_post(
     report_repo = container.resolve("repo:report")
     journal: JournalManager = container.resolve(JournalManager)
 
-    forecasts = forecast_repo.get_all()
-    reports = report_repo.get_all()
-    last_forecast = forecasts[-1] if forecasts else None
-    last_report = reports[-1] if reports else None
+    last_forecast = forecast_repo.latest()
+    last_report = report_repo.latest()
 
     preview = compute_preview(difficulty, enemies, reward)
 
@@ -242,6 +247,55 @@ async def level_forecast_post(
     )
 
 
+@app.get("/level-testing/sweep")
+async def level_sweep(metric: str = "completion", step: int = 5):
+    """
+    Тепловая карта метрики по сетке сложность x противники при текущем
+    множителе наград (значения слайдеров из LAST_PARAMS).
+    """
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Неизвестная метрика: {metric}")
+    step = max(1, step)
+    difficulties = list(range(0, 101, step))
+    enemies = list(range(0, 51, max(1, step // 2)))
+    result = sweep_engine.run(difficulties, enemies, [LAST_PARAMS["reward"]])
+    return {
+        "metric": metric,
+        "reward": LAST_PARAMS["reward"],
+        "difficulty": difficulties,
+        "enemies": enemies,
+        "values": result.heatmap(metric, rows="difficulty", cols="enemies"),
+    }
+
+
+@app.post("/ingest/readings")
+async def ingest_readings(request: Request, level_id: int | None = None, batch_size: int = 5000):
+    """
+    Приём показаний внешних источников в NDJSON: по объекту на строку
+    (sensor_id, value, необязательные timestamp и level_id). Тело читается
+    потоком, показания пишутся пакетами; в ответе — число принятых,
+    отклонённых (в том числе очередью записи) и записанных строк, счёт по
+    каждому пакету и первые ошибки разбора. Разбор и запись блокируют
+    (очередь записи, блокировка хранилища), поэтому идут в пуле потоков, а не
+    в цикле событий.
+    """
+    if batch_size <= 0:
+        raise HTTPException(status_code=400, detail="batch_size должен быть положительным")
+    data_ctrl = core_app._configurator.controller_factory.create("data")
+    sensor_ids = [sensor.sensor_id for sensor in container.resolve("repo:sensor").get_all()]
+    ingestor = NdjsonIngestor(data_ctrl, sensor_ids, level_id=level_id, batch_size=batch_size)
+    async for chunk in request.stream():
+        await run_in_threadpool(ingestor.feed, chunk)
+    result = await run_in_threadpool(ingestor.close)
+    journal: JournalManager = container.resolve(JournalManager)
+    journal.add_entry(
+        f"Приём NDJSON: принято {result.accepted}, отклонено {result.rejected}, "
+        f"записано {result.written}",
+        level="WARN" if result.rejected or result.written < result.accepted else "INFO",
+    )
+    return result.as_dict()
+
+
 @app.get("/level-testing/recommendations", response_class=HTMLResponse)
 async def level_recommendations(request: Request):
     """
@@ -250,8 +304,7 @@ async def level_recommendations(request: Request):
     чуть-чуть статических вариантов.
     """
     forecast_repo = container.resolve("repo:forecast")
-    forecasts = forecast_repo.get_all()
-    last_forecast = forecasts[-1] if forecasts else None
+    last_forecast = forecast_repo.latest()
 
     base_text = last_forecast.recommendations if last_forecast else "Нет активного прогноза"
 
@@ -273,8 +326,7 @@ async def apply_recommendation(
     action: str = Form(...),
 ):
     forecast_repo = container.resolve("repo:forecast")
-    forecasts = forecast_repo.get_all()
-    last_forecast = forecasts[-1] if forecasts else None
+    last_forecast = forecast_repo.latest()
     base_text = last_forecast.recommendations if last_forecast else "Нет активного прогноза"
 
     if action == "lower_diff":
@@ -336,8 +388,7 @@ async def reports_generate(request: Request):
     Берём последний прогноз и делаем из него основные числа.
     """
     forecast_repo = container.resolve("repo:forecast")
-    forecasts = forecast_repo.get_all()
-    last_forecast = forecasts[-1] if forecasts else None
+    last_forecast = forecast_repo.latest()
 
     preview = compute_preview(
         LAST_PARAMS["difficulty"], LAST_PARAMS["enemies"], LAST_PARAMS["reward"]